@@ -2,6 +2,9 @@
 ASGI config for alx_travel_app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serving through it switches SERVER_MODE to 'asgi', which routes the payment
+endpoints to the async views in listings.async_views. Static files are
+answered by WhiteNoise ahead of Django, because its middleware is sync only.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +15,25 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+os.environ.setdefault('SERVER_MODE', 'asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from asgiref.wsgi import WsgiToAsgi  # noqa: E402
+from django.conf import settings  # noqa: E402
+from whitenoise import WhiteNoise  # noqa: E402
+
+
+def static_not_found(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain')])
+    return [b'Not Found']
+
+
+static_application = WsgiToAsgi(
+    WhiteNoise(static_not_found, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL))
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+        return await static_application(scope, receive, send)
+    return await django_application(scope, receive, send)
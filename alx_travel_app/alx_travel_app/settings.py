@@ -1,6 +1,8 @@
 import environ
+from corsheaders.defaults import default_headers
 import os
 from pathlib import Path
+from celery.schedules import crontab
 
 env = environ.Env(
     DEBUG=(bool, False)
@@ -55,6 +57,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.middleware.RequestIdMiddleware',
+    'utils.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,6 +70,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# 'asgi' (set by asgi.py) routes the payment endpoints to async views. Static
+# files are then served outside the middleware stack, since WhiteNoise's
+# middleware is sync only and would funnel every request through one thread.
+SERVER_MODE = env('SERVER_MODE', default='wsgi')
+if SERVER_MODE == 'asgi':
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = 'alx_travel_app.urls'
 
 TEMPLATES = [
@@ -144,7 +155,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         # 'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'listings.pagination.KeysetPagination',
     'PAGE_SIZE': 5,
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
@@ -157,6 +168,11 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# CustomUser's primary key is user_id, not id
+SIMPLE_JWT = {
+    'USER_ID_FIELD': 'user_id',
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'AirBnB Clone Project',
     'DESCRIPTION': 'An App for Scheduling Travel Options',
@@ -195,9 +211,102 @@ SWAGGER_SETTINGS = {
 
 
 CORS_ALLOWED_ORIGINS = [x for x in env.list("CORS_ALLOWED_ORIGIN")] #type:ignore
+# browsers may send Idempotency-Key and read whether the answer was a replay
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 CELERY_BROKER_URL = env("REDIS_URL")
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+# compact binary messages; json is still accepted for messages queued
+# before the switch (see listings/payloads.py)
+CELERY_TASK_SERIALIZER = 'msgpack'
+CELERY_RESULT_SERIALIZER = 'msgpack'
+CELERY_ACCEPT_CONTENT = ['msgpack', 'json']
+# nothing reads task results; storing them only takes room in the shared Redis
+CELERY_TASK_IGNORE_RESULT = True
+
+CELERY_BEAT_SCHEDULE = {
+    # safety net for webhook events whose drain task was never queued
+    'drain-webhook-events': {
+        'task': 'listings.tasks.process_webhook_events',
+        'schedule': 60.0,
+    },
+    # payments left in PROCESSING because their webhook never came
+    'reconcile-stale-payments': {
+        'task': 'listings.tasks.reconcile_stale_payments',
+        'schedule': 300.0,
+    },
+    # safety net for queued emails whose flush task was never queued
+    'flush-email-outbox': {
+        'task': 'listings.tasks.flush_email_outbox',
+        'schedule': 60.0,
+    },
+    # host report stats for the nights bookings changed since the last run
+    'rollup-listing-stats': {
+        'task': 'listings.tasks.rollup_listing_stats',
+        'schedule': crontab(hour=env.int('STATS_ROLLUP_HOUR', default=2), minute=0),
+    },
+}
+
+# CACHE SETTINGS
+# "locmem" keeps entries per process; "redis" shares them across workers
+CACHE_BACKEND = env('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('CACHE_REDIS_URL', default=CELERY_BROKER_URL),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'alx-travel-app',
+        }
+    }
+
+# entries every worker must see (idempotency keys, job locks, cached
+# listing reads and their invalidations) go to "shared": the redis server
+# when there is one, otherwise a table in the database (created by
+# migration 0016); expired rows are purged past MAX_ENTRIES
+if CACHE_BACKEND == 'redis':
+    CACHES['shared'] = CACHES['default']
+else:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+        'OPTIONS': {'MAX_ENTRIES': env.int('SHARED_CACHE_MAX_ENTRIES', default=100_000)},
+    }
+
+# seconds a serialized listing page or detail stays cached
+LISTING_CACHE_TIMEOUT = env.int('LISTING_CACHE_TIMEOUT', default=300)
+
+# listing search (?q=): words read from a query, and how much a name match
+# outweighs a description match (SQLite; PostgreSQL weighs names A, descriptions B)
+SEARCH_MAX_TERMS = env.int('SEARCH_MAX_TERMS', default=8)
+SEARCH_NAME_WEIGHT = env.float('SEARCH_NAME_WEIGHT', default=4.0)
+
+# listings whose dirty nights one rollup transaction recomputes, seconds a
+# rollup run holds its lock, and the longest window a host report covers
+STATS_ROLLUP_BATCH_SIZE = env.int('STATS_ROLLUP_BATCH_SIZE', default=100)
+STATS_ROLLUP_LOCK_TIMEOUT = env.int('STATS_ROLLUP_LOCK_TIMEOUT', default=3600)
+STATS_MAX_DAYS = env.int('STATS_MAX_DAYS', default=366)
+
+# rows one bulk booking import may hold, and rows a booking export reads
+# from the database cursor (and writes to the client) at a time
+BOOKING_IMPORT_MAX_ROWS = env.int('BOOKING_IMPORT_MAX_ROWS', default=5000)
+BOOKING_EXPORT_CHUNK_SIZE = env.int('BOOKING_EXPORT_CHUNK_SIZE', default=2000)
+
+# seconds a response to an Idempotency-Key request is replayed for, and how
+# long a key stays locked while its first request runs (above the gateway timeout)
+IDEMPOTENCY_TTL = env.int('IDEMPOTENCY_TTL', default=24 * 3600)
+IDEMPOTENCY_LOCK_TIMEOUT = env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=60)
+
+# bearer token required to scrape /metrics; empty leaves it open under
+# DEBUG and closed otherwise
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
 
 if env("ENVIRONMENT").lower() == "PRODUCTION": #type:ignore
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https') 
@@ -219,9 +328,62 @@ PAYMENT_VERIFY_URL=env('CHAPA_VERIFY_URL')
 PAYMENT_CANCEL_URL=''
 WEBHOOK_SECRET=env('WEBHOOK_SECRET_HASH')
 WEBHOOK_URL=env('WEBHOOK_URL')
-
-# Use Django's SMTP backend
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# "sync" calls Chapa inside the request; "async" queues a Celery task and returns 202
+PAYMENT_INITIATION_MODE=env('PAYMENT_INITIATION_MODE', default='sync')
+PAYMENT_API_TIMEOUT=env.float('PAYMENT_API_TIMEOUT', default=10.0)
+PAYMENT_API_CONNECT_TIMEOUT=env.float('PAYMENT_API_CONNECT_TIMEOUT', default=3.05)
+# keep-alive connections held open to the gateway per process
+PAYMENT_API_POOL_SIZE=env.int('PAYMENT_API_POOL_SIZE', default=10)
+# gateway calls one ASGI worker keeps in flight at once
+PAYMENT_ASYNC_MAX_CONNECTIONS=env.int('PAYMENT_ASYNC_MAX_CONNECTIONS', default=500)
+# consecutive failures that open the circuit, and how long it stays open
+PAYMENT_BREAKER_THRESHOLD=env.int('PAYMENT_BREAKER_THRESHOLD', default=5)
+PAYMENT_BREAKER_RESET_SECONDS=env.float('PAYMENT_BREAKER_RESET_SECONDS', default=30.0)
+
+# webhook events verified per batch, gateway calls in flight per batch,
+# seconds to gather a burst before draining, and retry/claim limits
+WEBHOOK_BATCH_SIZE=env.int('WEBHOOK_BATCH_SIZE', default=200)
+WEBHOOK_VERIFY_CONCURRENCY=env.int('WEBHOOK_VERIFY_CONCURRENCY', default=8)
+WEBHOOK_DRAIN_DELAY=env.int('WEBHOOK_DRAIN_DELAY', default=2)
+WEBHOOK_MAX_ATTEMPTS=env.int('WEBHOOK_MAX_ATTEMPTS', default=5)
+WEBHOOK_CLAIM_TIMEOUT=env.int('WEBHOOK_CLAIM_TIMEOUT', default=600)
+# seconds before the first retry of a failed verification, doubling per
+# attempt up to the max
+WEBHOOK_RETRY_DELAY=env.float('WEBHOOK_RETRY_DELAY', default=30.0)
+WEBHOOK_RETRY_MAX_DELAY=env.float('WEBHOOK_RETRY_MAX_DELAY', default=1800.0)
+PAYMENT_TASK_MAX_RETRIES=env.int('PAYMENT_TASK_MAX_RETRIES', default=5)
+# a queued payment still PENDING after this many seconds, e.g. because its
+# message was lost, is queued again the next time its status is polled
+PAYMENT_REQUEUE_AFTER=env.int('PAYMENT_REQUEUE_AFTER', default=300)
+
+# PROCESSING payments untouched this many seconds are verified by the
+# reconciler, in chunks of BATCH_SIZE with CONCURRENCY gateway calls in
+# flight and at most RATE calls per second; unpaid checkouts older than
+# PAYMENT_CHECKOUT_EXPIRY seconds are marked failed
+PAYMENT_RECONCILE_AFTER=env.int('PAYMENT_RECONCILE_AFTER', default=900)
+PAYMENT_RECONCILE_BATCH_SIZE=env.int('PAYMENT_RECONCILE_BATCH_SIZE', default=500)
+PAYMENT_RECONCILE_CONCURRENCY=env.int('PAYMENT_RECONCILE_CONCURRENCY', default=8)
+PAYMENT_RECONCILE_RATE=env.float('PAYMENT_RECONCILE_RATE', default=20.0)
+PAYMENT_RECONCILE_LOCK_TIMEOUT=env.int('PAYMENT_RECONCILE_LOCK_TIMEOUT', default=3600)
+PAYMENT_CHECKOUT_EXPIRY=env.int('PAYMENT_CHECKOUT_EXPIRY', default=24 * 3600)
+
+# Django's SMTP backend by default; the locmem or filebased backends
+# (with EMAIL_FILE_PATH) keep mail local for tests and benchmarks
+EMAIL_BACKEND = env('EMAIL_BACKEND', default="django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = env('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'logs', 'emails'))
+
+# seconds bookings' emails are gathered before a flush, emails claimed per
+# batch, messages sent per second (with bursts up to EMAIL_RATE_BURST),
+# and retry/claim limits
+EMAIL_BATCH_WINDOW = env.int('EMAIL_BATCH_WINDOW', default=5)
+EMAIL_BATCH_SIZE = env.int('EMAIL_BATCH_SIZE', default=100)
+EMAIL_RATE_LIMIT = env.float('EMAIL_RATE_LIMIT', default=10.0)
+EMAIL_RATE_BURST = env.int('EMAIL_RATE_BURST', default=10)
+EMAIL_MAX_ATTEMPTS = env.int('EMAIL_MAX_ATTEMPTS', default=5)
+EMAIL_CLAIM_TIMEOUT = env.int('EMAIL_CLAIM_TIMEOUT', default=600)
+# seconds before the first retry of a failed send, doubling per attempt up to the max
+EMAIL_RETRY_DELAY = env.float('EMAIL_RETRY_DELAY', default=60.0)
+EMAIL_RETRY_MAX_DELAY = env.float('EMAIL_RETRY_MAX_DELAY', default=3600.0)
 
 # Default "from" email address
 DEFAULT_FROM_EMAIL = env('ADMIN_EMAIL')
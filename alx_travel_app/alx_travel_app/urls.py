@@ -3,6 +3,7 @@ from django.urls import path, re_path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from utils.metrics import metrics_view
 
 
 schema_view = get_schema_view(
@@ -23,6 +24,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 
     path('api/v1/', include('listings.urls')),
 
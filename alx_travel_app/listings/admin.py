@@ -9,6 +9,8 @@ from django.contrib.auth.forms import (
 from django.utils.translation import gettext_lazy as _
 
 from listings.models import Booking, Listing, Review
+from listings.payloads import delay_with_id
+from listings.tasks import send_booking_confirmation_email
 
 
 User = get_user_model()
@@ -77,10 +79,18 @@ class ListingAdmin(admin.ModelAdmin):
     Admin view for listings with inline reviews.
     """
     inlines = [ReviewInline]
-    list_display = ("name", "host", "price_per_night", "created_at")
+    list_display = ("name", "host", "price_per_night", "rating_avg", "rating_count", "created_at")
     list_filter = ("host",)
     search_fields = ("name", "description")
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches through the full-text index instead of icontains scans.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return queryset.search(search_term), False
+
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -91,11 +101,19 @@ class BookingAdmin(admin.ModelAdmin):
     list_filter = ("status", "start_date", "end_date")
     search_fields = ("listing__name", "customer__username")
     date_hierarchy = "start_date"
+    actions = ["resend_confirmation_email"]
 
     @admin.display(description="Total Price (GHS)")
     def total_price_display(self, obj):
         return f"GH₵{obj.total_price / 100:.2f}"
 
+    @admin.action(description="Re-send confirmation email")
+    def resend_confirmation_email(self, request, queryset):
+        booking_ids = list(queryset.values_list("pk", flat=True))
+        for booking_id in booking_ids:
+            delay_with_id(send_booking_confirmation_email, booking_id)
+        self.message_user(request, f"Queued {len(booking_ids)} confirmation email(s).")
+
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -106,3 +124,8 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ("rating",)
     search_fields = ("listing__name", "customer__username")
     readonly_fields = ("created_at",)
+
+    def delete_queryset(self, request, queryset):
+        # delete one by one so each review leaves the listing aggregates
+        for review in queryset:
+            review.delete()
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def restore_search_index(sender, using, **kwargs):
+    """
+    Puts the SQLite search triggers back after a migration rebuilt the
+    listing table.
+    """
+    from django.db import connections
+    from listings.search import ensure_sqlite_index
+    ensure_sqlite_index(connections[using])
 
 
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from listings import signals  # noqa: F401
+        post_migrate.connect(restore_search_index, sender=self)
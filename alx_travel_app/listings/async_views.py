@@ -0,0 +1,226 @@
+"""
+Async payment endpoints, routed in place of the BookingViewSet actions and
+the webhook view when the app is served over ASGI (SERVER_MODE = 'asgi').
+
+They answer exactly like their sync counterparts, but wait on the gateway
+with httpx and on the database with the async ORM, so a single worker
+keeps hundreds of gateway calls in flight instead of one per thread.
+DRF has no async views, so authentication runs DRF's configured
+authenticators in a worker thread and responses are plain JsonResponses.
+Rows change through the same listings.payments functions the sync actions
+call, and errors are answered through the project's exception handler.
+"""
+import hashlib
+import hmac
+import json
+from functools import wraps
+from typing import Any
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from listings.gateway import GatewayUnavailable, get_async_client
+from listings.idempotency import idempotent
+from listings.models import Booking, BookingConflict, Payment
+from listings.payments import confirm_paid_booking, payment_request, queue_payment, record_checkout
+from listings.tasks import requeue_payment_initiation, schedule_webhook_drain
+from listings.webhooks import arecord_webhook_event, settle_payments
+from utils.exceptionhandler import error_response
+
+
+def _mapped_errors(view: Any) -> Any:
+    """
+    Answers the errors BookingViewSet leaves to the exception handler with
+    the handler's {"error", "status_code"} body, as DRF would.
+    """
+    @wraps(view)
+    async def wrapper(request: Any, *args: Any, **kwargs: Any) -> JsonResponse:
+        try:
+            return await view(request, *args, **kwargs)
+        except (exceptions.APIException, Http404, BookingConflict) as err:
+            return error_response(err)
+    return wrapper
+
+
+def _authenticate(request: Any) -> Any:
+    # a request without credentials comes back anonymous; failed ones (a
+    # bad token, a missing CSRF token on a session) raise what DRF raises
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    return drf_request.user
+
+
+async def _customer_booking(request: Any, pk: Any) -> tuple[Any, Booking]:
+    """
+    The authenticated user and their booking `pk`. Raises what
+    BookingViewSet would: the authenticators' errors, NotAuthenticated
+    without credentials, or Http404 when the booking is not theirs.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    booking = await Booking.objects.select_related('customer').filter(pk=pk, customer=user).afirst()
+    if booking is None:
+        raise Http404("No Booking matches the given query.")
+    return user, booking
+
+
+def _gateway_unavailable() -> JsonResponse:
+    return JsonResponse({"msg": "Payment gateway unavailable, try again later"}, status=503)
+
+
+def _queued(request: Any, booking: Booking) -> JsonResponse:
+    status_url = request.build_absolute_uri(reverse('booking-initiate-payment', args=[booking.pk]))
+    return JsonResponse(
+        {"msg": "Payment initiation queued. Poll the status URL for the checkout link",
+         "status_url": status_url},
+        status=202)
+
+
+async def _reinitiate(payment: Payment, booking: Booking) -> JsonResponse:
+    payload = payment_request(str(payment.amount), payment.currency, booking.customer.email)
+    try:
+        data = await get_async_client().initialize(payload)
+    except (httpx.HTTPError, GatewayUnavailable):
+        return _gateway_unavailable()
+
+    if data.get('status') != 'success':
+        return JsonResponse({"status": data.get('status'), "msg": data.get('message')}, status=400)
+
+    payment = await sync_to_async(record_checkout)(booking, payload, data, payment=payment)
+    return JsonResponse({"msg": "Payment re-initiated. Click Redirect Link to Pay", "redirect_url": payment.checkout_url})
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@idempotent
+@_mapped_errors
+async def initiate_payment(request: Any, pk: Any) -> JsonResponse:
+    """
+    Async BookingViewSet.initiate_payment.
+    """
+    user, booking = await _customer_booking(request, pk)
+    payment = await Payment.objects.filter(booking_reference=booking).afirst()
+
+    if request.method == 'GET':
+        return JsonResponse({
+            "Booking-Details": {
+                "booking_status": booking.status,
+                "payment_status": payment.payment_status if payment else None,
+                "checkout_url": payment.checkout_url if payment else None}
+        })
+
+    if booking.status != Booking.BookingStatus.PENDING:
+        return JsonResponse({"msg": "Booking is not pending"}, status=400)
+
+    if payment:
+        if payment.payment_status == Payment.PaymentStatus.SUCCESS:
+            await sync_to_async(confirm_paid_booking)(booking)
+            return JsonResponse({"msg": "Booking Confirmed"}, status=202)
+        if payment.payment_status in [Payment.PaymentStatus.PENDING, Payment.PaymentStatus.PROCESSING]:
+            if payment.checkout_url:
+                return JsonResponse({"msg": "Click the checkout link to pay", "checkout": payment.checkout_url})
+            if (settings.PAYMENT_INITIATION_MODE == 'async'
+                    and payment.payment_status == Payment.PaymentStatus.PENDING):
+                await sync_to_async(requeue_payment_initiation)(payment)
+                return _queued(request, booking)
+            return await _reinitiate(payment, booking)
+        if payment.payment_status in [Payment.PaymentStatus.CANCELLED, Payment.PaymentStatus.FAILED]:
+            return JsonResponse({"msg": "Payment failed or cancelled"}, status=424)
+        return JsonResponse({"msg": "Payment cannot be initiated"}, status=400)
+
+    payment_payload = payment_request(booking.total_price, "ETB", user.email)
+
+    if settings.PAYMENT_INITIATION_MODE == 'async':
+        await sync_to_async(queue_payment)(booking, payment_payload)
+        return _queued(request, booking)
+
+    try:
+        data = await get_async_client().initialize(payment_payload)
+    except (httpx.HTTPError, GatewayUnavailable):
+        return _gateway_unavailable()
+
+    if data.get('status') != 'success':
+        return JsonResponse({"status": data.get('status'), "msg": data.get('message')}, status=400)
+
+    payment = await sync_to_async(record_checkout)(booking, payment_payload, data)
+    return JsonResponse({"msg": "Payment initiated", "redirect_url": payment.checkout_url})
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@_mapped_errors
+async def verify_payment(request: Any, pk: Any) -> JsonResponse:
+    """
+    Asks the gateway for the outcome of the booking's payment and, when it
+    was paid, settles the payment and confirms the booking.
+    """
+    user, booking = await _customer_booking(request, pk)
+    payment = await Payment.objects.select_related('booking_reference').filter(booking_reference=booking).afirst()
+    if payment is None or not payment.merchant_reference:
+        return JsonResponse({"msg": "No payment has been initiated for this booking"}, status=400)
+
+    if payment.payment_status != Payment.PaymentStatus.SUCCESS:
+        try:
+            result = await get_async_client().verify(payment.merchant_reference)
+        except (httpx.HTTPError, GatewayUnavailable):
+            return _gateway_unavailable()
+        if result.get('status') == 'success':
+            payment.payment_status = Payment.PaymentStatus.SUCCESS
+            conflicting = await sync_to_async(settle_payments)([payment])
+            if conflicting:
+                return JsonResponse(
+                    {"msg": "Payment received but the dates are no longer available",
+                     "booking_status": booking.status,
+                     "payment_status": payment.payment_status},
+                    status=409)
+            booking = payment.booking_reference
+
+    return JsonResponse({
+        "msg": "Payment verified" if payment.payment_status == Payment.PaymentStatus.SUCCESS else "Payment not completed",
+        "booking_status": booking.status,
+        "payment_status": payment.payment_status,
+    })
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def chapa_webhook(request: Any) -> JsonResponse:
+    """
+    Async chapa_webhook: checks the signature, records the event and acknowledges.
+    """
+    raw_body = request.body
+    signature_header = request.headers.get('X-Chapa-Signature')
+    if not signature_header:
+        return JsonResponse({"msg": "Missing Signature"}, status=403)
+
+    expected = hmac.new(
+        key=settings.WEBHOOK_SECRET.encode('utf-8'),
+        msg=raw_body,
+        digestmod=hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature_header, expected):
+        return JsonResponse({"msg": "Invalid Signature"}, status=403)
+
+    try:
+        payload = json.loads(raw_body.decode('utf-8'))
+    except json.JSONDecodeError:
+        return JsonResponse({"ok": False, "error": "invalid json"}, status=400)
+
+    tx_ref = payload.get("tx_ref")
+    if not tx_ref:
+        return JsonResponse({"ok": False, "error": "missing tx_ref"}, status=400)
+    event_id = payload.get("reference")
+    if not event_id:
+        return JsonResponse({"ok": False, "error": "missing 'reference'"}, status=400)
+
+    # autocommit: the event is stored once abulk_create returns
+    await arecord_webhook_event(event_id, tx_ref, payload)
+    await sync_to_async(schedule_webhook_drain)()
+    return JsonResponse({"msg": "Received"})
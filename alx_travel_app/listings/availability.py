@@ -0,0 +1,123 @@
+"""
+Batch availability operations.
+
+Single bookings go through Booking.save(). Paths that handle many bookings
+at once (webhook batches, reconciliation, bulk import) use these helpers
+instead: they lock each listing once, load the confirmed stays for the
+whole batch in one query and check overlaps in memory.
+"""
+import bisect
+from collections import defaultdict
+from datetime import date
+from typing import Any, Iterable
+
+from django.db import transaction
+
+from listings.models import Booking, ListingCalendar, ListingLock, StatsDirtyRange
+
+
+class IntervalSet:
+    """
+    Non-overlapping half-open [start, end) date intervals kept sorted by
+    start. Because the intervals never overlap, sorting by start also
+    sorts them by end, so one neighbour lookup answers an overlap query.
+    """
+    def __init__(self, intervals: Iterable[tuple[date, date]] = ()) -> None:
+        self.starts: list[date] = []
+        self.ends: list[date] = []
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def overlaps(self, start: date, end: date) -> bool:
+        index = bisect.bisect_left(self.starts, end)
+        return index > 0 and self.ends[index - 1] > start
+
+    def add(self, start: date, end: date) -> None:
+        index = bisect.bisect_left(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
+def lock_listings(listing_ids: Iterable[Any]) -> None:
+    """
+    Takes the booking lock of every listing, in a fixed order so two
+    batches touching the same listings cannot deadlock.
+    """
+    for listing_id in sorted(set(listing_ids), key=str):
+        ListingLock.acquire(listing_id)
+
+
+def confirmed_intervals(listing_ids: Iterable[Any], start: date, end: date, exclude: Iterable[Any] = ()) -> dict[Any, IntervalSet]:
+    """
+    Confirmed stays overlapping [start, end) for many listings, fetched in
+    one query and grouped per listing.
+    """
+    rows = Booking.objects.filter(
+        listing_id__in=list(listing_ids),
+        status=Booking.BookingStatus.CONFIRMED,
+        end_date__gt=start,
+        start_date__lt=end
+    ).exclude(pk__in=list(exclude)).values_list('listing_id', 'start_date', 'end_date')
+
+    grouped: dict[Any, list[tuple[date, date]]] = defaultdict(list)
+    for listing_id, start_date, end_date in rows:
+        grouped[listing_id].append((start_date, end_date))
+    return defaultdict(IntervalSet, {
+        listing_id: IntervalSet(intervals) for listing_id, intervals in grouped.items()
+    })
+
+
+def confirm_bookings(bookings: list[Booking]) -> tuple[list[Booking], list[Booking]]:
+    """
+    Confirms many bookings in one transaction. Bookings that would overlap
+    an existing confirmed stay, or one confirmed earlier in the same batch,
+    are left untouched. Returns (confirmed, conflicting).
+
+    The rows are read again once their listings are locked, and the
+    instances take their current dates: a booking cancelled, confirmed or
+    moved to another listing since the caller loaded it is in neither list.
+    """
+    if not bookings:
+        return [], []
+
+    with transaction.atomic():
+        listing_ids = {booking.listing_id for booking in bookings}
+        lock_listings(listing_ids)
+        current = {
+            pk: (start_date, end_date)
+            for pk, start_date, end_date in Booking.objects.filter(
+                pk__in=[booking.pk for booking in bookings],
+                listing_id__in=listing_ids,
+                status=Booking.BookingStatus.PENDING,
+            ).values_list('pk', 'start_date', 'end_date')
+        }
+        pending = [booking for booking in bookings if booking.pk in current]
+        for booking in pending:
+            booking.status = Booking.BookingStatus.PENDING
+            booking.start_date, booking.end_date = current[booking.pk]
+        if not pending:
+            return [], []
+
+        occupied = confirmed_intervals(
+            (booking.listing_id for booking in pending),
+            min(booking.start_date for booking in pending),
+            max(booking.end_date for booking in pending),
+            exclude=[booking.pk for booking in pending]
+        )
+
+        confirmed, conflicting = [], []
+        for booking in sorted(pending, key=lambda item: (str(item.listing_id), item.start_date)):
+            intervals = occupied[booking.listing_id]
+            if intervals.overlaps(booking.start_date, booking.end_date):
+                conflicting.append(booking)
+                continue
+            intervals.add(booking.start_date, booking.end_date)
+            booking.status = Booking.BookingStatus.CONFIRMED
+            confirmed.append(booking)
+
+        Booking.objects.filter(pk__in=[booking.pk for booking in confirmed]).update(
+            status=Booking.BookingStatus.CONFIRMED)
+        stays = [(booking.listing_id, booking.start_date, booking.end_date) for booking in confirmed]
+        StatsDirtyRange.mark(stays)
+        ListingCalendar.apply(added=stays)
+    return confirmed, conflicting
@@ -0,0 +1,236 @@
+"""
+Bulk booking import and export.
+
+An import is an NDJSON or CSV upload of up to BOOKING_IMPORT_MAX_ROWS
+stays (listing, start_date, end_date). Every row is validated on its own
+and answered with its own result, so one bad row does not sink the rest.
+The valid rows are then handled as a batch: the listings are read in one
+query and locked, the confirmed stays over the whole batch are read in
+one more, and each listing's rows are checked in date order against those
+stays and against each other (see listings.availability). The accepted
+rows are written with bulk_create in the same transaction.
+
+Imported bookings are pending, like a POST /bookings/, so they leave the
+stats rollup alone; they are checked against confirmed stays and each
+other only.
+
+An export streams the bookings through the database cursor
+BOOKING_EXPORT_CHUNK_SIZE rows at a time (a server-side cursor on
+PostgreSQL), so its memory stays flat however many rows it writes. Under
+ASGI the response gets an async iterator that reads one chunk per worker
+thread call; Django would otherwise read a sync iterator to the end in a
+single call before sending anything. Its columns include the import's, so
+an export can be imported again.
+"""
+import codecs
+import csv
+import io
+import json
+from collections import defaultdict
+from itertools import chain, islice
+from typing import Any, AsyncIterator, Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from listings.availability import IntervalSet, confirmed_intervals, lock_listings
+from listings.emails import queue_confirmation_emails
+from listings.models import Booking, Listing
+from listings.serializers import BookingImportRowSerializer
+
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+EXPORT_FORMATS = {'ndjson': NDJSON, 'csv': CSV}
+EXPORT_COLUMNS = ['booking_id', 'listing', 'start_date', 'end_date', 'status', 'total_price', 'created_at']
+CONFLICT = "Listing already booked for selected dates"
+
+
+class UnreadableRow(ValueError):
+    """
+    A line of an upload that is not a row at all, e.g. broken JSON.
+    """
+
+
+def _lines(stream, encoding: str = 'utf-8') -> Iterator[str]:
+    try:
+        yield from codecs.getreader(encoding)(stream)
+    except UnicodeDecodeError as err:
+        raise ParseError(f"Uploads must be UTF-8: {err}") from err
+
+
+class NDJSONParser(BaseParser):
+    """
+    Reads an upload as one JSON object per line, lazily. Yields
+    (line number, row); blank lines are skipped.
+    """
+    media_type = NDJSON
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._rows(stream)
+
+    def _rows(self, stream) -> Iterator[tuple[int, Any]]:
+        for number, line in enumerate(_lines(stream), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as err:
+                row = UnreadableRow(f"Invalid JSON: {err}")
+            if not isinstance(row, (dict, UnreadableRow)):
+                row = UnreadableRow("Expected a JSON object.")
+            yield number, row
+
+
+class CSVParser(BaseParser):
+    """
+    Reads an upload as CSV with a header row, lazily. Yields
+    (line number, row).
+    """
+    media_type = CSV
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._rows(stream)
+
+    def _rows(self, stream) -> Iterator[tuple[int, Any]]:
+        reader = csv.DictReader(_lines(stream, 'utf-8-sig'))
+        for row in reader:
+            yield reader.line_num, row
+
+
+def _rejected(number: int, errors: Any) -> dict[str, Any]:
+    if not isinstance(errors, dict):
+        errors = {'non_field_errors': errors if isinstance(errors, list) else [str(errors)]}
+    return {'row': number, 'status': 'rejected', 'errors': errors}
+
+
+def import_bookings(rows: Iterable[tuple[int, Any]], customer: Any) -> list[dict[str, Any]]:
+    """
+    Creates a pending booking for `customer` from every valid row that
+    neither overlaps a confirmed stay nor another row for its listing.
+    Returns one result per row, in upload order. Queues each booking's
+    confirmation email, as a single create does.
+    """
+    results: dict[int, dict[str, Any]] = {}
+    stays = []
+    validator = BookingImportRowSerializer()
+    for number, row in rows:
+        if isinstance(row, UnreadableRow):
+            results[number] = _rejected(number, row)
+            continue
+        try:
+            stays.append((number, validator.run_validation(row)))
+        except serializers.ValidationError as err:
+            results[number] = _rejected(number, err.detail)
+
+    prices = dict(Listing.objects.filter(
+        pk__in={stay['listing'] for _, stay in stays}).values_list('pk', 'price_per_night'))
+    by_listing = defaultdict(list)
+    for number, stay in stays:
+        if stay['listing'] in prices:
+            by_listing[stay['listing']].append((number, stay))
+        else:
+            results[number] = _rejected(number, {'listing': ["Listing not found."]})
+
+    with transaction.atomic():
+        bookings = []
+        if by_listing:
+            lock_listings(by_listing)
+            batch = [stay for rows in by_listing.values() for _, stay in rows]
+            occupied = confirmed_intervals(
+                list(by_listing),
+                min(stay['start_date'] for stay in batch),
+                max(stay['end_date'] for stay in batch))
+        for listing_id, listing_rows in by_listing.items():
+            accepted = IntervalSet()
+            for number, stay in sorted(listing_rows, key=lambda item: item[1]['start_date']):
+                start_date, end_date = stay['start_date'], stay['end_date']
+                if occupied[listing_id].overlaps(start_date, end_date):
+                    results[number] = _rejected(number, CONFLICT)
+                    continue
+                if accepted.overlaps(start_date, end_date):
+                    results[number] = _rejected(number, "Overlaps another row of this import for the listing")
+                    continue
+                accepted.add(start_date, end_date)
+                booking = Booking(
+                    customer=customer, listing_id=listing_id, start_date=start_date, end_date=end_date,
+                    total_price=Booking.price_for(prices[listing_id], start_date, end_date))
+                bookings.append(booking)
+                results[number] = {'row': number, 'status': 'created', 'booking': booking.pk}
+
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+        queue_confirmation_emails(bookings)
+    return [results[number] for number in sorted(results)]
+
+
+def read_upload(rows: Iterable[tuple[int, Any]]) -> list[tuple[int, Any]]:
+    """
+    The rows of an upload, refusing uploads over BOOKING_IMPORT_MAX_ROWS
+    before any of them is checked.
+    """
+    limit = settings.BOOKING_IMPORT_MAX_ROWS
+    upload = list(islice(rows, limit + 1))
+    if len(upload) > limit:
+        raise serializers.ValidationError(f"An import holds at most {limit} rows.")
+    return upload
+
+
+def _export_rows(queryset: Any) -> Iterator[list[Any]]:
+    # tuples rather than model instances keep each row small; a customer's
+    # bookings come off booking_customer_created_idx already in order
+    rows = queryset.order_by('created_at').values_list(
+        'booking_id', 'listing_id', 'start_date', 'end_date', 'status', 'total_price', 'created_at')
+    for booking_id, listing_id, start_date, end_date, status, total_price, created_at in rows.iterator(
+            chunk_size=settings.BOOKING_EXPORT_CHUNK_SIZE):
+        yield [str(booking_id), str(listing_id), start_date.isoformat(), end_date.isoformat(),
+               status, f"{total_price / 100:.2f}", created_at.isoformat()]
+
+
+def _ndjson_lines(rows: Iterator[list[Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n'
+
+
+def _csv_lines(rows: Iterator[list[Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chain([EXPORT_COLUMNS], rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _next_chunk(lines: Iterator[str]) -> str:
+    # one write to the client per chunk of rows, not per row
+    return ''.join(islice(lines, settings.BOOKING_EXPORT_CHUNK_SIZE))
+
+
+def _chunks(lines: Iterator[str]) -> Iterator[str]:
+    while chunk := _next_chunk(lines):
+        yield chunk
+
+
+async def _async_chunks(lines: Iterator[str]) -> AsyncIterator[str]:
+    # thread sensitive, so every chunk is read on the thread, and through
+    # the connection, that opened the cursor
+    next_chunk = sync_to_async(_next_chunk)
+    while chunk := await next_chunk(lines):
+        yield chunk
+
+
+def export_response(queryset: Any, fmt: str, asynchronous: bool = False) -> StreamingHttpResponse:
+    """
+    A download of the bookings in `queryset` as NDJSON or CSV, written
+    while it is read. Pass `asynchronous` when served over ASGI.
+    """
+    lines = _csv_lines(_export_rows(queryset)) if fmt == 'csv' else _ndjson_lines(_export_rows(queryset))
+    chunks = _async_chunks(lines) if asynchronous else _chunks(lines)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="bookings.{fmt}"'
+    return response
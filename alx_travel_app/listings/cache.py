@@ -0,0 +1,113 @@
+"""
+Cache for serialized listing reads.
+
+Entries live in the "shared" cache, so an invalidation reaches every
+worker. A listing's detail payloads are keyed under a generation token
+of that listing, and list pages under a generation token of all
+listings; a change to a listing or one of its reviews replaces both
+tokens, retiring exactly those entries without enumerating them. A read
+takes the token before it builds, so a build that races an invalidation
+is stored under the retired token and never served.
+"""
+import hashlib
+import uuid
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+LIST_GENERATION_KEY = 'listings:list:generation'
+
+cache = ConnectionProxy(caches, 'shared')
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _new_generation() -> str:
+    # a fresh token rather than incr(), which is not atomic on every backend
+    return uuid.uuid4().hex
+
+
+def _generation_key(listing_id: Any) -> str:
+    return f"listings:detail:generation:{listing_id}"
+
+
+def _detail_key(request: Any, listing_id: Any) -> str:
+    generation = cache.get_or_set(_generation_key(listing_id), _new_generation, timeout=None)
+    # absolute URI: query string and host shape the hyperlinks
+    return f"listings:detail:{listing_id}:{generation}:{_digest(request.build_absolute_uri())}"
+
+
+def _list_key(request: Any) -> str:
+    generation = cache.get_or_set(LIST_GENERATION_KEY, _new_generation, timeout=None)
+    # absolute URI: query string picks the page, host shapes the hyperlinks
+    return f"listings:list:{generation}:{_digest(request.build_absolute_uri())}"
+
+
+def invalidate_listing(listing_id: Any) -> None:
+    """
+    Retires every cached read that may contain the listing.
+    """
+    cache.set_many({
+        _generation_key(listing_id): _new_generation(),
+        LIST_GENERATION_KEY: _new_generation(),
+    }, timeout=None)
+
+
+def page_validators(rows: list[Any], *extra: Any) -> dict[str, Any]:
+    """
+    ETag and Last-Modified inputs for a set of listings: a digest of their
+    keys and updated_at stamps, and the newest updated_at.
+    """
+    stamps = [(row.pk, row.updated_at.isoformat()) for row in rows]
+    return {
+        'etag': _digest(*stamps, *extra),
+        'last_modified': max((row.updated_at for row in rows), default=None),
+    }
+
+
+def _respond(request: Any, entry: dict[str, Any]) -> Any:
+    """
+    Answers conditional requests with 304, otherwise returns the cached data.
+    """
+    etag = quote_etag(entry['etag'])
+    last_modified = int(entry['last_modified'].timestamp()) if entry['last_modified'] else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(entry['data'])
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def cached_detail(request: Any, listing_id: Any, build: Callable[[], dict[str, Any]]) -> Any:
+    """
+    Serves a listing detail from cache, calling `build` on a miss. `build`
+    returns {"data", "etag", "last_modified"}.
+    """
+    key = _detail_key(request, listing_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = build()
+        cache.set(key, entry, settings.LISTING_CACHE_TIMEOUT)
+    return _respond(request, entry)
+
+
+def cached_page(request: Any, build: Callable[[], dict[str, Any]]) -> Any:
+    """
+    Serves a page of listings from cache, calling `build` on a miss.
+    """
+    key = _list_key(request)
+    entry = cache.get(key)
+    if entry is None:
+        entry = build()
+        cache.set(key, entry, settings.LISTING_CACHE_TIMEOUT)
+    return _respond(request, entry)
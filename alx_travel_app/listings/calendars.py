@@ -0,0 +1,85 @@
+"""
+Booked-night bitmaps behind the listing calendar.
+
+ListingCalendar keeps one row per listing and year whose `nights` holds
+one bit per night of the year, 1 January first, most significant bit of
+each byte first; a set bit is a night inside a confirmed stay. A stay
+books the nights [start_date, end_date), the same nights the overlap
+checks and the availability search treat as taken.
+
+Confirmed stays never overlap, so a stay can be added by setting its
+bits and removed by clearing them without looking at the others. Every
+path that moves a stay into or out of CONFIRMED (Booking.save(),
+confirm_bookings(), deleting a booking) does so in the same transaction
+as the change, which keeps each year's calendar one row read away.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Iterable, Iterator
+
+# 366 nights, one bit each
+YEAR_BYTES = 46
+
+
+def year_spans(start: date, end: date) -> Iterator[tuple[int, int, int]]:
+    """
+    (year, first night, stop night) for each year [start, end) falls in,
+    counting the nights of a year from 1 January as 0.
+    """
+    while start < end:
+        stop = min(end, date(start.year + 1, 1, 1))
+        first = start.timetuple().tm_yday - 1
+        yield start.year, first, first + (stop - start).days
+        start = stop
+
+
+def set_nights(bitmap: bytearray, first: int, stop: int, booked: bool) -> None:
+    for night in range(first, stop):
+        if booked:
+            bitmap[night >> 3] |= 0x80 >> (night & 7)
+        else:
+            bitmap[night >> 3] &= ~(0x80 >> (night & 7)) & 0xFF
+
+
+def stay_changes(added: Iterable[tuple], removed: Iterable[tuple]) -> dict[tuple[Any, int], list[tuple[int, int, bool]]]:
+    """
+    Groups (listing_id, start_date, end_date) stays by the calendar row
+    they touch, removals first, so a stay moved onto nights it already
+    held ends up booked.
+    """
+    changes = defaultdict(list)
+    for stays, booked in ((removed, False), (added, True)):
+        for listing_id, start_date, end_date in stays:
+            for year, first, stop in year_spans(start_date, end_date):
+                changes[listing_id, year].append((first, stop, booked))
+    return changes
+
+
+def build_bitmaps(stays: Iterable[tuple]) -> dict[tuple[Any, int], bytes]:
+    """
+    Calendar rows from scratch for confirmed (listing_id, start_date,
+    end_date) stays.
+    """
+    bitmaps = {}
+    for key, spans in stay_changes(stays, ()).items():
+        bitmap = bytearray(YEAR_BYTES)
+        for first, stop, booked in spans:
+            set_nights(bitmap, first, stop, booked)
+        bitmaps[key] = bytes(bitmap)
+    return bitmaps
+
+
+def month_nights(bitmap: bytes | None, year: int) -> list[dict[str, Any]]:
+    """
+    The calendar of a year as a string per month, one character per
+    night: "1" booked, "0" free.
+    """
+    bits = ''.join(format(byte, '08b') for byte in bitmap or bytes(YEAR_BYTES))
+    months = []
+    night = 0
+    for month in range(1, 13):
+        first = date(year, month, 1)
+        days = ((first + timedelta(days=31)).replace(day=1) - first).days
+        months.append({'month': first.strftime('%Y-%m'), 'nights': bits[night:night + days]})
+        night += days
+    return months
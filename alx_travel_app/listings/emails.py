@@ -0,0 +1,213 @@
+"""
+Batched notification email.
+
+Views queue an OutboundEmail row next to the booking it is about and
+return. A worker then claims queued rows in batches, loads their bookings
+in one query and sends the whole batch over a single mail server
+connection, paced to EMAIL_RATE_LIMIT messages a second, instead of
+opening a connection per message.
+"""
+import smtplib
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from listings.gateway import RateLimiter, retry_delay
+from listings.models import Booking, OutboundEmail
+from utils.logger import logger
+
+Status = OutboundEmail.EmailStatus
+# the server refused this one message; the connection is still good
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def queue_confirmation_email(booking: Booking) -> OutboundEmail:
+    """
+    Queues the confirmation email for a newly created booking.
+    """
+    return OutboundEmail.objects.create(booking=booking, kind=OutboundEmail.Kind.BOOKING_CONFIRMATION)
+
+
+def queue_confirmation_emails(bookings: list[Booking]) -> list[OutboundEmail]:
+    """
+    Queues the confirmation emails of many new bookings in one insert.
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(booking=booking, kind=OutboundEmail.Kind.BOOKING_CONFIRMATION) for booking in bookings
+    ], batch_size=1000)
+
+
+def confirmation_message(booking: Booking) -> EmailMessage:
+    """
+    The booking confirmation email. Reads booking.customer and booking.listing.
+    """
+    body = (
+        f"Dear Customer,\n\n"
+        f"Your booking has been confirmed!\n\n"
+        f"Booking ID: {booking.pk}\n"
+        f"Listing: {booking.listing.name}\n"
+        f"Date: {booking.start_date}\n\n"
+        f"Thank you for choosing us!"
+    )
+    return EmailMessage(
+        subject="Booking Confirmation",
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking.customer.email],
+    )
+
+
+MESSAGE_BUILDERS = {
+    OutboundEmail.Kind.BOOKING_CONFIRMATION: confirmation_message,
+}
+
+
+def release_stale_email_claims() -> int:
+    """
+    Puts back emails claimed by a worker that died mid-batch.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.EMAIL_CLAIM_TIMEOUT)
+    return OutboundEmail.objects.filter(
+        status=Status.SENDING, claimed_at__lt=cutoff
+    ).update(status=Status.QUEUED)
+
+
+def claim_emails(limit: int, due_by: datetime | None = None) -> list[OutboundEmail]:
+    """
+    Marks up to `limit` queued emails due by `due_by` (now by default) as
+    sending for this worker and returns them with their booking, customer
+    and listing loaded.
+    """
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=Status.QUEUED, next_attempt_at__lte=due_by or timezone.now())
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        OutboundEmail.objects.filter(pk__in=ids).update(
+            status=Status.SENDING, claimed_at=timezone.now(), attempts=F('attempts') + 1)
+    return list(
+        OutboundEmail.objects.select_related('booking__customer', 'booking__listing').filter(pk__in=ids))
+
+
+def _reopen(connection: Any) -> bool:
+    connection.close()
+    try:
+        connection.open()
+    except Exception:
+        logger.warning("Could not reopen the mail server connection", exc_info=True)
+        return False
+    return True
+
+
+def send_email_batch(emails: list[OutboundEmail], connection: Any, limiter: RateLimiter) -> dict[str, Any]:
+    """
+    Sends a claimed batch over the open `connection` and records each
+    outcome. A failed email is queued again after an exponential backoff
+    until it has used EMAIL_MAX_ATTEMPTS. A message the server refuses
+    does not stop the batch; any other failure is taken for a broken
+    connection, which is reopened once: if that fails too, the rest of
+    the batch goes back unsent, without using an attempt, and the
+    returned 'connection_failed' tells the caller to stop.
+    Returns the batch's counts and timing.
+    """
+    started = time.perf_counter()
+    sent, retry, failed, unsent = [], [], [], []
+    errors: dict[Any, str] = {}
+    reconnects = 0
+    connection_failed = False
+    now = timezone.now()
+
+    for email in emails:
+        if connection_failed:
+            unsent.append(email.pk)
+            continue
+        message = MESSAGE_BUILDERS[email.kind](email.booking)
+        message.connection = connection
+        limiter.acquire()
+        try:
+            connection.send_messages([message])
+        except Exception as err:
+            errors[email.pk] = str(err)
+            if email.attempts < settings.EMAIL_MAX_ATTEMPTS:
+                retry.append((email.pk, now + retry_delay(
+                    email.attempts, settings.EMAIL_RETRY_DELAY, settings.EMAIL_RETRY_MAX_DELAY)))
+            else:
+                failed.append(email.pk)
+            if not isinstance(err, MESSAGE_ERRORS):
+                reconnects += 1
+                connection_failed = not _reopen(connection)
+            continue
+        sent.append(email.pk)
+
+    now = timezone.now()
+    with transaction.atomic():
+        OutboundEmail.objects.filter(pk__in=sent).update(status=Status.SENT, sent_at=now, error=None)
+        for pk, next_attempt_at in retry:
+            OutboundEmail.objects.filter(pk=pk).update(
+                status=Status.QUEUED, error=errors[pk], next_attempt_at=next_attempt_at)
+        for pk in failed:
+            OutboundEmail.objects.filter(pk=pk).update(status=Status.FAILED, error=errors[pk])
+        OutboundEmail.objects.filter(pk__in=unsent).update(status=Status.QUEUED, attempts=F('attempts') - 1)
+
+    seconds = time.perf_counter() - started
+    return {
+        'batch': len(emails),
+        'sent': len(sent),
+        'retry': len(retry),
+        'failed': len(failed),
+        'unsent': len(unsent),
+        'connection_failed': connection_failed,
+        'reconnects': reconnects,
+        'seconds': round(seconds, 3),
+        'messages_per_second': round(len(sent) / seconds, 1) if seconds else None,
+    }
+
+
+def flush_outbox() -> dict[str, int]:
+    """
+    Sends the emails due when it starts, batch by batch over one
+    connection. Emails put back for a retry wait for their backoff, and
+    the flush stops once the mail server cannot be reached. Logs each
+    batch's metrics and returns the totals.
+    """
+    release_stale_email_claims()
+    started = timezone.now()
+    if not OutboundEmail.objects.filter(status=Status.QUEUED, next_attempt_at__lte=started).exists():
+        return {}
+    batch_size = settings.EMAIL_BATCH_SIZE
+    limiter = RateLimiter(settings.EMAIL_RATE_LIMIT, burst=settings.EMAIL_RATE_BURST)
+    totals: Counter[str] = Counter()
+
+    # opened here, the connection stays up across send_messages calls
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception:
+        # nothing was claimed; the beat schedule tries again
+        logger.warning("Could not open the mail server connection", exc_info=True)
+        return {'connection_failed': 1}
+    try:
+        while True:
+            emails = claim_emails(batch_size, due_by=started)
+            if not emails:
+                break
+            stats = send_email_batch(emails, connection, limiter)
+            logger.info("Sent email batch", extra={"data": stats})
+            totals.update({key: stats[key] for key in ('batch', 'sent', 'retry', 'failed', 'unsent')})
+            if stats['connection_failed']:
+                totals['connection_failed'] += 1
+                break
+            if len(emails) < batch_size:
+                break
+    finally:
+        connection.close()
+    return dict(totals)
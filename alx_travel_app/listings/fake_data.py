@@ -0,0 +1,183 @@
+"""
+Deterministic fake data for seeding and benchmark fixtures.
+
+Every row is a pure function of the dataset seed, its table and its
+index: primary keys are uuid5 values, foreign keys point at indexes
+derived from the row's own random stream, and each booking sits in its
+own fixed-width slot of its listing's calendar so stays never overlap.
+Rows can therefore be generated in any order, in any chunking and in
+any process, and the same seed always yields the same dataset while
+memory stays flat however many rows are produced.
+
+Kept free of Django imports so seeding worker processes can import it
+without setting Django up; rows are plain dicts keyed by model attname.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from faker import Faker, providers
+import secrets, string, random, uuid
+from typing import Any, Iterator
+
+TABLES = ('users', 'listings', 'bookings', 'payments', 'reviews')
+
+# every booking of a listing gets its own slot: up to 3 days of slack
+# plus up to 7 nights always fits
+SLOT_DAYS = 11
+
+
+class FakerProvider(providers.BaseProvider):
+    """
+    Custom provider for Faker that adds methods to generate
+    passwords, booking statuses, and prices.
+    """
+    def user_password(self) -> str:
+        characters = string.ascii_letters + string.digits
+        return ''.join(secrets.choice(characters) for _ in range(13))
+
+    def booking_status_choice(self) -> str:
+        return self.random_element(["PND", "CFD", "CNC"])
+
+    def random_price(self) -> float:
+        return self.generator.random.uniform(100.00, 1000.99)
+
+
+@lru_cache(maxsize=None)
+def make_faker() -> Faker:
+    fake = Faker()
+    fake.add_provider(FakerProvider)
+    return fake
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """
+    A reproducible dataset of `users` users, twice as many listings and
+    bookings, one review per user and a payment per booking that was not
+    cancelled. `password` is the hash stored for every user.
+    """
+    seed: int = 0
+    users: int = 10
+    password: str = ''
+    start_date: date = date(2025, 1, 1)
+    namespace: uuid.UUID = field(init=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'namespace', uuid.uuid5(uuid.NAMESPACE_OID, f"airbnb-clone-dataset-{self.seed}"))
+
+    def count(self, table: str) -> int:
+        """
+        Number of index positions in `table`; payments skips the positions
+        of cancelled bookings, so it yields fewer rows than this.
+        """
+        return {
+            'users': self.users,
+            'listings': self.users * 2,
+            'bookings': self.users * 2,
+            'payments': self.users * 2,
+            'reviews': self.users,
+        }[table]
+
+    def rows(self, table: str, start: int = 0, stop: int | None = None) -> Iterator[dict[str, Any]]:
+        """
+        Lazily yields the rows of `table` at indexes [start, stop).
+        """
+        build = getattr(self, table[:-1])
+        for index in range(start, self.count(table) if stop is None else stop):
+            row = build(index)
+            if row is not None:
+                yield row
+
+    def uuid(self, table: str, index: int) -> uuid.UUID:
+        return uuid.uuid5(self.namespace, f"{table}:{index}")
+
+    def _random(self, table: str, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:{table}:{index}")
+
+    def _faker(self, table: str, index: int) -> Faker:
+        fake = make_faker()
+        fake.seed_instance(f"{self.seed}:{table}:{index}")
+        return fake
+
+    def _created_at(self, index: int) -> datetime:
+        epoch = datetime.combine(self.start_date, time(), tzinfo=timezone.utc) - timedelta(days=30)
+        return epoch + timedelta(seconds=index)
+
+    def price(self, listing_index: int) -> Decimal:
+        return Decimal(f"{self._random('price', listing_index).uniform(100.00, 1000.99):.2f}")
+
+    def user(self, index: int) -> dict[str, Any]:
+        fake = self._faker('users', index)
+        # the index suffix keeps usernames and emails unique
+        username = f"{fake.user_name()}{index}"
+        return {
+            'user_id': self.uuid('users', index),
+            'username': username,
+            'email': f"{username}@gmail.com",
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'password': self.password,
+            'date_joined': self._created_at(index),
+        }
+
+    def listing(self, index: int) -> dict[str, Any]:
+        fake = self._faker('listings', index)
+        return {
+            'listing_id': self.uuid('listings', index),
+            'host_id': self.uuid('users', fake.random_int(0, self.users - 1)),
+            'name': fake.catch_phrase()[:100],
+            'description': fake.text(max_nb_chars=150),
+            'price_per_night': self.price(index),
+            'created_at': self._created_at(index),
+            'updated_at': self._created_at(index),
+        }
+
+    def booking(self, index: int) -> dict[str, Any]:
+        rng = self._random('bookings', index)
+        listings = self.count('listings')
+        listing_index, slot = index % listings, index // listings
+        start_date = self.start_date + timedelta(days=slot * SLOT_DAYS + rng.randint(0, 3))
+        nights = rng.randint(3, 7)
+        return {
+            'booking_id': self.uuid('bookings', index),
+            'customer_id': self.uuid('users', rng.randrange(self.users)),
+            'listing_id': self.uuid('listings', listing_index),
+            'start_date': start_date,
+            'end_date': start_date + timedelta(days=nights),
+            'total_price': int(self.price(listing_index) * nights * 100),
+            'status': rng.choice(["PND", "CFD", "CNC"]),
+            'created_at': self._created_at(index),
+        }
+
+    def payment(self, index: int) -> dict[str, Any] | None:
+        booking = self.booking(index)
+        if booking['status'] == "CNC":
+            return None
+        return {
+            'payment_id': self.uuid('payments', index),
+            'booking_reference_id': booking['booking_id'],
+            'payment_status': "SCS" if booking['status'] == "CFD" else "PND",
+            'amount': Decimal(booking['total_price']) / 100,
+            'merchant_reference': self.uuid('payments', index).hex,
+            'created_at': booking['created_at'],
+            'updated_at': booking['created_at'],
+        }
+
+    def review(self, index: int) -> dict[str, Any]:
+        fake = self._faker('reviews', index)
+        return {
+            'review_id': self.uuid('reviews', index),
+            'customer_id': self.uuid('users', fake.random_int(0, self.users - 1)),
+            'listing_id': self.uuid('listings', fake.random_int(0, self.count('listings') - 1)),
+            'rating': fake.random_int(1, 5),
+            'comment': fake.sentence(nb_words=12),
+            'created_at': self._created_at(index),
+        }
+
+
+def chunk_rows(dataset: Dataset, table: str, start: int, stop: int) -> list[dict[str, Any]]:
+    """
+    Materialises one chunk of rows; picklable entry point for worker processes.
+    """
+    return list(dataset.rows(table, start, stop))
@@ -0,0 +1,357 @@
+"""
+Client for the Chapa payment gateway.
+
+Every payment path goes through one ChapaClient per process. It keeps a
+pooled keep-alive session (so TLS handshakes are paid once per connection,
+not once per call), applies bounded connect/read timeouts, stops calling a
+gateway that keeps failing, and records per-call latency, also charging it
+to the request being served. The async views served under ASGI use
+AsyncChapaClient, which behaves the same over httpx and shares the circuit
+breaker and metrics with the sync client.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from datetime import timedelta
+from typing import Any
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from utils.metrics import record_gateway_call
+
+
+class GatewayUnavailable(Exception):
+    """
+    Raised without calling the gateway while the circuit breaker is open,
+    and by AsyncChapaClient for an answer that is not JSON.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. After that one trial call is let through:
+    success closes the breaker, failure opens it again.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise GatewayUnavailable("Payment gateway circuit is open")
+            # half-open: let this call through, keep others out until it settles
+            self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the threads of one batch job: acquire() blocks
+    until the job is within `rate` calls per second, allowing bursts of
+    up to `burst` calls.
+    """
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_delay(attempts: int, base: float, cap: float) -> timedelta:
+    """
+    Exponential backoff before the next try of a job that has failed
+    `attempts` times: base, 2 * base, 4 * base, ... up to cap seconds.
+    """
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+class GatewayMetrics:
+    """
+    Per-operation call counts, error counts and latency totals.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._operations: dict[str, dict[str, float]] = {}
+
+    def observe(self, operation: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            stats = self._operations.setdefault(
+                operation, {'calls': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += not ok
+            stats['seconds_total'] += seconds
+            stats['seconds_max'] = max(stats['seconds_max'], seconds)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {operation: dict(stats) for operation, stats in self._operations.items()}
+
+
+class ChapaClient:
+    """
+    Thin wrapper over the two Chapa calls the app makes. Both return the
+    decoded JSON body; 4xx answers are returned as-is for the caller to
+    inspect, while transport errors and 5xx answers raise
+    requests.RequestException and count against the circuit breaker.
+    """
+    def __init__(
+        self,
+        api_key: str,
+        initialize_url: str,
+        verify_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        pool_size: int,
+        breaker: CircuitBreaker,
+        metrics: GatewayMetrics,
+    ) -> None:
+        self.initialize_url = initialize_url
+        self.verify_url = verify_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker
+        self.metrics = metrics
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+        })
+
+    def _request(self, operation: str, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            data = response.json()
+            ok = True
+            return data
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe(operation, elapsed, ok)
+            record_gateway_call(elapsed)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def initialize(self, payload: dict[str, Any]) -> dict[str, Any]:
+        """
+        Creates a hosted checkout for `payload`.
+        """
+        return self._request('initialize', 'POST', self.initialize_url, json=payload)
+
+    def verify(self, tx_ref: str) -> dict[str, Any]:
+        """
+        Looks up the outcome of the transaction with merchant reference `tx_ref`.
+        """
+        return self._request('verify', 'GET', f"{self.verify_url}/{tx_ref}")
+
+
+class AsyncChapaClient:
+    """
+    ChapaClient for async views. Transport errors and 5xx answers raise
+    httpx.HTTPError, and an answer that is not JSON GatewayUnavailable, so
+    callers handle every gateway failure as ChapaClient's do. One instance
+    holds up to `max_connections` calls in flight on its event loop.
+    """
+    def __init__(
+        self,
+        api_key: str,
+        initialize_url: str,
+        verify_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        max_connections: int,
+        breaker: CircuitBreaker,
+        metrics: GatewayMetrics,
+    ) -> None:
+        self.initialize_url = initialize_url
+        self.verify_url = verify_url
+        self.breaker = breaker
+        self.metrics = metrics
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json',
+            },
+        )
+
+    async def _request(self, operation: str, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            try:
+                data = response.json()
+            except ValueError as err:
+                raise GatewayUnavailable(f"Gateway answered {response.status_code} without JSON") from err
+            ok = True
+            return data
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe(operation, elapsed, ok)
+            record_gateway_call(elapsed)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    async def initialize(self, payload: dict[str, Any]) -> dict[str, Any]:
+        """
+        Creates a hosted checkout for `payload`.
+        """
+        return await self._request('initialize', 'POST', self.initialize_url, json=payload)
+
+    async def verify(self, tx_ref: str) -> dict[str, Any]:
+        """
+        Looks up the outcome of the transaction with merchant reference `tx_ref`.
+        """
+        return await self._request('verify', 'GET', f"{self.verify_url}/{tx_ref}")
+
+
+_client: ChapaClient | None = None
+_client_lock = threading.Lock()
+_breaker: CircuitBreaker | None = None
+_metrics: GatewayMetrics | None = None
+# httpx clients are bound to the loop they were created on
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncChapaClient]" = weakref.WeakKeyDictionary()
+
+
+def _shared() -> tuple[CircuitBreaker, GatewayMetrics]:
+    """
+    The breaker and metrics shared by every client of this process.
+    Call with _client_lock held.
+    """
+    global _breaker, _metrics
+    if _breaker is None or _metrics is None:
+        _breaker = CircuitBreaker(settings.PAYMENT_BREAKER_THRESHOLD, settings.PAYMENT_BREAKER_RESET_SECONDS)
+        _metrics = GatewayMetrics()
+    return _breaker, _metrics
+
+
+def get_client() -> ChapaClient:
+    """
+    Returns this process's shared client, building it from settings on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                breaker, metrics = _shared()
+                _client = ChapaClient(
+                    api_key=settings.PAYMENT_API_KEY,
+                    initialize_url=settings.PAYMENT_API_BASE_URL,
+                    verify_url=settings.PAYMENT_VERIFY_URL,
+                    connect_timeout=settings.PAYMENT_API_CONNECT_TIMEOUT,
+                    read_timeout=settings.PAYMENT_API_TIMEOUT,
+                    pool_size=settings.PAYMENT_API_POOL_SIZE,
+                    breaker=breaker,
+                    metrics=metrics,
+                )
+    return _client
+
+
+def get_async_client() -> AsyncChapaClient:
+    """
+    Returns the async client for the running event loop, building it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _client_lock:
+            breaker, metrics = _shared()
+            client = _async_clients[loop] = AsyncChapaClient(
+                api_key=settings.PAYMENT_API_KEY,
+                initialize_url=settings.PAYMENT_API_BASE_URL,
+                verify_url=settings.PAYMENT_VERIFY_URL,
+                connect_timeout=settings.PAYMENT_API_CONNECT_TIMEOUT,
+                read_timeout=settings.PAYMENT_API_TIMEOUT,
+                max_connections=settings.PAYMENT_ASYNC_MAX_CONNECTIONS,
+                breaker=breaker,
+                metrics=metrics,
+            )
+    return client
+
+
+def circuit_open() -> bool:
+    """
+    True while this process's breaker rejects gateway calls.
+    """
+    breaker = _breaker
+    return breaker is not None and breaker.state == 'open'
+
+
+def client_metrics() -> dict[str, dict[str, float]]:
+    """
+    Call metrics of this process's clients, without building one.
+    """
+    metrics = _metrics
+    return metrics.snapshot() if metrics is not None else {}
+
+
+def reset_client() -> None:
+    """
+    Drops the shared clients, breaker and metrics, e.g. after gateway
+    settings change in tests.
+    """
+    global _client, _breaker, _metrics
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+        _breaker = _metrics = None
+        _async_clients.clear()
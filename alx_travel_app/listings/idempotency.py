@@ -0,0 +1,155 @@
+"""
+Idempotency-Key support for POSTs that create bookings or start payments.
+
+A client that retries with the same Idempotency-Key gets the first
+response back instead of a second booking attempt or gateway call. Keys
+are scoped to the caller's credential (Authorization header or session
+cookie), method and path, and are checked before authentication, so a
+replay is answered from the cache without running the view. They live in
+the "shared" cache, which every worker process sees (redis, or a database
+table), so a retry that lands on another worker is still caught.
+
+Each key holds one compact tuple in the cache:
+    (body digest, status, content, content type)
+written with IDEMPOTENCY_TTL, so entries age out on their own. While the
+first request is running the tuple carries status IN_FLIGHT, and a retry
+arriving then gets 409 rather than running the request a second time.
+5xx answers are not kept, so a retry after a gateway outage runs again.
+"""
+import functools
+import hashlib
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.utils.connection import ConnectionProxy
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# stands in for the status code while the first request is running
+IN_FLIGHT = 0
+
+cache = ConnectionProxy(caches, 'shared')
+
+
+def _digest(*parts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def request_key(request: Any) -> tuple[str, str] | None:
+    """
+    The cache key and body digest for a request carrying an
+    Idempotency-Key, or None when the header or a credential is missing.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not key or not credential:
+        return None
+    scope = _digest(credential, request.method, request.path, key)
+    return f"idempotency:{scope}", _digest(request.body)
+
+
+def _invalid_key() -> JsonResponse:
+    return JsonResponse(
+        {"msg": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}, status=400)
+
+
+def _answer_existing(entry: tuple, fingerprint: str) -> HttpResponse:
+    """
+    The response for a retry whose key is already taken.
+    """
+    if entry[0] != fingerprint:
+        return JsonResponse(
+            {"msg": f"{IDEMPOTENCY_HEADER} was already used with a different request body"}, status=422)
+    if entry[1] == IN_FLIGHT:
+        response = JsonResponse(
+            {"msg": "A request with this Idempotency-Key is still being processed"}, status=409)
+        response['Retry-After'] = '1'
+        return response
+    _, status, content, content_type = entry
+    response = HttpResponse(content, status=status, content_type=content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _entry(fingerprint: str, response: Any) -> tuple | None:
+    if response.status_code >= 500:
+        return None
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return fingerprint, response.status_code, bytes(response.content), response.get('Content-Type')
+
+
+def _too_long(request: Any) -> bool:
+    return len(request.headers.get(IDEMPOTENCY_HEADER, '')) > MAX_KEY_LENGTH
+
+
+def run_once(request: Any, view: Callable[[], Any]) -> Any:
+    """
+    Calls `view` unless the request is a retry of one already answered
+    or still running.
+    """
+    if _too_long(request):
+        return _invalid_key()
+    keys = request_key(request)
+    if keys is None:
+        return view()
+    key, fingerprint = keys
+
+    if not cache.add(key, (fingerprint, IN_FLIGHT), timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+        entry = cache.get(key)
+        if entry is not None:
+            return _answer_existing(entry, fingerprint)
+
+    try:
+        response = view()
+    except BaseException:
+        cache.delete(key)
+        raise
+    entry = _entry(fingerprint, response)
+    if entry is None:
+        cache.delete(key)
+    else:
+        cache.set(key, entry, timeout=settings.IDEMPOTENCY_TTL)
+    return response
+
+
+def idempotent(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    run_once for async function views.
+    """
+    @functools.wraps(view)
+    async def wrapper(request: Any, *args: Any, **kwargs: Any) -> Any:
+        if request.method != 'POST':
+            return await view(request, *args, **kwargs)
+        if _too_long(request):
+            return _invalid_key()
+        keys = request_key(request)
+        if keys is None:
+            return await view(request, *args, **kwargs)
+        key, fingerprint = keys
+
+        if not await cache.aadd(key, (fingerprint, IN_FLIGHT), timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            entry = await cache.aget(key)
+            if entry is not None:
+                return _answer_existing(entry, fingerprint)
+
+        try:
+            response = await view(request, *args, **kwargs)
+        except BaseException:
+            await cache.adelete(key)
+            raise
+        entry = _entry(fingerprint, response)
+        if entry is None:
+            await cache.adelete(key)
+        else:
+            await cache.aset(key, entry, timeout=settings.IDEMPOTENCY_TTL)
+        return response
+
+    return wrapper
@@ -0,0 +1,227 @@
+from typing import Any, Callable
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.contrib.auth import get_user_model
+from listings.fake_data import Dataset
+from listings.gateway import reset_client
+from listings.models import Booking, Payment
+from listings.seeding import bulk_load
+from listings.management.commands.bench_webhooks import signed_webhook
+from alx_travel_app.celery import app as celery_app
+from rest_framework.test import APIClient
+from datetime import date, timedelta
+from pathlib import Path
+import json, random, statistics, subprocess, time
+from utils.bench import rolled_back, summarize
+from utils.fake_chapa import FakeChapaServer
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+
+def measure(call: Callable[[int], Any], repeat: int, setup: Callable[[int], Any] | None = None, expect: tuple[int, ...] = (200,)) -> dict[str, Any]:
+    """
+    Times `repeat` calls of `call(i)` and counts the SQL queries each one
+    issues. `setup(i)` runs before each call, outside the measurement.
+    """
+    samples, queries = [], []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call(i)
+            samples.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        if response.status_code not in expect:
+            raise AssertionError(f"request {i} answered {response.status_code}: {response.content[:200]!r}")
+    return {
+        **summarize(samples),
+        'queries_mean': statistics.fmean(queries),
+        'queries_max': max(queries),
+    }
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def clear_caches() -> None:
+    # listing reads live in "shared", the rest in "default"
+    for cache in caches.all():
+        cache.clear()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency and queries per request of the API hot paths'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Dataset size in users (listings and bookings will be 2x this)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Dataset seed, keep it fixed when comparing commits'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=100,
+            help='Number of timed requests per scenario'
+        )
+        parser.add_argument(
+            '--gateway-delay',
+            type=float,
+            default=0.0,
+            help='Seconds the fake gateway takes to answer each call'
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            default=None,
+            help='Write the results as JSON to this file'
+        )
+        parser.add_argument(
+            '--compare',
+            type=Path,
+            default=None,
+            help='JSON results of an earlier run to print p95 changes against'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Loads a generated dataset in a rolled back transaction, points the
+        payment gateway at a local fake and runs every scenario against
+        the API through the test client.
+        """
+        repeat = options['repeat']
+        dataset = Dataset(seed=options['seed'], users=options['users'])
+        rng = random.Random(options['seed'])
+
+        # private caches so cold reads are repeatable and the real ones are untouched
+        # (one process, so "shared" can live in memory too); tasks run inline and
+        # mail stays in memory so no broker or SMTP is needed
+        isolated = override_settings(
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'bench-api-{alias}'}
+                for alias in ('default', 'shared')
+            },
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        )
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+
+        try:
+            with isolated, FakeChapaServer(delay=options['gateway_delay']) as chapa, rolled_back():
+                settings.PAYMENT_API_BASE_URL = chapa.initialize_url
+                settings.PAYMENT_VERIFY_URL = chapa.verify_url
+                reset_client()
+
+                for table, rows, elapsed in bulk_load(dataset):
+                    self.stdout.write(f"loaded {rows} {table} in {elapsed:.2f}s")
+                results = self.run_scenarios(dataset, repeat, rng)
+        finally:
+            celery_app.conf.task_always_eager = eager
+            reset_client()
+
+        report = {
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'users': dataset.users,
+            'seed': dataset.seed,
+            'repeat': repeat,
+            'payment_initiation_mode': settings.PAYMENT_INITIATION_MODE,
+            'results': results,
+        }
+        baseline = json.loads(options['compare'].read_text()) if options['compare'] else None
+
+        self.stdout.write(
+            f"{'scenario':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}"
+            + (f" {'p95 change':>11}" if baseline else ""))
+        for name, result in results.items():
+            line = (
+                f"{name:<24} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['p99_ms']:>9.2f} {result['queries_mean']:>8.1f}")
+            previous = baseline['results'].get(name) if baseline else None
+            if previous and previous['p95_ms']:
+                line += f" {(result['p95_ms'] / previous['p95_ms'] - 1) * 100:>+10.1f}%"
+            self.stdout.write(line)
+
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"results written to {options['output']}")
+        self.stdout.write(self.style.SUCCESS("API benchmark complete."))
+
+    def run_scenarios(self, dataset: Dataset, repeat: int, rng: random.Random) -> dict[str, dict[str, Any]]:
+        host = settings.ALLOWED_HOSTS[0]
+        anonymous = APIClient(HTTP_HOST=host)
+        listing_ids = [dataset.uuid('listings', i) for i in range(dataset.count('listings'))]
+        results = {}
+
+        results['listing_list'] = measure(
+            lambda i: anonymous.get('/api/v1/listings/', {'page_size': 20}),
+            repeat, setup=lambda i: clear_caches())
+        results['listing_list_cached'] = measure(
+            lambda i: anonymous.get('/api/v1/listings/', {'page_size': 20}), repeat)
+        results['listing_detail'] = measure(
+            lambda i: anonymous.get(f'/api/v1/listings/{rng.choice(listing_ids)}/'),
+            repeat, setup=lambda i: clear_caches())
+        results['listing_detail_cached'] = measure(
+            lambda i: anonymous.get(f'/api/v1/listings/{listing_ids[0]}/'), repeat)
+
+        # the busiest customer, so the list is as long as the dataset allows
+        customer = User.objects.get(pk=Booking.objects.values('customer').annotate(
+            total=Count('pk')).order_by('-total').values_list('customer', flat=True)[0])
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(customer)
+        results['booking_list'] = measure(lambda i: client.get('/api/v1/bookings/'), repeat)
+
+        # dated after every generated stay so none of them conflict
+        first_free = Booking.objects.order_by('-end_date').values_list('end_date', flat=True)[0] + timedelta(days=1)
+        def create_booking(i: int) -> Any:
+            start = max(first_free, date.today() + timedelta(days=1)) + timedelta(days=3 * i)
+            return client.post('/api/v1/bookings/', {
+                'listing': f'http://{host}/api/v1/listings/{rng.choice(listing_ids)}/',
+                'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=2)).isoformat(),
+            }, format='json')
+
+        results['booking_create'] = measure(create_booking, repeat, expect=(201,))
+
+        # the bookings just created are pending and have no payment yet
+        pending = list(Booking.objects.filter(
+            customer=customer, status=Booking.BookingStatus.PENDING, booking_payment__isnull=True
+        ).values_list('pk', flat=True))
+        results['initiate_payment_post'] = measure(
+            lambda i: client.post(f'/api/v1/bookings/{pending[i]}/initiate_payment/'),
+            min(repeat, len(pending)), expect=(200, 202))
+        results['initiate_payment_get'] = measure(
+            lambda i: client.get(f'/api/v1/bookings/{pending[i % len(pending)]}/initiate_payment/'), repeat)
+
+        references = list(Payment.objects.exclude(
+            payment_status=Payment.PaymentStatus.SUCCESS
+        ).values_list('merchant_reference', flat=True)[:repeat])
+        webhook = APIClient(HTTP_HOST=host)
+        results['chapa_webhook'] = measure(
+            lambda i: signed_webhook(webhook, {
+                'tx_ref': references[i % len(references)], 'reference': f'bench-{i}', 'status': 'success'}),
+            repeat)
+        return results
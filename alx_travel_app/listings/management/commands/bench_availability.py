@@ -0,0 +1,101 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from listings.models import Listing, Booking
+from datetime import date, timedelta
+import random
+from utils.bench import rolled_back, summarize, time_calls
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+STAY_NIGHTS = 2
+
+
+def build_listing_history(host: Any, bookings: int) -> Listing:
+    """
+    Creates a listing carrying `bookings` back-to-back confirmed stays that
+    end today, mimicking a listing with a long booking history.
+    """
+    listing = Listing.objects.create(
+        host=host,
+        name=f"Benchmark listing ({bookings} bookings)",
+        description="Availability benchmark fixture",
+        price_per_night=100
+    )
+    first_day = date.today() - timedelta(days=bookings * STAY_NIGHTS)
+    Booking.objects.bulk_create(
+        (
+            Booking(
+                customer=host,
+                listing=listing,
+                start_date=first_day + timedelta(days=i * STAY_NIGHTS),
+                end_date=first_day + timedelta(days=(i + 1) * STAY_NIGHTS),
+                total_price=STAY_NIGHTS * 100 * 100,
+                status=Booking.BookingStatus.CONFIRMED
+            )
+            for i in range(bookings)
+        ),
+        batch_size=1000
+    )
+    return listing
+
+
+class Command(BaseCommand):
+    help = 'Benchmark overlap-check latency as bookings per listing grow'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--sizes',
+            type=lambda value: [int(size) for size in value.split(',')],
+            default=[10, 100, 1000, 10000],
+            help='Comma separated bookings-per-listing sizes to measure'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Number of timed lookups per size'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Seeds one listing per size inside a rolled back transaction and times
+        single-listing and all-listing availability lookups against it.
+        """
+        sizes = options['sizes']
+        repeat = options['repeat']
+
+        self.stdout.write(
+            f"{'bookings':>10} {'check p50 ms':>13} {'check p95 ms':>13} "
+            f"{'search p50 ms':>14} {'search p95 ms':>14}")
+
+        with rolled_back():
+            host = User.objects.create_user(username='bench-availability-host')
+            listings = []
+            for size in sizes:
+                listing = build_listing_history(host, size)
+                listings.append(listing)
+
+                def check() -> bool:
+                    offset = random.randint(-size * STAY_NIGHTS, 30)
+                    start = date.today() + timedelta(days=offset)
+                    return listing.is_available(start, start + timedelta(days=3))
+
+                def search() -> int:
+                    start = date.today() + timedelta(days=random.randint(0, 30))
+                    return Listing.objects.filter(
+                        pk__in=[item.pk for item in listings]
+                    ).available_between(start, start + timedelta(days=3)).count()
+
+                checks = summarize(time_calls(check, repeat))
+                searches = summarize(time_calls(search, repeat))
+                self.stdout.write(
+                    f"{size:>10} {checks['p50_ms']:>13.3f} {checks['p95_ms']:>13.3f} "
+                    f"{searches['p50_ms']:>14.3f} {searches['p95_ms']:>14.3f}")
+
+        self.stdout.write(self.style.SUCCESS("Availability benchmark complete."))
@@ -0,0 +1,120 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from django.db import connections, OperationalError
+from listings.models import Listing, Booking, BookingConflict, ListingLock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import random, time, uuid
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+
+def find_overlaps(bookings: list[Booking]) -> int:
+    """
+    Counts adjacent overlapping pairs among confirmed bookings sorted by start date.
+    """
+    ordered = sorted(bookings, key=lambda booking: booking.start_date)
+    return sum(
+        1 for earlier, later in zip(ordered, ordered[1:])
+        if later.start_date < earlier.end_date
+    )
+
+
+class Command(BaseCommand):
+    help = 'Fire parallel confirmed bookings at one listing and report conflicts'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of threads booking concurrently'
+        )
+        parser.add_argument(
+            '--attempts',
+            type=int,
+            default=200,
+            help='Total number of booking attempts'
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=60,
+            help='Number of days the attempted stays are spread over'
+        )
+
+    def attempt(self, customer: Any, listing: Listing, window: int) -> str:
+        """
+        Tries to save one confirmed booking on its own DB connection.
+        """
+        start_date = date.today() + timedelta(days=random.randint(1, window))
+        try:
+            Booking(
+                customer=customer,
+                listing=listing,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=random.randint(2, 5)),
+                status=Booking.BookingStatus.CONFIRMED
+            ).save()
+            return 'booked'
+        except BookingConflict:
+            return 'conflict'
+        except OperationalError:
+            return 'error'
+        finally:
+            connections.close_all()
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Creates a throwaway listing, books it from many threads at once, then
+        checks that no two confirmed bookings overlap and removes the fixtures.
+        """
+        workers = options['workers']
+        attempts = options['attempts']
+        window = options['window']
+
+        customer = User.objects.create_user(
+            username=f'bench-concurrency-{uuid.uuid4().hex[:8]}')
+        listing = Listing.objects.create(
+            host=customer,
+            name='Concurrency benchmark listing',
+            description='Booking concurrency benchmark fixture',
+            price_per_night=100
+        )
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(
+                    lambda _: self.attempt(customer, listing, window), range(attempts)))
+            elapsed = time.perf_counter() - started
+
+            confirmed = list(Booking.objects.filter(
+                listing=listing, status=Booking.BookingStatus.CONFIRMED))
+            overlaps = find_overlaps(confirmed)
+
+            self.stdout.write(f"attempts:     {attempts} over {workers} workers")
+            self.stdout.write(f"throughput:   {attempts / elapsed:.1f} attempts/s")
+            self.stdout.write(f"booked:       {outcomes.count('booked')}")
+            self.stdout.write(
+                f"conflicts:    {outcomes.count('conflict')} "
+                f"({outcomes.count('conflict') / attempts:.1%})")
+            self.stdout.write(f"db errors:    {outcomes.count('error')}")
+            self.stdout.write(f"overlaps:     {overlaps}")
+        finally:
+            Booking.objects.filter(listing=listing).delete()
+            ListingLock.objects.filter(listing=listing).delete()
+            listing.delete()
+            customer.delete()
+
+        if overlaps:
+            self.stderr.write(self.style.ERROR(
+                f"{overlaps} overlapping confirmed bookings were written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No overlapping confirmed bookings."))
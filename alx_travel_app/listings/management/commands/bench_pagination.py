@@ -0,0 +1,124 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from listings.models import Listing
+from listings.pagination import KeysetPagination
+from rest_framework.pagination import PageNumberPagination, Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from urllib.parse import urlparse, parse_qs
+from utils.bench import rolled_back, summarize, time_calls
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+factory = APIRequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+
+def offset_page(queryset: Any, page: int, page_size: int) -> list:
+    """
+    Fetches one page the way PageNumberPagination does: COUNT(*) then OFFSET.
+    """
+    paginator = PageNumberPagination()
+    paginator.page_size = page_size
+    request = Request(factory.get('/', {'page': page}))
+    return list(paginator.paginate_queryset(queryset, request))
+
+
+def cursor_for(queryset: Any, page: int, page_size: int) -> str:
+    """
+    Builds the cursor a client would hold after walking to `page`.
+    """
+    paginator = KeysetPagination()
+    paginator.base_url = 'http://testserver/'
+    position = queryset.values_list('created_at', flat=True)[(page - 1) * page_size - 1]
+    url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+    return parse_qs(urlparse(url).query)['cursor'][0]
+
+
+def cursor_page(queryset: Any, cursor: str | None, page_size: int) -> list:
+    """
+    Fetches one page through KeysetPagination from a held cursor.
+    """
+    paginator = KeysetPagination()
+    params: dict[str, Any] = {'page_size': page_size}
+    if cursor:
+        params['cursor'] = cursor
+    request = Request(factory.get('/', params))
+    return list(paginator.paginate_queryset(queryset, request))
+
+
+class Command(BaseCommand):
+    help = 'Compare page-N latency of offset and cursor pagination over listings'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100_000,
+            help='Number of listings to paginate over'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Rows per page'
+        )
+        parser.add_argument(
+            '--pages',
+            type=lambda value: [int(page) for page in value.split(',')],
+            default=[2, 10, 100, 1000, 4000],
+            help='Comma separated page numbers to measure'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Number of timed fetches per page'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Bulk creates listings in a rolled back transaction and times the
+        same page under both pagination schemes.
+        """
+        rows = options['rows']
+        page_size = options['page_size']
+        repeat = options['repeat']
+        pages = [page for page in options['pages'] if (page - 1) * page_size < rows]
+
+        with rolled_back():
+            host = User.objects.create_user(username='bench-pagination-host')
+            Listing.objects.bulk_create(
+                (
+                    Listing(
+                        host=host,
+                        name=f"Listing {i}",
+                        description="Pagination benchmark fixture",
+                        price_per_night=100
+                    )
+                    for i in range(rows)
+                ),
+                batch_size=2000
+            )
+            queryset = Listing.objects.all()
+
+            self.stdout.write(
+                f"{'page':>6} {'offset p50 ms':>14} {'offset p95 ms':>14} "
+                f"{'cursor p50 ms':>14} {'cursor p95 ms':>14}")
+            for page in pages:
+                offset = summarize(time_calls(
+                    lambda: offset_page(queryset, page, page_size), repeat))
+                cursor = cursor_for(queryset, page, page_size) if page > 1 else None
+                keyset = summarize(time_calls(
+                    lambda: cursor_page(queryset, cursor, page_size), repeat))
+                self.stdout.write(
+                    f"{page:>6} {offset['p50_ms']:>14.3f} {offset['p95_ms']:>14.3f} "
+                    f"{keyset['p50_ms']:>14.3f} {keyset['p95_ms']:>14.3f}")
+
+        self.stdout.write(self.style.SUCCESS("Pagination benchmark complete."))
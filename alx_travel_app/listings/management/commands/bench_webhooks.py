@@ -0,0 +1,127 @@
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from listings.models import Listing, Booking, Payment, WebhookEvent
+from listings.gateway import reset_client
+from listings.webhooks import claim_webhook_events, process_webhook_batch
+from rest_framework.test import APIClient
+from datetime import date, timedelta
+import hashlib, hmac, json, random, time
+from utils.bench import rolled_back, summarize
+from utils.fake_chapa import FakeChapaServer
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+
+def signed_webhook(client: APIClient, payload: dict[str, Any]) -> Any:
+    """
+    Posts a webhook body signed the way Chapa signs it.
+    """
+    body = json.dumps(payload).encode('utf-8')
+    signature = hmac.new(settings.WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return client.post(
+        '/api/v1/payments/webhook/', data=body,
+        content_type='application/json', HTTP_X_CHAPA_SIGNATURE=signature)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark webhook burst acknowledgement and batched verification'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=500,
+            help='Number of distinct payments receiving a webhook'
+        )
+        parser.add_argument(
+            '--redeliveries',
+            type=float,
+            default=0.2,
+            help='Share of webhooks delivered a second time'
+        )
+        parser.add_argument(
+            '--gateway-delay',
+            type=float,
+            default=0.05,
+            help='Seconds the fake gateway takes to answer each verification'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Creates pending payments in a rolled back transaction, fires a burst of
+        signed webhooks at the endpoint and then drains the queue.
+        """
+        total = options['events']
+
+        with FakeChapaServer(delay=options['gateway_delay']) as chapa, rolled_back():
+            settings.PAYMENT_VERIFY_URL = chapa.verify_url
+            reset_client()
+
+            customer = User.objects.create_user(username='bench-webhook-customer')
+            listing = Listing.objects.create(
+                host=customer, name='Webhook benchmark listing',
+                description='Webhook benchmark fixture', price_per_night=100)
+            first_day = date.today() + timedelta(days=1)
+            bookings = Booking.objects.bulk_create(
+                Booking(
+                    customer=customer, listing=listing, total_price=20000,
+                    start_date=first_day + timedelta(days=2 * i),
+                    end_date=first_day + timedelta(days=2 * i + 2))
+                for i in range(total)
+            )
+            payments = Payment.objects.bulk_create(
+                Payment(
+                    booking_reference=booking, amount=booking.total_price,
+                    merchant_reference=Payment.generate_merchant_reference() + f"-{i}",
+                    payment_status=Payment.PaymentStatus.PROCESSING)
+                for i, booking in enumerate(bookings)
+            )
+
+            deliveries = [
+                {"tx_ref": payment.merchant_reference, "reference": f"evt-{i}", "status": "success"}
+                for i, payment in enumerate(payments)
+            ]
+            deliveries += random.sample(deliveries, int(total * options['redeliveries']))
+            random.shuffle(deliveries)
+
+            client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            acks = []
+            burst_started = time.perf_counter()
+            for payload in deliveries:
+                started = time.perf_counter()
+                response = signed_webhook(client, payload)
+                acks.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    self.stderr.write(f"webhook answered {response.status_code}: {response.content!r}")
+            burst_elapsed = time.perf_counter() - burst_started
+
+            stored = WebhookEvent.objects.count()
+            drain_started = time.perf_counter()
+            outcome: dict[str, int] = {}
+            while events := claim_webhook_events(settings.WEBHOOK_BATCH_SIZE):
+                for status, count in process_webhook_batch(events).items():
+                    outcome[status] = outcome.get(status, 0) + count
+            drain_elapsed = time.perf_counter() - drain_started
+            confirmed = Booking.objects.filter(
+                listing=listing, status=Booking.BookingStatus.CONFIRMED).count()
+
+            ack = summarize(acks)
+            self.stdout.write(
+                f"acknowledged {len(deliveries)} webhooks in {burst_elapsed:.2f}s "
+                f"({len(deliveries) / burst_elapsed:.0f}/s): p50 {ack['p50_ms']:.2f} ms, "
+                f"p95 {ack['p95_ms']:.2f} ms, p99 {ack['p99_ms']:.2f} ms")
+            self.stdout.write(f"stored {stored} events after deduplication")
+            self.stdout.write(
+                f"drained in {drain_elapsed:.2f}s ({stored / drain_elapsed:.0f} events/s), "
+                f"{len(chapa.requests)} gateway calls, outcome {outcome}")
+            self.stdout.write(f"confirmed {confirmed} of {total} bookings")
+
+        reset_client()
+        self.stdout.write(self.style.SUCCESS("Webhook benchmark complete."))
@@ -0,0 +1,68 @@
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from listings.models import Listing, Booking
+from rest_framework.test import APIClient
+from datetime import date, timedelta
+from utils.bench import rolled_back
+from utils.querycount import list_query_counts
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+LIST_URLS = [
+    '/api/v1/listings/',
+    '/api/v1/users/',
+    '/api/v1/bookings/',
+]
+
+
+class Command(BaseCommand):
+    help = 'Check that list endpoints issue a constant number of queries per request'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=30,
+            help='Number of users, listings and bookings to create as fixtures'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Creates fixtures in a rolled back transaction and compares query
+        counts for small and large pages on every list endpoint.
+        """
+        rows = options['rows']
+        page_sizes = (1, 5, rows)
+        failures = 0
+
+        with rolled_back():
+            customer = User.objects.create_user(username='query-count-customer')
+            for i in range(rows):
+                host = User.objects.create(username=f'query-count-host-{i}')
+                listing = Listing.objects.create(
+                    host=host, name=f'Listing {i}', description='Query count fixture', price_per_night=100)
+                start_date = date.today() + timedelta(days=1)
+                Booking.objects.create(
+                    customer=customer, listing=listing,
+                    start_date=start_date, end_date=start_date + timedelta(days=2))
+
+            client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            client.force_authenticate(customer)
+            for url in LIST_URLS:
+                counts = list_query_counts(client, url, page_sizes)
+                constant = len(set(counts.values())) == 1
+                failures += not constant
+                line = f"{url:<24} {counts}"
+                self.stdout.write(self.style.SUCCESS(line) if constant else self.style.ERROR(line))
+
+        if failures:
+            self.stderr.write(self.style.ERROR(f"{failures} endpoint(s) scale queries with page size."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All list endpoints issue a constant number of queries."))
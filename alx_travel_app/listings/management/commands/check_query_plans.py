@@ -0,0 +1,116 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from django.db import connection
+from listings.models import Listing, Booking
+from listings.views import ListingViewSet, BookingViewSet
+from datetime import date, timedelta
+from utils.bench import rolled_back
+from utils.queryplan import list_page_queryset, filtered_columns, full_scans, indexes_used, SCANS
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+
+def listing_cases(host: Any) -> list[tuple[str, dict[str, Any]]]:
+    today = date.today()
+    return [
+        ('price range', {'price_per_night__gte': 50, 'price_per_night__lte': 150}),
+        ('price range by price', {'price_per_night__gte': 50, 'ordering': 'price_per_night'}),
+        ('host', {'host': host.pk}),
+        ('created window', {'created_at__gte': today - timedelta(days=30), 'created_at__lt': today}),
+        ('rating', {'rating_avg__gte': 4}),
+        ('rating by rating', {'rating_avg__gte': 4, 'ordering': '-rating_avg'}),
+        ('review count', {'rating_count__gte': 10}),
+    ]
+
+
+def booking_cases(listing: Any) -> list[tuple[str, dict[str, Any]]]:
+    today = date.today()
+    return [
+        ('status', {'status': Booking.BookingStatus.CONFIRMED}),
+        ('stay window', {'start_date__gte': today, 'start_date__lte': today + timedelta(days=30)}),
+        ('ending after', {'end_date__gte': today}),
+        ('listing', {'listing': listing.pk}),
+        ('status and window', {'status': Booking.BookingStatus.PENDING, 'start_date__gte': today}),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Check that every listing and booking filter is served by an index'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=200,
+            help='Number of listings and bookings to create as fixtures'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full query plan of every case'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Creates fixtures in a rolled back transaction, builds the page query
+        each filter produces through its viewset and asks the database for
+        its plan. A case fails when the plan reads the whole table or a
+        whole index, or seeks on an index that does not narrow on any
+        column the case filters on. On
+        PostgreSQL sequential scans are disabled for the check, since with
+        a few hundred rows they would win on cost; a plan that still holds
+        one has no index to use.
+        """
+        vendor = connection.vendor
+        if vendor not in SCANS:
+            self.stderr.write(f"Query plans can only be checked on {', '.join(SCANS)}, not {vendor}.")
+            return
+        rows = options['rows']
+        failures = 0
+
+        with rolled_back():
+            if vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            customer = User.objects.create_user(username='query-plan-customer')
+            hosts = [User.objects.create(username=f'query-plan-host-{i}') for i in range(5)]
+            listings = [
+                Listing.objects.create(
+                    host=hosts[i % len(hosts)], name=f'Listing {i}',
+                    description='Query plan fixture', price_per_night=20 + i)
+                for i in range(rows)
+            ]
+            start_date = date.today()
+            for i in range(rows):
+                stay = start_date + timedelta(days=3 * i)
+                Booking.objects.create(
+                    customer=customer, listing=listings[0],
+                    start_date=stay, end_date=stay + timedelta(days=2))
+
+            cases = (
+                [(ListingViewSet, Listing, None, name, params) for name, params in listing_cases(hosts[0])]
+                + [(BookingViewSet, Booking, customer, name, params) for name, params in booking_cases(listings[0])]
+            )
+            for viewset, model, user, name, params in cases:
+                plan = list_page_queryset(viewset, params, user).explain()
+                scans = full_scans(plan, vendor, model._meta.db_table, filtered_columns(model, params))
+                failures += bool(scans)
+                label = f"{model._meta.model_name} {name:<22}"
+                if scans:
+                    self.stdout.write(self.style.ERROR(f"{label} not narrowed by an index: {'; '.join(scans)}"))
+                else:
+                    used = ', '.join(dict.fromkeys(indexes_used(plan, vendor))) or '-'
+                    self.stdout.write(self.style.SUCCESS(f"{label} {used}"))
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+
+        if failures:
+            self.stderr.write(self.style.ERROR(f"{failures} filter(s) are not narrowed by an index."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every filter is served by an index."))
@@ -0,0 +1,187 @@
+from typing import Any, IO, Iterator
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth.hashers import make_password
+from django.db import models
+from listings.fake_data import TABLES, Dataset
+from listings.seeding import MODELS
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+from pathlib import Path
+import csv, json, time, uuid
+from utils.logger import logger
+from utils.decorators import exception_handler
+
+EXTENSIONS = {'csv': 'csv', 'ndjson': 'ndjson', 'copy': 'tsv'}
+
+
+def export_fields(model: type[models.Model], row: dict[str, Any]) -> list[models.Field]:
+    """
+    Columns the dataset fills in, judging by `row`, plus columns with a
+    default. Nullable columns it never fills are left out so loaders
+    give them NULL.
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if field.attname in row or field.has_default()
+    ]
+
+
+def column_values(fields: list[models.Field], row: dict[str, Any]) -> list[Any]:
+    return [
+        row[field.attname] if field.attname in row else field.get_default()
+        for field in fields
+    ]
+
+
+def flat_value(value: Any) -> Any:
+    """
+    Text form shared by the CSV and COPY writers. UUIDs are written as
+    32 hex digits, which both SQLite (how Django stores them there) and
+    PostgreSQL's uuid type accept.
+    """
+    if isinstance(value, uuid.UUID):
+        return value.hex
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def copy_value(value: Any) -> str:
+    """
+    PostgreSQL COPY text format: \\N for NULL, backslash escapes.
+    """
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = str(flat_value(value))
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def write_table(handle: IO[str], fmt: str, fields: list[models.Field], rows: Iterator[dict[str, Any]]) -> int:
+    """
+    Streams `rows` to `handle` one line at a time. Returns the row count.
+    """
+    written = 0
+    if fmt == 'csv':
+        writer = csv.writer(handle)
+        writer.writerow([field.column for field in fields])
+        for row in rows:
+            writer.writerow([
+                int(value) if isinstance(value, bool) else flat_value(value)
+                for value in column_values(fields, row)
+            ])
+            written += 1
+    elif fmt == 'copy':
+        for row in rows:
+            handle.write('\t'.join(copy_value(value) for value in column_values(fields, row)) + '\n')
+            written += 1
+    else:
+        columns = [field.column for field in fields]
+        for row in rows:
+            handle.write(json.dumps(dict(zip(columns, column_values(fields, row))), default=json_default) + '\n')
+            written += 1
+    return written
+
+
+class Command(BaseCommand):
+    help = 'Export a reproducible synthetic dataset as CSV, NDJSON or COPY files'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            'total',
+            type=int,
+            help='Number of users (listings and bookings will be 2x this)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Dataset seed; the same seed always produces the same files'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(EXTENSIONS),
+            default='csv',
+            help='csv (with a sqlite3 .import script), ndjson, or copy (PostgreSQL COPY text with a psql script)'
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            default=Path('dataset'),
+            help='Directory the files are written to'
+        )
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            default=Dataset.start_date,
+            help='First day bookings can start on'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Writes one file per table, streaming rows straight from the
+        generator so memory use does not grow with the row count.
+        """
+        fmt, output = options['format'], options['output']
+        output.mkdir(parents=True, exist_ok=True)
+        # fixed salt so the exported hash is reproducible too; log in as any
+        # seeded user with the password "password"
+        dataset = Dataset(
+            seed=options['seed'],
+            users=options['total'],
+            password=make_password('password', salt=f"dataset{options['seed']}"),
+            start_date=options['start_date']
+        )
+
+        load_script = []
+        for table in TABLES:
+            model = MODELS[table]
+            path = output / f"{model._meta.db_table}.{EXTENSIONS[fmt]}"
+            started = time.perf_counter()
+            rows = dataset.rows(table)
+            first = next(rows, None)
+            if first is None:
+                continue
+            fields = export_fields(model, first)
+            with path.open('w', newline='', encoding='utf-8') as handle:
+                written = write_table(handle, fmt, fields, chain([first], rows))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{path}: {written} rows in {elapsed:.2f}s ({written / max(elapsed, 1e-9):.0f} rows/s)")
+
+            db_table = model._meta.db_table
+            columns = ', '.join(field.column for field in fields)
+            if fmt == 'csv':
+                # .import has no NULL marker, so load through a staging table
+                # and name the columns on the way in
+                load_script += [
+                    f".import --csv {path.name} staging_{db_table}",
+                    f"INSERT INTO {db_table} ({columns}) SELECT {columns} FROM staging_{db_table};",
+                    f"DROP TABLE staging_{db_table};",
+                ]
+            elif fmt == 'copy':
+                load_script.append(f"\\copy {db_table} ({columns}) FROM '{path.name}'")
+
+        if load_script:
+            if fmt == 'csv':
+                load_script = ['BEGIN;', *load_script, 'COMMIT;']
+            script = output / ('load.sqlite' if fmt == 'csv' else 'load.psql')
+            script.write_text('\n'.join(load_script) + '\n', encoding='utf-8')
+            self.stdout.write(f"load script written to {script}")
+
+        logger.info(f"Exported dataset seed {dataset.seed} with {dataset.users} users to {output}")
+        self.stdout.write(self.style.SUCCESS(
+            "Dataset exported successfully. Run rebuild_ratings after loading it."))
@@ -0,0 +1,206 @@
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth import get_user_model
+from listings.models import Listing, Booking, Payment
+from rest_framework_simplejwt.tokens import AccessToken
+from datetime import date, timedelta
+from pathlib import Path
+import asyncio, json, os, socket, subprocess, sys, time, uuid
+import httpx
+from utils.bench import summarize
+from utils.fake_chapa import FakeChapaServer
+from utils.decorators import exception_handler
+
+User = get_user_model()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode: str, port: int, processes: int) -> list[str]:
+    """
+    The deployment command for `mode`, as in the Procfile, bound to localhost.
+    """
+    if mode == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'alx_travel_app.wsgi',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(processes), '--log-level', 'warning']
+    return [
+        sys.executable, '-m', 'uvicorn', 'alx_travel_app.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(processes),
+        '--log-level', 'warning', '--no-access-log']
+
+
+async def wait_until_ready(base_url: str, host: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(headers={'Host': host}) as client:
+        while True:
+            try:
+                response = await client.get(f'{base_url}/api/v1/listings/')
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server at {base_url} did not come up")
+            await asyncio.sleep(0.2)
+
+
+async def fire(base_url: str, host: str, token: str, booking_ids: list[Any], concurrency: int) -> dict[str, Any]:
+    """
+    POSTs initiate_payment once for every booking, keeping `concurrency`
+    requests in flight. Returns latency figures, status counts and throughput.
+    """
+    gate = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+    statuses: dict[str, int] = {}
+
+    async with httpx.AsyncClient(
+        headers={'Host': host, 'Authorization': f'Bearer {token}'},
+        limits=httpx.Limits(max_connections=concurrency),
+        timeout=120.0,
+    ) as client:
+        async def one(booking_id: Any) -> None:
+            async with gate:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f'{base_url}/api/v1/bookings/{booking_id}/initiate_payment/')
+                    outcome = str(response.status_code)
+                except httpx.HTTPError as err:
+                    outcome = type(err).__name__
+                samples.append(time.perf_counter() - started)
+                statuses[outcome] = statuses.get(outcome, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(booking_id) for booking_id in booking_ids))
+        elapsed = time.perf_counter() - started
+
+    return {
+        **summarize(samples),
+        'seconds': elapsed,
+        'requests_per_second': len(booking_ids) / elapsed,
+        'statuses': statuses,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Load test concurrent payment initiation under the WSGI and ASGI deployments'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='initiate_payment POSTs sent to each deployment'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=200,
+            help='Requests kept in flight by the load generator'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Worker processes per deployment'
+        )
+        parser.add_argument(
+            '--gateway-delay',
+            type=float,
+            default=0.2,
+            help='Seconds the fake gateway takes to answer each call'
+        )
+        parser.add_argument(
+            '--modes',
+            type=lambda value: value.split(','),
+            default=['wsgi', 'asgi'],
+            help='Comma separated deployments to test'
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            default=None,
+            help='Write the results as JSON to this file'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Creates a customer with pending bookings in the configured database,
+        starts each deployment against a local fake gateway, drives it with
+        concurrent requests, then removes the fixture rows. The database
+        must be one the server processes can reach, not an in-memory one.
+        """
+        total = options['requests']
+        modes = options['modes']
+        host = settings.ALLOWED_HOSTS[0]
+
+        customer = User.objects.create_user(
+            username=f'loadtest-{uuid.uuid4().hex[:8]}', email='loadtest@example.com')
+        listing = Listing.objects.create(
+            host=customer, name='Load test listing',
+            description='Payment load test fixture', price_per_night=100)
+        first_day = date.today() + timedelta(days=1)
+        bookings = Booking.objects.bulk_create(
+            Booking(
+                customer=customer, listing=listing, total_price=20000,
+                start_date=first_day + timedelta(days=2 * i),
+                end_date=first_day + timedelta(days=2 * i + 1))
+            for i in range(total * len(modes))
+        )
+        token = str(AccessToken.for_user(customer))
+        results = {}
+
+        try:
+            with FakeChapaServer(delay=options['gateway_delay']) as chapa:
+                env = {
+                    **os.environ,
+                    'CHAPA_API_BASE_URL': chapa.initialize_url,
+                    'CHAPA_VERIFY_URL': chapa.verify_url,
+                    'PAYMENT_INITIATION_MODE': 'sync',
+                }
+                for index, mode in enumerate(modes):
+                    port = free_port()
+                    server = subprocess.Popen(
+                        server_command(mode, port, options['processes']),
+                        cwd=settings.BASE_DIR, env={**env, 'SERVER_MODE': mode})
+                    try:
+                        base_url = f'http://127.0.0.1:{port}'
+                        asyncio.run(wait_until_ready(base_url, host))
+                        booking_ids = [booking.pk for booking in bookings[index * total:(index + 1) * total]]
+                        results[mode] = asyncio.run(
+                            fire(base_url, host, token, booking_ids, options['concurrency']))
+                    finally:
+                        server.terminate()
+                        server.wait(timeout=30)
+        finally:
+            Payment.objects.filter(booking_reference__in=bookings).delete()
+            Booking.objects.filter(listing=listing).delete()
+            listing.delete()
+            customer.delete()
+
+        self.stdout.write(
+            f"{'mode':<6} {'req/s':>8} {'seconds':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<6} {result['requests_per_second']:>8.1f} {result['seconds']:>8.2f} "
+                f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}  {result['statuses']}")
+
+        if options['output']:
+            options['output'].write_text(json.dumps({
+                'requests': total,
+                'concurrency': options['concurrency'],
+                'processes': options['processes'],
+                'gateway_delay': options['gateway_delay'],
+                'results': results,
+            }, indent=2))
+            self.stdout.write(f"results written to {options['output']}")
+        self.stdout.write(self.style.SUCCESS("Payment load test complete."))
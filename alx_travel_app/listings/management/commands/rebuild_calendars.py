@@ -0,0 +1,20 @@
+from typing import Any
+from django.core.management.base import BaseCommand
+from listings.models import ListingCalendar
+from utils.logger import logger
+from utils.decorators import exception_handler
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every listing calendar from the confirmed bookings'
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Replaces the calendar rows with bitmaps built from the confirmed
+        stays. Stays confirmed while it runs can be missed; run it when
+        bookings are quiet.
+        """
+        rebuilt = ListingCalendar.rebuild()
+        logger.info(f"Rebuilt {rebuilt} listing calendars.")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} listing calendars."))
@@ -0,0 +1,18 @@
+from typing import Any
+from django.core.management.base import BaseCommand
+from listings.models import Listing
+from utils.logger import logger
+from utils.decorators import exception_handler
+
+
+class Command(BaseCommand):
+    help = 'Rebuild listing rating aggregates from the reviews table'
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Recomputes rating_count, rating_sum and rating_avg for every listing.
+        """
+        updated = Listing.objects.rebuild_rating_aggregates()
+        logger.info(f"Rebuilt rating aggregates for {updated} listings.")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} listings."))
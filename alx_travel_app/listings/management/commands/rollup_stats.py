@@ -0,0 +1,39 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from listings.rollups import mark_all_dirty, rollup_stats
+from utils.logger import logger
+from utils.decorators import exception_handler
+
+
+class Command(BaseCommand):
+    help = 'Roll up the occupancy and revenue of changed nights into the host report tables'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every confirmed stay, not only the nights changed since the last rollup'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Listings recomputed per transaction (default STATS_ROLLUP_BATCH_SIZE)'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Runs the nightly rollup now, after marking everything dirty with --rebuild.
+        """
+        if options['rebuild']:
+            marked = mark_all_dirty()
+            self.stdout.write(f"Marked {marked} listings for a full rebuild.")
+        totals = rollup_stats(options['batch_size'])
+        logger.info("Rolled up listing stats", extra={'data': totals})
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {totals.get('ranges', 0)} dirty ranges over {totals.get('listings', 0)} listings: "
+            f"{totals.get('nights_written', 0)} nights written, {totals.get('nights_cleared', 0)} cleared."))
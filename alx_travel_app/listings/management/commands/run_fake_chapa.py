@@ -0,0 +1,51 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from utils.fake_chapa import FakeChapaServer
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake Chapa payment gateway'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+        parser.add_argument('--port', type=int, default=8001, help='Port to listen on')
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.0,
+            help='Seconds of latency added to every response'
+        )
+        parser.add_argument(
+            '--fail-rate',
+            type=float,
+            default=0.0,
+            help='Share of requests (0-1) answered with 503'
+        )
+        parser.add_argument(
+            '--unpaid-rate',
+            type=float,
+            default=0.0,
+            help='Share of transactions (0-1) verified as not paid yet'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Serves until interrupted and prints the settings to point the app at it.
+        """
+        server = FakeChapaServer(
+            host=options['host'], port=options['port'],
+            delay=options['delay'], fail_rate=options['fail_rate'],
+            unpaid_rate=options['unpaid_rate']).start()
+        self.stdout.write(self.style.SUCCESS(f"Fake Chapa listening on {server.base_url}"))
+        self.stdout.write(f"CHAPA_API_BASE_URL={server.initialize_url}")
+        self.stdout.write(f"CHAPA_VERIFY_URL={server.verify_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+            self.stdout.write(f"Served {len(server.requests)} requests.")
@@ -1,31 +1,20 @@
 from typing import Any
 from django.core.management.base import BaseCommand, CommandParser
-from listings.models import Listing, Booking
+from listings.models import Listing, Booking, BookingConflict
+from listings.fake_data import Dataset, FakerProvider
+from listings.seeding import bulk_load
 from django.contrib.auth import get_user_model
-from faker import Faker, providers
+from django.contrib.auth.hashers import make_password
+from faker import Faker
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
-import secrets, string, random
+import random, time
 from utils.logger import logger
 from django.contrib.auth.models import AbstractUser
 from utils.decorators import exception_handler
 
 User = get_user_model()
 
-class FakerProvider(providers.BaseProvider):
-    """
-    Custom provider for Faker that adds methods to generate
-    passwords, booking statuses, and prices.
-    """
-    def user_password(self) -> str:
-        characters = string.ascii_letters + string.digits
-        return ''.join(secrets.choice(characters) for _ in range(13))
-
-    def booking_status_choice(self) -> str:
-        return random.choice(["PND", "CFD", "CNC"])
-
-    def random_price(self) -> float:
-        return random.uniform(100.00, 1000.99)
-
 def create_fake_user(fake: Faker) -> AbstractUser:
     """
     Creates a fake user with a unique username, email, and password.
@@ -35,7 +24,7 @@ def create_fake_user(fake: Faker) -> AbstractUser:
     password = fake.unique.user_password()
     email = fake.unique.email(safe=True, domain='gmail.com')
     user = User.objects.create_user(username=username, email=email, password=password)
-    logger.info(f"Created user {username} with email {email}")
+    logger.debug(f"Created user {username} with email {email}")
     return user
 
 def create_fake_listing(fake: Faker, host: AbstractUser) -> Listing:
@@ -78,6 +67,35 @@ class Command(BaseCommand):
             default=10,
             help='Number of users to seed (Listings and Bookings will be 2x this)'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Insert users, listings, bookings, reviews and payments in chunks with bulk_create'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows generated and inserted per chunk in bulk mode'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating fake rows in bulk mode'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Dataset seed for bulk mode; the same seed always produces the same rows'
+        )
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            default=None,
+            help='First day bookings can start on in bulk mode (default: today)'
+        )
 
     @exception_handler
     def handle(self, *args: Any, **options: Any) -> None:
@@ -85,6 +103,16 @@ class Command(BaseCommand):
         Handles the logic for seeding the database with fake users, listings, and bookings.
         """
         total = options['total']
+        if options['bulk']:
+            dataset = Dataset(
+                seed=random.randrange(2 ** 32) if options['seed'] is None else options['seed'],
+                users=total,
+                password=make_password(FakerProvider(None).user_password()),
+                start_date=options['start_date'] or date.today()
+            )
+            self.seed_bulk(dataset, options['chunk_size'], options['workers'])
+            return
+
         fake = Faker()
         fake.add_provider(FakerProvider)
 
@@ -103,8 +131,34 @@ class Command(BaseCommand):
         for _ in range(total * 2):
             customer = random.choice(users)
             listing = random.choice(listings)
-            booking = create_fake_booking(fake, customer, listing)
+            try:
+                booking = create_fake_booking(fake, customer, listing)
+            except BookingConflict:
+                # random dates can land on a stay that is already confirmed
+                continue
             bookings.append(booking)
 
         logger.info("Database seeded successfully.")
         self.stdout.write(self.style.SUCCESS("Database seeded successfully."))
+
+    def seed_bulk(self, dataset: Dataset, chunk_size: int, workers: int) -> None:
+        """
+        Seeds `dataset` (the same shape as the default mode plus reviews and
+        payments) table by table with chunked bulk_create. Model save() is
+        bypassed, so rating aggregates are rebuilt at the end.
+        """
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        started = time.perf_counter()
+        inserted = 0
+        try:
+            for table, rows, elapsed in bulk_load(dataset, chunk_size, pool):
+                self.stdout.write(f"{table}: {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+                inserted += rows
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"total: {inserted} rows in {elapsed:.2f}s ({inserted / max(elapsed, 1e-9):.0f} rows/s)")
+        logger.info(f"Bulk seeded {inserted} rows from dataset seed {dataset.seed}")
+        self.stdout.write(self.style.SUCCESS("Database seeded successfully."))
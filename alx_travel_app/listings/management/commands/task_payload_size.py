@@ -0,0 +1,104 @@
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from kombu.utils.json import dumps
+from listings.payloads import pack_id
+from listings.tasks import initiate_payment_request, send_booking_confirmation_email
+from alx_travel_app.celery import app
+import base64, uuid
+from utils.decorators import exception_handler
+
+PROBE_QUEUE = 'payload-size-probe'
+
+
+def queued_message(task: Any, args: tuple, kwargs: dict, serializer: str, argsrepr: str | None = None) -> dict[str, Any]:
+    """
+    Publishes a task call to an in-memory broker and returns the message
+    exactly as the Redis transport would LPUSH it, before JSON encoding.
+    Sent by name, so the arguments are not checked against the task's
+    current signature and older message shapes can still be measured.
+    """
+    options = {'argsrepr': argsrepr} if argsrepr is not None else {}
+    with app.connection_for_write('memory://') as connection:
+        app.send_task(
+            task.name, args, kwargs, connection=connection, serializer=serializer, ignore_result=True,
+            queue=PROBE_QUEUE, exchange='', routing_key=PROBE_QUEUE, **options)
+        return connection.default_channel._get(PROBE_QUEUE)
+
+
+def samples() -> list[tuple[str, str, dict[str, Any]]]:
+    """
+    The notification and payment task messages as queued before and after
+    payloads were versioned.
+    """
+    booking_id, payment_id = uuid.uuid4(), uuid.uuid4()
+    legacy_email = {
+        'to_email': 'guest.name@example.com',
+        'booking_id': str(booking_id),
+        'listing_title': 'Two bedroom apartment with sea view',
+        'booking_date': '2025-06-14',
+    }
+    return [
+        ('confirmation email', 'keyword fields, json',
+         queued_message(send_booking_confirmation_email, (), legacy_email, 'json')),
+        ('confirmation email', 'v1 payload, msgpack',
+         queued_message(send_booking_confirmation_email, (pack_id(booking_id),), {}, 'msgpack', str(booking_id))),
+        ('initiate payment', 'id string, json',
+         queued_message(initiate_payment_request, (str(payment_id),), {}, 'json')),
+        ('initiate payment', 'v1 payload, msgpack',
+         queued_message(initiate_payment_request, (pack_id(payment_id),), {}, 'msgpack', str(payment_id))),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Measure the size of queued Celery task messages'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Adds custom command-line arguments for the management command.
+        """
+        parser.add_argument(
+            '--live',
+            type=int,
+            default=0,
+            metavar='N',
+            help='Also push N copies of each message to the Redis broker and report its memory per message'
+        )
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Prints, for each message, the serialized task body and the whole
+        message as stored by the Redis transport (headers, properties and
+        the base64 encoded body). With --live, the messages are pushed to a
+        scratch list on the broker and Redis' MEMORY USAGE is divided by N.
+        """
+        measured = samples()
+        rows = []
+        for task, variant, message in measured:
+            body = len(base64.b64decode(message['body']))
+            rows.append([task, variant, body, len(dumps(message)), None])
+
+        live = options['live']
+        if live:
+            import redis
+            client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+            try:
+                for row, (_, _, message) in zip(rows, measured):
+                    encoded = dumps(message)
+                    client.delete(PROBE_QUEUE)
+                    client.lpush(PROBE_QUEUE, *[encoded] * live)
+                    row[4] = client.memory_usage(PROBE_QUEUE, samples=0) / live
+            except redis.RedisError as err:
+                self.stderr.write(f"Could not measure on the broker: {err}")
+            finally:
+                try:
+                    client.delete(PROBE_QUEUE)
+                except redis.RedisError:
+                    pass
+
+        self.stdout.write(f"{'task':<20} {'variant':<22} {'body B':>7} {'message B':>10} {'redis B/msg':>12}")
+        for task, variant, body, message, per_message in rows:
+            live_size = f"{per_message:>12.0f}" if per_message is not None else f"{'-':>12}"
+            self.stdout.write(f"{task:<20} {variant:<22} {body:>7} {message:>10} {live_size}")
+        self.stdout.write(self.style.SUCCESS("Payload sizes measured."))
@@ -0,0 +1,26 @@
+from typing import Any
+from django.core.management.base import BaseCommand
+from django.db import connection
+from listings.search import FTS_TABLE, rebuild_sqlite_index
+from utils.logger import logger
+from utils.decorators import exception_handler
+
+
+class Command(BaseCommand):
+    help = 'VACUUM the database, then rebuild the SQLite search index'
+
+    @exception_handler
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Runs VACUUM outside a transaction. On SQLite, VACUUM may renumber
+        the listing table's rowids, which the full-text index points at,
+        so the index is rebuilt from the table straight after.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+        rebuilt = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        if rebuilt:
+            rebuild_sqlite_index(connection)
+        message = "Vacuumed the database" + (" and rebuilt the search index." if rebuilt else ".")
+        logger.info(message)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'status', 'end_date', 'start_date'], name='booking_availability_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_booking_exclusion_constraint(apps, schema_editor):
+    """
+    Rejects overlapping confirmed stays for a listing at the database level.
+    PostgreSQL only; other backends rely on the ListingLock row.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        "ALTER TABLE listings_booking ADD CONSTRAINT booking_no_overlap "
+        "EXCLUDE USING gist (listing_id WITH =, daterange(start_date, end_date, '[)') WITH &&) "
+        "WHERE (status = 'CFD')"
+    )
+
+
+def drop_booking_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("ALTER TABLE listings_booking DROP CONSTRAINT IF EXISTS booking_no_overlap")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_booking_availability_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingLock',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='booking_lock', serialize=False, to='listings.listing')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(
+            add_booking_exclusion_constraint,
+            drop_booking_exclusion_constraint,
+        ),
+    ]
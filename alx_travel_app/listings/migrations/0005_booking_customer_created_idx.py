@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_listing_created_price_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'created_at'], name='booking_customer_created_idx'),
+        ),
+    ]
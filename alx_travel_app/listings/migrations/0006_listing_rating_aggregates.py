@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:53
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    Listing.objects.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+        rating_avg=Coalesce(Subquery(reviews.annotate(value=Avg('rating')).values('value')), 0.0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_booking_customer_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False, verbose_name='Average Review Rating (0 when unreviewed)'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of Reviews'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Sum of Review Ratings'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-rating_avg'], name='listing_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
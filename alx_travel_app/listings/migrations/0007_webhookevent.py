@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:57
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_listing_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('event_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Event ID')),
+                ('webhook_event_id', models.CharField(max_length=255, unique=True, verbose_name='Event reference from CHAPPA')),
+                ('merchant_reference', models.CharField(db_index=True, max_length=100)),
+                ('payload', models.JSONField(verbose_name='Raw Webhook Payload')),
+                ('status', models.CharField(choices=[('RCV', 'RECEIVED'), ('PCS', 'PROCESSING'), ('PRD', 'PROCESSED'), ('IGN', 'IGNORED'), ('FLD', 'FAILED')], default='RCV', max_length=3)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['received_at'],
+                'indexes': [models.Index(fields=['status', 'received_at'], name='webhook_event_queue_idx')],
+            },
+        ),
+    ]
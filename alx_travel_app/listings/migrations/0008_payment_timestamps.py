@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Date Payment was created'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Date Payment was last changed or checked'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_status', 'updated_at', 'payment_id'], name='payment_reconcile_idx'),
+        ),
+    ]
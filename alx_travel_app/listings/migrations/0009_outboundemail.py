@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:05
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_payment_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('email_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Email ID')),
+                ('kind', models.CharField(choices=[('BKC', 'BOOKING CONFIRMATION')], default='BKC', max_length=3)),
+                ('status', models.CharField(choices=[('QUE', 'QUEUED'), ('SND', 'SENDING'), ('SNT', 'SENT'), ('FLD', 'FAILED')], default='QUE', max_length=3)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='listings.booking')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='outbound_email_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.db import migrations
+
+# the index as this migration created it; listings.search keeps the current
+# statements for post_migrate to reinstall after a table rebuild
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS listings_listing_fts USING fts5("
+    "name, description, content='listings_listing', content_rowid='rowid', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS listings_listing_fts_insert AFTER INSERT ON listings_listing BEGIN "
+    "INSERT INTO listings_listing_fts(rowid, name, description) "
+    "VALUES (new.rowid, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS listings_listing_fts_delete AFTER DELETE ON listings_listing BEGIN "
+    "INSERT INTO listings_listing_fts(listings_listing_fts, rowid, name, description) "
+    "VALUES ('delete', old.rowid, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS listings_listing_fts_update AFTER UPDATE OF name, description "
+    "ON listings_listing BEGIN "
+    "INSERT INTO listings_listing_fts(listings_listing_fts, rowid, name, description) "
+    "VALUES ('delete', old.rowid, old.name, old.description); "
+    "INSERT INTO listings_listing_fts(rowid, name, description) "
+    "VALUES (new.rowid, new.name, new.description); END",
+]
+
+POSTGRES_INDEX = [
+    "ALTER TABLE listings_listing ADD COLUMN search_document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX listing_search_idx ON listings_listing USING gin (search_document)",
+]
+
+
+def add_listing_search_index(apps, schema_editor):
+    """
+    Full-text index over listing names and descriptions: a generated
+    tsvector column with a GIN index on PostgreSQL, an FTS5 table kept by
+    triggers on SQLite. Other backends search without an index.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for statement in POSTGRES_INDEX:
+            schema_editor.execute(statement)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_INDEX:
+            schema_editor.execute(statement)
+        schema_editor.execute(
+            "INSERT INTO listings_listing_fts(listings_listing_fts, rank) VALUES ('rank', %s)",
+            [f"bm25({float(settings.SEARCH_NAME_WEIGHT)}, 1.0)"])
+        schema_editor.execute("INSERT INTO listings_listing_fts(listings_listing_fts) VALUES ('rebuild')")
+
+
+def drop_listing_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS listing_search_idx")
+        schema_editor.execute("ALTER TABLE listings_listing DROP COLUMN IF EXISTS search_document")
+    elif vendor == 'sqlite':
+        for trigger in ('listings_listing_fts_insert', 'listings_listing_fts_delete', 'listings_listing_fts_update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS listings_listing_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_outboundemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            add_listing_search_index,
+            drop_listing_search_index,
+        ),
+    ]
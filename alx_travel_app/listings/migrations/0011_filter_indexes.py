@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listing_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['host', '-created_at'], name='listing_host_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='host',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='listings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'status', 'created_at'], name='booking_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'start_date'], name='booking_customer_start_idx'),
+        ),
+    ]
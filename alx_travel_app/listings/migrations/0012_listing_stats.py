@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def mark_booked_listings_dirty(apps, schema_editor):
+    # the first nightly rollup then builds the stats of every confirmed stay
+    Booking = apps.get_model('listings', 'Booking')
+    StatsDirtyRange = apps.get_model('listings', 'StatsDirtyRange')
+    spans = (Booking.objects.filter(status='CFD').values('listing_id')
+             .annotate(start=Min('start_date'), end=Max('end_date')).order_by())
+    StatsDirtyRange.objects.bulk_create([
+        StatsDirtyRange(listing_id=span['listing_id'], start_date=span['start'], end_date=span['end'])
+        for span in spans
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsDirtyRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_dirty_ranges', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Night of')),
+                ('revenue', models.IntegerField(default=0, verbose_name='Revenue in pesewas')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, db_index=False, related_name='daily_stats', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'day'), name='listing_daily_stats_unique')],
+            },
+        ),
+        migrations.RunPython(mark_booked_listings_dirty, migrations.RunPython.noop),
+    ]
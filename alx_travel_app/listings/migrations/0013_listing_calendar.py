@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from listings.calendars import build_bitmaps
+
+
+def build_listing_calendars(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    ListingCalendar = apps.get_model('listings', 'ListingCalendar')
+    stays = Booking.objects.filter(status='CFD').values_list('listing_id', 'start_date', 'end_date')
+    ListingCalendar.objects.bulk_create([
+        ListingCalendar(listing_id=listing_id, year=year, nights=nights)
+        for (listing_id, year), nights in build_bitmaps(stays.iterator()).items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('nights', models.BinaryField(max_length=46, verbose_name='Booked nights, one bit per night of the year')),
+                ('listing', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='calendars', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'year'],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'year'), name='listing_calendar_unique')],
+            },
+        ),
+        migrations.RunPython(build_listing_calendars, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_webhook_event_backoff'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboundemail',
+            name='outbound_email_queue_idx',
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='outboundemail',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:41
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_tables(apps, schema_editor):
+    # the "shared" cache's table when it is database backed; a no-op
+    # for the tables that exist or caches kept elsewhere
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_outbound_email_backoff'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-17 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-rating_count'], name='listing_rating_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'end_date'], name='booking_customer_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'customer', 'created_at'], name='booking_listing_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db.models import QuerySet
+
+from listings.idempotency import run_once
+
+
+class EagerLoadingMixin:
+    """
+    Lets a viewset declare the relations its serializer reads, so list
+    requests cost a fixed number of queries however many rows are returned.
+    """
+    select_related_fields: tuple = ()
+    prefetch_related_fields: tuple = ()
+
+    def get_queryset(self) -> QuerySet: # type: ignore
+        queryset = super().get_queryset() # type: ignore
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+
+class IdempotencyMixin:
+    """
+    Honours the Idempotency-Key header on the viewset actions listed in
+    `idempotent_actions`. Wraps dispatch, so a replayed request is
+    answered before authentication or any other database work.
+    """
+    idempotent_actions: tuple = ()
+
+    def dispatch(self, request, *args, **kwargs): # type: ignore
+        action = self.action_map.get(request.method.lower()) # type: ignore
+        if request.method != 'POST' or action not in self.idempotent_actions:
+            return super().dispatch(request, *args, **kwargs) # type: ignore
+        return run_once(request, lambda: super(IdempotencyMixin, self).dispatch(request, *args, **kwargs)) # type: ignore
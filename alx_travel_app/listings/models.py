@@ -1,10 +1,24 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Exists, OuterRef, Subquery, F, Case, When, Value, Count, Sum, Avg
+from django.db.models.functions import Cast, Coalesce
 import uuid, time
+from datetime import date
+from typing import Any
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.urls import reverse
 from decimal import Decimal, ROUND_HALF_UP
+from listings.search import full_text_search
+from listings.calendars import YEAR_BYTES, build_bitmaps, stay_changes, set_nights
+
+BOOKING_EXCLUSION_CONSTRAINT = 'booking_no_overlap'
+
+class BookingConflict(ValueError):
+    """
+    Raised when a booking overlaps a confirmed booking of the same listing.
+    """
 
 class CustomUser(AbstractUser):
     """
@@ -26,6 +40,40 @@ class CustomUser(AbstractUser):
     class Meta:
         ordering = ['username']
 
+class ListingQuerySet(models.QuerySet):
+    """
+    QuerySet helpers for listings.
+    """
+    def available_between(self, start_date: date, end_date: date) -> "ListingQuerySet":
+        """
+        Listings with no confirmed booking overlapping [start_date, end_date).
+        Runs as a single NOT EXISTS anti-join, each probe served by the
+        booking availability index.
+        """
+        clashing = Booking.objects.confirmed_overlapping(
+            OuterRef('pk'), start_date, end_date)
+        return self.filter(~Exists(clashing))
+
+    def search(self, text: str) -> "ListingQuerySet":
+        """
+        Listings whose name or description contain every word of `text`,
+        annotated with search_rank, higher for better matches. Served by
+        the full-text index (see listings.search).
+        """
+        return full_text_search(self, text)
+
+    def rebuild_rating_aggregates(self) -> int:
+        """
+        Recomputes rating_count, rating_sum and rating_avg from the reviews
+        table in one set-based UPDATE. Returns the number of listings updated.
+        """
+        reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+        return self.update(
+            rating_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+            rating_avg=Coalesce(Subquery(reviews.annotate(value=Avg('rating')).values('value')), 0.0)
+        )
+
 class Listing(models.Model):
     """
     Represents a property listing posted by a host.
@@ -37,10 +85,12 @@ class Listing(models.Model):
         editable=False
     )
 
+    # indexed by listing_host_created_idx, which also orders a host's listings
     host = models.ForeignKey(
         to=CustomUser,
         on_delete=models.CASCADE,
-        related_name='listings'
+        related_name='listings',
+        db_index=False
     )
 
     name = models.CharField(
@@ -70,11 +120,82 @@ class Listing(models.Model):
         auto_now=True
     )
 
+    rating_count = models.PositiveIntegerField(
+        verbose_name='Number of Reviews',
+        default=0,
+        editable=False
+    )
+
+    rating_sum = models.PositiveIntegerField(
+        verbose_name='Sum of Review Ratings',
+        default=0,
+        editable=False
+    )
+
+    rating_avg = models.FloatField(
+        verbose_name='Average Review Rating (0 when unreviewed)',
+        default=0,
+        editable=False
+    )
+
     def __str__(self) -> str:
         return f"{self.name} for {self.price_per_night} cedis per night"
+
+    @classmethod
+    def apply_rating_change(cls, listing_id: Any, count: int, total: int) -> None:
+        """
+        Adjusts a listing's rating aggregates by `count` reviews summing to
+        `total` in a single UPDATE, so concurrent reviews never lose writes.
+        The right-hand sides all read the pre-update column values. Bumps
+        updated_at too, since the rating is part of the listing's content.
+        """
+        new_count = F('rating_count') + count
+        cls.objects.filter(pk=listing_id).update(
+            updated_at=timezone.now(),
+            rating_count=new_count,
+            rating_sum=F('rating_sum') + total,
+            rating_avg=Case(
+                When(rating_count=-count, then=Value(0.0)),
+                default=Cast(F('rating_sum') + total, models.FloatField()) / new_count
+            )
+        )
+
+    def is_available(self, start_date: date, end_date: date) -> bool:
+        """
+        True when no confirmed booking overlaps [start_date, end_date).
+        """
+        return not Booking.objects.confirmed_overlapping(
+            self.pk, start_date, end_date).exists()
     
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='listing_created_idx'),
+            models.Index(fields=['price_per_night'], name='listing_price_idx'),
+            models.Index(fields=['-rating_avg'], name='listing_rating_idx'),
+            models.Index(fields=['-rating_count'], name='listing_rating_count_idx'),
+            models.Index(fields=['host', '-created_at'], name='listing_host_created_idx'),
+        ]
+
+class BookingQuerySet(models.QuerySet):
+    """
+    QuerySet helpers for bookings.
+    """
+    def confirmed_overlapping(self, listing: Any, start_date: date, end_date: date) -> "BookingQuerySet":
+        """
+        Confirmed bookings of a listing that overlap [start_date, end_date).
+        Filters line up with the (listing, status, end_date, start_date)
+        index: equality on the first two columns, then a range scan over
+        bookings ending after start_date only, so past stays are never read.
+        """
+        return self.filter(
+            listing=listing,
+            status=Booking.BookingStatus.CONFIRMED,
+            end_date__gt=start_date,
+            start_date__lt=end_date
+        )
 
 class Booking(models.Model):
     """
@@ -133,29 +254,138 @@ class Booking(models.Model):
         auto_now_add=True
     )
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=['listing', 'status', 'end_date', 'start_date'],
+                name='booking_availability_idx'
+            ),
+            models.Index(
+                fields=['customer', 'created_at'],
+                name='booking_customer_created_idx'
+            ),
+            models.Index(
+                fields=['customer', 'status', 'created_at'],
+                name='booking_customer_status_idx'
+            ),
+            models.Index(
+                fields=['customer', 'start_date'],
+                name='booking_customer_start_idx'
+            ),
+            models.Index(
+                fields=['customer', 'end_date'],
+                name='booking_customer_end_idx'
+            ),
+            models.Index(
+                fields=['listing', 'customer', 'created_at'],
+                name='booking_listing_customer_idx'
+            ),
+        ]
+
+    # the fields the nightly stats rollup reads
+    STATS_FIELDS = ('listing_id', 'start_date', 'end_date', 'status', 'total_price')
 
     @property
     def total_price_display(self) -> str:
         return f"GH₵{self.total_price / 100:.2f}"
 
+    @staticmethod
+    def price_for(price_per_night: Any, start_date: date, end_date: date) -> int:
+        """
+        The price of a stay in pesewas. A same-day stay is one night.
+        """
+        num_days = max((end_date - start_date).days, 1)
+        total = Decimal(price_per_night * num_days * 100)
+        return int(total.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+    def _stats_state(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.STATS_FIELDS)
+
+    def _confirmed_changes(self, previous: tuple | None) -> tuple[list[tuple], list[tuple]]:
+        """
+        The confirmed (listing_id, start_date, end_date) stays this save
+        takes away and puts in place; both empty when nothing the stats
+        rollup or the calendar read has changed.
+        """
+        current = self._stats_state()
+        if previous == current:
+            return [], []
+
+        def confirmed(state: tuple | None) -> list[tuple]:
+            return [state[:3]] if state is not None and state[3] == self.BookingStatus.CONFIRMED else []
+
+        return confirmed(previous), confirmed(current)
+
     def save(self, *args, **kwargs) -> None:
-        overlapping = Booking.objects.filter(
-            listing=self.listing,
-            status=self.BookingStatus.CONFIRMED,
-            start_date__lt=self.end_date,
-            end_date__gt=self.start_date
-        ).exclude(booking_id=self.booking_id).exists()
-
-        if overlapping:
-            raise ValueError("Listing already booked for selected dates")
-
-        num_days = max((self.end_date - self.start_date).days, 1)
-        price = self.listing.price_per_night
-        total = Decimal(price * num_days * 100)
-        self.total_price = int(total.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-        super().save(*args, **kwargs)
+        """
+        Checks for overlaps and writes the booking in one transaction while
+        holding the listing's lock row, so concurrent saves for the same
+        listing cannot both pass the check. On PostgreSQL the
+        booking_no_overlap exclusion constraint backs this up. Changes to
+        a confirmed stay mark its nights for the stats rollup and update
+        the listing's calendar, against the row as stored under the lock
+        rather than as this instance last saw it.
+        """
+        with transaction.atomic():
+            ListingLock.acquire(self.listing_id)
+            previous = None
+            if not self._state.adding:
+                previous = Booking.objects.select_for_update().filter(
+                    pk=self.pk).values_list(*self.STATS_FIELDS).first()
+                if previous is not None and previous[0] != self.listing_id:
+                    # moving to another listing changes that one's calendar too
+                    ListingLock.acquire(previous[0])
+
+            overlapping = Booking.objects.confirmed_overlapping(
+                self.listing_id, self.start_date, self.end_date
+            ).exclude(booking_id=self.booking_id).exists()
+
+            if overlapping:
+                raise BookingConflict("Listing already booked for selected dates")
+
+            self.total_price = self.price_for(self.listing.price_per_night, self.start_date, self.end_date)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError as err:
+                if BOOKING_EXCLUSION_CONSTRAINT in str(err):
+                    raise BookingConflict("Listing already booked for selected dates") from err
+                raise
+            removed, added = self._confirmed_changes(previous)
+            StatsDirtyRange.mark(removed + added)
+            if removed != added:
+                ListingCalendar.apply(added=added, removed=removed)
+
+class ListingLock(models.Model):
+    """
+    One row per listing, updated at the start of every booking write.
+    The UPDATE takes a row lock on PostgreSQL (and the write lock on SQLite)
+    that is held until commit, serializing writers per listing only.
+    """
+    listing = models.OneToOneField(
+        to=Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='booking_lock'
+    )
+
+    version = models.PositiveBigIntegerField(
+        default=0
+    )
+
+    @classmethod
+    def acquire(cls, listing_id: Any) -> None:
+        """
+        Locks the listing's row for the rest of the current transaction,
+        creating it on first use.
+        """
+        if cls.objects.filter(listing_id=listing_id).update(version=F('version') + 1):
+            return
+        cls.objects.get_or_create(listing_id=listing_id)
+        cls.objects.filter(listing_id=listing_id).update(version=F('version') + 1)
 
 class Review(models.Model):
     """
@@ -197,6 +427,30 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+    def save(self, *args, **kwargs) -> None:
+        """
+        Saves the review and moves its rating into the listing aggregates,
+        backing out the previous rating when an existing review is edited.
+        """
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Review.objects.select_for_update().filter(
+                    pk=self.pk).values('listing_id', 'rating').first()
+            super().save(*args, **kwargs)
+            if previous:
+                Listing.apply_rating_change(previous['listing_id'], -1, -previous['rating'])
+            Listing.apply_rating_change(self.listing_id, 1, self.rating)
+
+    def delete(self, *args, **kwargs):
+        """
+        Deletes the review and removes its rating from the listing aggregates.
+        """
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Listing.apply_rating_change(self.listing_id, -1, -self.rating)
+        return result
+
 class Payment(models.Model):
 
     class Currency(models.TextChoices):
@@ -283,5 +537,335 @@ class Payment(models.Model):
         null=True,
         db_index=True)
 
+    created_at = models.DateTimeField(
+        verbose_name='Date Payment was created',
+        auto_now_add=True
+    )
+
+    updated_at = models.DateTimeField(
+        verbose_name='Date Payment was last changed or checked',
+        auto_now=True
+    )
+
+    class Meta:
+        indexes = [
+            # stale PROCESSING payments, walked in keyset order by the reconciler
+            models.Index(
+                fields=['payment_status', 'updated_at', 'payment_id'],
+                name='payment_reconcile_idx'
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Booking: {self.booking_reference.pk}, Status: {self.payment_status}"
+
+class WebhookEvent(models.Model):
+    """
+    A Chapa webhook as received, stored before any verification so the
+    request can be acknowledged at once. Deduplicated on the provider's
+    event reference; a Celery worker verifies and applies events in batches.
+    """
+    class EventStatus(models.TextChoices):
+        RECEIVED = "RCV", _("RECEIVED")
+        PROCESSING = "PCS", _("PROCESSING")
+        PROCESSED = "PRD", _("PROCESSED")
+        IGNORED = "IGN", _("IGNORED")
+        FAILED = "FLD", _("FAILED")
+
+    event_id = models.UUIDField(
+        verbose_name='Event ID',
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+
+    webhook_event_id = models.CharField(
+        verbose_name='Event reference from CHAPPA',
+        max_length=255,
+        unique=True
+    )
+
+    merchant_reference = models.CharField(
+        max_length=100,
+        db_index=True
+    )
+
+    payload = models.JSONField(
+        verbose_name='Raw Webhook Payload'
+    )
+
+    status = models.CharField(
+        max_length=3,
+        choices=EventStatus.choices,
+        null=False,
+        default=EventStatus.RECEIVED
+    )
+
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+
+    error = models.TextField(
+        null=True,
+        blank=True
+    )
+
+    received_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    processed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    # received events are claimed once this has passed; a failed
+    # verification pushes it back exponentially
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now
+    )
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_event_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Webhook {self.webhook_event_id} for {self.merchant_reference}: {self.status}"
+
+
+class OutboundEmail(models.Model):
+    """
+    A notification email waiting to be sent. Written in the same request
+    as the booking it is about; a Celery worker claims queued rows in
+    batches and sends each batch over one mail server connection.
+    """
+    class Kind(models.TextChoices):
+        BOOKING_CONFIRMATION = "BKC", _("BOOKING CONFIRMATION")
+
+    class EmailStatus(models.TextChoices):
+        QUEUED = "QUE", _("QUEUED")
+        SENDING = "SND", _("SENDING")
+        SENT = "SNT", _("SENT")
+        FAILED = "FLD", _("FAILED")
+
+    email_id = models.UUIDField(
+        verbose_name='Email ID',
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+
+    booking = models.ForeignKey(
+        to=Booking,
+        on_delete=models.CASCADE,
+        related_name='emails'
+    )
+
+    kind = models.CharField(
+        max_length=3,
+        choices=Kind.choices,
+        default=Kind.BOOKING_CONFIRMATION
+    )
+
+    status = models.CharField(
+        max_length=3,
+        choices=EmailStatus.choices,
+        null=False,
+        default=EmailStatus.QUEUED
+    )
+
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+
+    error = models.TextField(
+        null=True,
+        blank=True
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    # queued emails are claimed once this has passed; a failed send
+    # pushes it back exponentially
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now
+    )
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} for booking {self.booking_id}: {self.status}"
+
+
+class ListingDailyStats(models.Model):
+    """
+    One booked night of a listing and the revenue it earned, in pesewas.
+    Nights without a confirmed booking have no row. Written only by the
+    nightly rollup (listings.rollups), which host reports read from.
+    """
+    # listing_daily_stats_unique leads with the listing and serves its lookups
+    listing = models.ForeignKey(
+        to=Listing,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        db_index=False
+    )
+
+    day = models.DateField(
+        verbose_name='Night of'
+    )
+
+    revenue = models.IntegerField(
+        verbose_name='Revenue in pesewas',
+        default=0
+    )
+
+    class Meta:
+        ordering = ['listing', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'day'], name='listing_daily_stats_unique'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.listing_id} on {self.day}: {self.revenue}"
+
+
+class StatsDirtyRange(models.Model):
+    """
+    Nights [start_date, end_date) of a listing whose rollup is out of
+    date. Written in the same transaction as the booking change that
+    caused it; the nightly rollup recomputes these nights only and
+    deletes the rows it handled.
+    """
+    listing = models.ForeignKey(
+        to=Listing,
+        on_delete=models.CASCADE,
+        related_name='stats_dirty_ranges'
+    )
+
+    start_date = models.DateField()
+
+    end_date = models.DateField()
+
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self) -> str:
+        return f"{self.listing_id} [{self.start_date}, {self.end_date})"
+
+    @classmethod
+    def mark(cls, ranges: Any) -> None:
+        """
+        Records (listing_id, start_date, end_date) ranges as out of date.
+        """
+        cls.objects.bulk_create([
+            cls(listing_id=listing_id, start_date=start_date, end_date=end_date)
+            for listing_id, start_date, end_date in ranges
+        ])
+
+
+class ListingCalendar(models.Model):
+    """
+    The booked nights of a listing in one year, as a bitmap (see
+    listings.calendars). Years without a confirmed stay have no row.
+    """
+    # listing_calendar_unique leads with the listing and serves its lookups
+    listing = models.ForeignKey(
+        to=Listing,
+        on_delete=models.CASCADE,
+        related_name='calendars',
+        db_index=False
+    )
+
+    year = models.PositiveSmallIntegerField()
+
+    nights = models.BinaryField(
+        verbose_name='Booked nights, one bit per night of the year',
+        max_length=YEAR_BYTES
+    )
+
+    class Meta:
+        ordering = ['listing', 'year']
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'year'], name='listing_calendar_unique'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.listing_id} in {self.year}"
+
+    @classmethod
+    def apply(cls, added: Any = (), removed: Any = ()) -> None:
+        """
+        Books the nights of the `added` and frees those of the `removed`
+        confirmed (listing_id, start_date, end_date) stays, locking the
+        calendar rows they touch. Callers hold the listings' booking
+        locks when adding, so two transactions never create the same row.
+        """
+        changes = stay_changes(added, removed)
+        if not changes:
+            return
+        rows = models.Q(pk__in=[])
+        for listing_id, year in changes:
+            rows |= models.Q(listing_id=listing_id, year=year)
+        existing = {
+            (calendar.listing_id, calendar.year): calendar
+            for calendar in cls.objects.select_for_update().filter(rows)
+        }
+
+        created = []
+        for (listing_id, year), spans in changes.items():
+            calendar = existing.get((listing_id, year))
+            bitmap = bytearray(calendar.nights if calendar else bytes(YEAR_BYTES))
+            for first, stop, booked in spans:
+                set_nights(bitmap, first, stop, booked)
+            if calendar:
+                calendar.nights = bytes(bitmap)
+            elif any(bitmap):
+                created.append(cls(listing_id=listing_id, year=year, nights=bytes(bitmap)))
+        cls.objects.bulk_update(existing.values(), ['nights'])
+        cls.objects.bulk_create(created)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Replaces every calendar row with bitmaps built from the confirmed
+        stays. Returns the rows written. Stays confirmed while it runs can
+        be missed; run it when bookings are quiet.
+        """
+        stays = Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED).values_list(
+            'listing_id', 'start_date', 'end_date')
+        with transaction.atomic():
+            bitmaps = build_bitmaps(stays.iterator())
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(listing_id=listing_id, year=year, nights=nights)
+                for (listing_id, year), nights in bitmaps.items()
+            ], batch_size=1000)
+        return len(bitmaps)
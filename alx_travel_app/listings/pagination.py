@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination on the ordering the queryset (or its model's Meta)
+    already declares: Listing by -created_at, Booking by created_at and
+    CustomUser by username. Each page is a range scan on that column
+    instead of an OFFSET plus COUNT(*). Clients may ask for up to
+    max_page_size rows with ?page_size=.
+    """
+    ordering = None
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = self.ordering or queryset.query.order_by or queryset.model._meta.ordering
+        return super().get_ordering(request, queryset, view)
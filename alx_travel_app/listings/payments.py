@@ -0,0 +1,71 @@
+"""
+Payment state transitions.
+
+BookingViewSet's payment actions and their async counterparts only talk
+to the gateway and shape responses; the rows they change are changed here,
+so both answer with the same transitions and raise the same errors
+(BookingConflict when a paid booking's dates were taken meanwhile).
+"""
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+
+from listings.models import Booking, Payment
+from listings.payloads import delay_with_id
+from listings.tasks import initiate_payment_request
+
+
+def payment_request(amount: Any, currency: str, email: str) -> dict[str, Any]:
+    """
+    The gateway's initialize payload, under a fresh merchant reference.
+    """
+    return {
+        "amount": amount,
+        "currency": currency,
+        "email": email,
+        "tx_ref": Payment.generate_merchant_reference(),
+        "callback_url": settings.WEBHOOK_URL,
+    }
+
+
+def confirm_paid_booking(booking: Booking) -> None:
+    """
+    Confirms a booking whose payment went through. Raises BookingConflict
+    when its dates were confirmed for another booking meanwhile.
+    """
+    booking.status = Booking.BookingStatus.CONFIRMED
+    booking.save()
+
+
+def queue_payment(booking: Booking, payload: dict[str, Any]) -> Payment:
+    """
+    Records a PENDING payment for `booking` and queues its initiation
+    once the row is committed.
+    """
+    payment = Payment.objects.create(
+        booking_reference=booking,
+        amount=booking.total_price,
+        merchant_reference=payload['tx_ref'],
+        payment_status=Payment.PaymentStatus.PENDING,
+        raw_request=payload
+    )
+    transaction.on_commit(lambda: delay_with_id(initiate_payment_request, payment.pk))
+    return payment
+
+
+def record_checkout(booking: Booking, payload: dict[str, Any], data: dict[str, Any],
+                    payment: Payment | None = None) -> Payment:
+    """
+    Stores the checkout the gateway opened for `payload`: on `payment`
+    when it is re-initiated, on a new PROCESSING payment otherwise.
+    """
+    if payment is None:
+        payment = Payment(booking_reference=booking, amount=booking.total_price)
+    payment.merchant_reference = payload['tx_ref']
+    payment.checkout_url = data['data']['checkout_url']
+    payment.payment_status = Payment.PaymentStatus.PROCESSING
+    payment.raw_request = payload
+    payment.raw_response = data
+    payment.save()
+    return payment
@@ -42,4 +42,14 @@ class IsAdminOrBookingUser(BasePermission):
     def has_object_permission(self, request, view, obj): # type: ignore
         if request.user.is_superuser:
             return True
-        return hasattr(obj, 'customer') and obj.customer == request.user
\ No newline at end of file
+        return hasattr(obj, 'customer') and obj.customer == request.user
+
+
+class IsAdminOrListingHost(BasePermission):
+    def has_permission(self, request, view): # type: ignore
+        return request.user.is_authenticated
+
+    def has_object_permission(self, request, view, obj): # type: ignore
+        if request.user.is_superuser:
+            return True
+        return obj.host_id == request.user.pk
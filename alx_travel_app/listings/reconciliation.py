@@ -0,0 +1,116 @@
+"""
+Reconciliation of payments stuck in PROCESSING.
+
+A payment normally leaves PROCESSING when its webhook is drained. For the
+ones whose webhook never arrives, the reconciler walks the PROCESSING
+payments nobody has touched for PAYMENT_RECONCILE_AFTER seconds in keyset
+order, a chunk at a time. Each chunk is verified concurrently against the
+gateway under one shared rate limit, and the outcomes are applied with a
+few bulk statements per chunk rather than a query per payment.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from listings.gateway import RateLimiter, get_client
+from listings.models import Payment
+from listings.webhooks import settle_payments
+from utils.logger import logger
+
+
+def stale_payments(cutoff: datetime, after: tuple[datetime, Any] | None, limit: int) -> list[Payment]:
+    """
+    The next `limit` PROCESSING payments last changed before `cutoff`,
+    ordered by (updated_at, pk) and starting after the `after` key.
+    """
+    queryset = Payment.objects.select_related('booking_reference').filter(
+        payment_status=Payment.PaymentStatus.PROCESSING,
+        merchant_reference__isnull=False,
+        updated_at__lt=cutoff,
+    )
+    if after is not None:
+        updated_at, pk = after
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+    return list(queryset.order_by('updated_at', 'pk')[:limit])
+
+
+def _verify(limiter: RateLimiter, tx_ref: str) -> dict[str, Any] | Exception:
+    limiter.acquire()
+    try:
+        return get_client().verify(tx_ref)
+    except Exception as err:
+        return err
+
+
+def reconcile_batch(payments: list[Payment], pool: ThreadPoolExecutor, limiter: RateLimiter) -> Counter[str]:
+    """
+    Verifies a chunk of stale payments and applies the results: paid ones
+    are settled and their bookings confirmed, unpaid ones past
+    PAYMENT_CHECKOUT_EXPIRY are failed, and the rest are marked checked so
+    they wait another PAYMENT_RECONCILE_AFTER. Payments whose verification
+    errored are left as they are for the next run.
+    """
+    verified = pool.map(partial(_verify, limiter), [payment.merchant_reference for payment in payments])
+
+    now = timezone.now()
+    expires_before = now - timedelta(seconds=settings.PAYMENT_CHECKOUT_EXPIRY)
+    counts: Counter[str] = Counter()
+    paid, expired, unpaid = [], [], []
+    for payment, result in zip(payments, verified):
+        if isinstance(result, Exception):
+            counts['error'] += 1
+        elif result.get('status') == 'success':
+            payment.payment_status = Payment.PaymentStatus.SUCCESS
+            paid.append(payment)
+        elif payment.created_at < expires_before:
+            expired.append(payment.pk)
+        else:
+            unpaid.append(payment.pk)
+
+    conflicting = settle_payments(paid)
+    with transaction.atomic():
+        # a webhook may have settled some of these since they were read
+        processing = Payment.objects.filter(payment_status=Payment.PaymentStatus.PROCESSING)
+        processing.filter(pk__in=expired).update(payment_status=Payment.PaymentStatus.FAILED, updated_at=now)
+        processing.filter(pk__in=unpaid).update(updated_at=now)
+
+    counts['paid'] += len(paid) - len(conflicting)
+    counts['conflict'] += len(conflicting)
+    counts['expired'] += len(expired)
+    counts['unpaid'] += len(unpaid)
+    return counts
+
+
+def reconcile_payments() -> dict[str, int]:
+    """
+    Reconciles every stale PROCESSING payment. Returns a count of payments
+    per outcome. Stops early while the gateway's circuit is open.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PAYMENT_RECONCILE_AFTER)
+    batch_size = settings.PAYMENT_RECONCILE_BATCH_SIZE
+    concurrency = settings.PAYMENT_RECONCILE_CONCURRENCY
+    limiter = RateLimiter(settings.PAYMENT_RECONCILE_RATE, burst=concurrency)
+    totals: Counter[str] = Counter()
+    after = None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            payments = stale_payments(cutoff, after, batch_size)
+            if not payments:
+                break
+            # taken before reconcile_batch moves updated_at forward
+            after = (payments[-1].updated_at, payments[-1].pk)
+            totals.update(reconcile_batch(payments, pool, limiter))
+            if get_client().breaker.state == 'open':
+                logger.warning("Payment gateway circuit open; stopping reconciliation early", extra={"data": dict(totals)})
+                break
+            if len(payments) < batch_size:
+                break
+    return dict(totals)
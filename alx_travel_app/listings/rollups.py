@@ -0,0 +1,189 @@
+"""
+Nightly occupancy and revenue rollup for host reports.
+
+ListingDailyStats holds one row per booked night of a listing with the
+revenue that night earned, so a report over any window reads at most one
+row per listing per day instead of aggregating every booking ever made.
+
+The rollup is incremental. Every change that can move a confirmed night
+(a booking saved, confirmed in bulk or deleted) records the nights it
+touched as a StatsDirtyRange in the same transaction. The nightly task
+merges each listing's dirty ranges, reads the confirmed bookings over
+them, and rewrites the stats for those nights only, a batch of listings
+per transaction. Its cost follows the number of changed nights, not the
+number of bookings on record.
+
+A booking's total_price is spread over its nights; pesewas that do not
+divide evenly go to the first nights, so the nights add up to the total.
+"""
+import calendar
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from listings.models import Booking, ListingDailyStats, StatsDirtyRange
+
+PERIODS = ('day', 'month')
+
+
+def stay_nights(start_date: date, end_date: date) -> int:
+    # a same-day stay is priced, and counted, as one night
+    return max((end_date - start_date).days, 1)
+
+
+def night_revenues(booking: Any) -> list[tuple[date, int]]:
+    """
+    The nights of a booking with the revenue each earned, in pesewas.
+    """
+    nights = stay_nights(booking.start_date, booking.end_date)
+    share, remainder = divmod(booking.total_price, nights)
+    return [(booking.start_date + timedelta(days=i), share + (i < remainder)) for i in range(nights)]
+
+
+def merge_ranges(ranges: Iterable[tuple[date, date]]) -> list[tuple[date, date]]:
+    """
+    Overlapping and touching [start, end) ranges merged, in order.
+    """
+    merged: list[list[date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _rollup_batch(listing_ids: list[Any]) -> Counter:
+    """
+    Recomputes the dirty nights of `listing_ids` and clears the dirty
+    ranges it read. Ranges recorded while it runs stay for the next pass.
+    """
+    totals: Counter = Counter()
+    with transaction.atomic():
+        dirty = list(StatsDirtyRange.objects.filter(listing_id__in=listing_ids)
+                     .values_list('pk', 'listing_id', 'start_date', 'end_date'))
+        if not dirty:
+            return totals
+        ranges = defaultdict(list)
+        for _, listing_id, start_date, end_date in dirty:
+            ranges[listing_id].append((start_date, start_date + timedelta(days=stay_nights(start_date, end_date))))
+        ranges = {listing_id: merge_ranges(spans) for listing_id, spans in ranges.items()}
+
+        stats_in_range = Q(pk__in=[])
+        bookings_in_range = Q(pk__in=[])
+        for listing_id, spans in ranges.items():
+            for start, end in spans:
+                stats_in_range |= Q(listing_id=listing_id, day__gte=start, day__lt=end)
+                # end_date >= start keeps same-day stays, which hold their start night
+                bookings_in_range |= Q(listing_id=listing_id, start_date__lt=end, end_date__gte=start)
+
+        bookings = (Booking.objects.filter(bookings_in_range, status=Booking.BookingStatus.CONFIRMED)
+                    .only('listing_id', 'start_date', 'end_date', 'total_price'))
+        rows = []
+        for booking in bookings:
+            for day, revenue in night_revenues(booking):
+                if any(start <= day < end for start, end in ranges[booking.listing_id]):
+                    rows.append(ListingDailyStats(listing_id=booking.listing_id, day=day, revenue=revenue))
+
+        totals['nights_cleared'] = ListingDailyStats.objects.filter(stats_in_range).delete()[0]
+        ListingDailyStats.objects.bulk_create(rows, batch_size=1000)
+        StatsDirtyRange.objects.filter(pk__in=[row[0] for row in dirty]).delete()
+        totals['listings'] = len(ranges)
+        totals['ranges'] = len(dirty)
+        totals['nights_written'] = len(rows)
+    return totals
+
+
+def rollup_stats(batch_size: int | None = None) -> dict[str, int]:
+    """
+    Brings ListingDailyStats up to date with every dirty range, walking
+    the listings that have one in primary key order a batch at a time.
+    """
+    batch_size = batch_size or settings.STATS_ROLLUP_BATCH_SIZE
+    totals: Counter = Counter()
+    after = None
+    while True:
+        pending = StatsDirtyRange.objects.order_by('listing_id')
+        if after is not None:
+            pending = pending.filter(listing_id__gt=after)
+        listing_ids = list(pending.values_list('listing_id', flat=True).distinct()[:batch_size])
+        if not listing_ids:
+            break
+        totals.update(_rollup_batch(listing_ids))
+        after = listing_ids[-1]
+    return dict(totals)
+
+
+def mark_all_dirty() -> int:
+    """
+    Marks every listing's confirmed stays dirty, so the next rollup
+    rebuilds its stats from the bookings. Returns the listings marked.
+    """
+    spans = (Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED)
+             .values('listing_id').annotate(start=Min('start_date'), end=Max('end_date'))
+             .values_list('listing_id', 'start', 'end'))
+    ranges = list(spans)
+    # stats left behind by listings with no confirmed stays any more
+    ranges += [(listing_id, start, end + timedelta(days=1)) for listing_id, start, end in
+               ListingDailyStats.objects.values('listing_id')
+               .annotate(start=Min('day'), end=Max('day')).values_list('listing_id', 'start', 'end')]
+    StatsDirtyRange.mark(ranges)
+    return len({listing_id for listing_id, _, _ in ranges})
+
+
+def _periods(start: date, end: date, period: str) -> list[tuple[date, int]]:
+    """
+    The report buckets of [start, end) with the nights each covers.
+    """
+    if period == 'day':
+        return [(start + timedelta(days=i), 1) for i in range((end - start).days)]
+    buckets = []
+    month = start.replace(day=1)
+    while month < end:
+        following = month.replace(day=calendar.monthrange(month.year, month.month)[1]) + timedelta(days=1)
+        buckets.append((month, (min(following, end) - max(month, start)).days))
+        month = following
+    return buckets
+
+
+def _entry(bucket: date, nights: int, available: int, revenue: int) -> dict[str, Any]:
+    return {
+        'period': bucket,
+        'nights_booked': nights,
+        'nights_available': available,
+        'occupancy': round(nights / available, 4) if available else 0.0,
+        'revenue': f"{revenue / 100:.2f}",
+    }
+
+
+def listing_report(listing_ids: list[Any], start: date, end: date, period: str = 'month') -> dict[Any, dict]:
+    """
+    Occupancy and revenue of each listing over [start, end), bucketed by
+    day or month and zero-filled, from one grouped query over the rollup.
+    """
+    bucket = F('day') if period == 'day' else TruncMonth('day')
+    rows = (ListingDailyStats.objects
+            .filter(listing_id__in=listing_ids, day__gte=start, day__lt=end)
+            .annotate(bucket=bucket).values('listing_id', 'bucket')
+            .annotate(nights=Count('pk'), revenue=Sum('revenue')).order_by())
+    found = {(row['listing_id'], row['bucket']): row for row in rows}
+
+    buckets = _periods(start, end, period)
+    report = {}
+    for listing_id in listing_ids:
+        series = []
+        for bucket_start, available in buckets:
+            row = found.get((listing_id, bucket_start), {})
+            series.append(_entry(bucket_start, row.get('nights', 0), available, row.get('revenue', 0)))
+        nights = sum(entry['nights_booked'] for entry in series)
+        revenue = sum(found.get((listing_id, b), {}).get('revenue', 0) for b, _ in buckets)
+        report[listing_id] = {
+            'series': series,
+            'totals': _entry(start, nights, (end - start).days, revenue),
+        }
+    return report
@@ -0,0 +1,194 @@
+"""
+Full-text search over listing names and descriptions.
+
+The index lives in the database and is kept current by the database on
+every insert, update and delete, whichever code path wrote the row:
+
+  PostgreSQL  a stored generated tsvector column, listings_listing.
+              search_document (name weighted A, description B), with a
+              GIN index.
+  SQLite      an FTS5 table over the listing table's own rows
+              (external content, so the text is not stored twice), kept
+              current by triggers, ranked by bm25 with the name counting
+              SEARCH_NAME_WEIGHT times the description.
+
+A query reads only the index entries of its terms and the listings they
+point at, so its cost follows the number of matching listings, not the
+size of the table.
+
+Neither column nor table is declared on the model; the 0010 migration
+creates them for the vendor it runs on. Django rebuilds a SQLite table
+to alter it, which drops its triggers and renumbers its rows, so
+post_migrate (apps.py) calls ensure_sqlite_index() to put them back and
+reindex.
+
+The FTS5 table points at listings by SQLite's rowid, as the UUID primary
+key is not an integer. For a table without an INTEGER PRIMARY KEY, SQLite
+is free to renumber rowids on VACUUM, which would leave the index naming
+the wrong listings. Vacuum with `manage.py vacuum_database`, which
+rebuilds the index afterwards, or run rebuild_sqlite_index() after any
+other VACUUM.
+"""
+import re
+from typing import Any
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+SEARCH_PARAM = 'q'
+FTS_TABLE = 'listings_listing_fts'
+# a rebuilt listing table comes back without this trigger
+FTS_TRIGGER = 'listings_listing_fts_insert'
+
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, content='listings_listing', content_rowid='rowid', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TRIGGER} AFTER INSERT ON listings_listing BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.rowid, new.name, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS listings_listing_fts_delete AFTER DELETE ON listings_listing BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.rowid, old.name, old.description); END",
+    # rating updates leave the text alone and skip the index
+    f"CREATE TRIGGER IF NOT EXISTS listings_listing_fts_update AFTER UPDATE OF name, description "
+    f"ON listings_listing BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.rowid, old.name, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.rowid, new.name, new.description); END",
+]
+
+
+def rebuild_sqlite_index(connection: Any) -> None:
+    """
+    Reindexes every listing from the listing table, by its current rowids.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install_sqlite_index(connection: Any) -> None:
+    """
+    Creates the FTS5 table and its triggers where missing, sets the bm25
+    column weights and indexes every existing listing.
+    """
+    with connection.cursor() as cursor:
+        for statement in SQLITE_INDEX:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)",
+            [f"bm25({float(settings.SEARCH_NAME_WEIGHT)}, 1.0)"])
+    rebuild_sqlite_index(connection)
+
+
+def ensure_sqlite_index(connection: Any) -> bool:
+    """
+    Reinstalls and rebuilds the SQLite index when the listing table lost
+    its triggers. Returns True when it had to.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    tables = connection.introspection.table_names()
+    if FTS_TABLE not in tables:
+        # not migrated that far yet, or migrated back past 0010
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [FTS_TRIGGER])
+        if cursor.fetchone():
+            return False
+    install_sqlite_index(connection)
+    return True
+
+
+def search_terms(text: str) -> list[str]:
+    """
+    The words of a free-text query. Punctuation and operators are dropped,
+    so any input is a valid query and all of its words must match.
+    """
+    return re.findall(r'\w+', text)[:settings.SEARCH_MAX_TERMS]
+
+
+def _sqlite_search(queryset: QuerySet, terms: list[str]) -> QuerySet:
+    # the FTS5 table has no model to join through; the match drives the
+    # join and each hit reads its listing by rowid
+    match = ' '.join(f'"{term}"' for term in terms)
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "listings_listing"."rowid"'],
+        params=[match])
+    # bm25 is lower for better matches
+    return queryset.annotate(search_rank=RawSQL(f'-{FTS_TABLE}.rank', (), output_field=FloatField()))
+
+
+def _postgres_search(queryset: QuerySet, terms: list[str]) -> QuerySet:
+    query = ' '.join(terms)
+    matches = RawSQL(
+        '''"listings_listing"."search_document" @@ plainto_tsquery('english', %s)''',
+        (query,), output_field=BooleanField())
+    # ts_rank is a real; as float8 it survives the round trip through a page cursor
+    rank = RawSQL(
+        '''ts_rank("listings_listing"."search_document", plainto_tsquery('english', %s))::float8''',
+        (query,), output_field=FloatField())
+    return queryset.filter(matches).annotate(search_rank=rank)
+
+
+def _substring_search(queryset: QuerySet, terms: list[str]) -> QuerySet:
+    matches = Q()
+    for term in terms:
+        matches &= Q(name__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(matches).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def full_text_search(queryset: QuerySet, text: str) -> QuerySet:
+    """
+    Listings matching every word of `text`, annotated with search_rank
+    (higher is more relevant). Backends without a search index fall back
+    to unranked substring matching.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return _sqlite_search(queryset, terms)
+    if vendor == 'postgresql':
+        return _postgres_search(queryset, terms)
+    return _substring_search(queryset, terms)
+
+
+def search_text(request: Any) -> str:
+    return request.query_params.get(SEARCH_PARAM, '').strip()
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Filters listings by ?q= against the search index.
+    """
+    def filter_queryset(self, request, queryset, view):
+        text = search_text(request)
+        return queryset.search(text) if text else queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': SEARCH_PARAM,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over listing names and descriptions, most relevant first',
+            'schema': {'type': 'string'},
+        }]
+
+
+class RelevanceOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that puts search results most relevant first unless
+    the client asked for an ?ordering=. Goes after FullTextSearchFilter,
+    which adds the rank; the cursor paginator pages on this ordering too.
+    """
+    relevance_ordering = ['-search_rank', '-created_at']
+
+    def get_ordering(self, request, queryset, view):
+        if search_text(request) and self.ordering_param not in request.query_params:
+            return self.relevance_ordering
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,84 @@
+"""
+Bulk loading of generated datasets.
+
+Shared by `seed --bulk` and the benchmarks: each table of a Dataset is
+inserted in chunks with bulk_create, optionally generating the chunks in
+worker processes.
+"""
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from itertools import repeat
+from typing import Any, Iterator
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from listings.fake_data import TABLES, Dataset, chunk_rows
+from listings.models import Booking, Listing, ListingCalendar, Payment, Review
+from listings.rollups import mark_all_dirty
+
+MODELS = {
+    'users': get_user_model(),
+    'listings': Listing,
+    'bookings': Booking,
+    'payments': Payment,
+    'reviews': Review,
+}
+
+
+def generate_chunks(pool: Executor | None, dataset: Dataset, table: str, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """
+    Yields the rows of one dataset table in chunks of `chunk_size`, in
+    order. With a pool the chunks are generated in worker processes.
+    """
+    total = dataset.count(table)
+    starts = range(0, total, chunk_size)
+    stops = [min(start + chunk_size, total) for start in starts]
+    if pool is None:
+        for start, stop in zip(starts, stops):
+            yield chunk_rows(dataset, table, start, stop)
+    else:
+        yield from pool.map(chunk_rows, repeat(dataset), repeat(table), starts, stops)
+
+
+@contextmanager
+def generated_timestamps(model: Any) -> Iterator[None]:
+    """
+    Turns off auto_now and auto_now_add on `model`'s fields for the
+    duration, so bulk_create keeps the dataset's timestamps instead of
+    stamping every row with the time of the load. The flags live on the
+    shared field objects, so nothing else should save `model` meanwhile.
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_load(dataset: Dataset, chunk_size: int = 2000, pool: Executor | None = None) -> Iterator[tuple[str, int, float]]:
+    """
+    Inserts `dataset` in one transaction, yielding (table, rows, seconds)
+    as each table finishes. Model save() is bypassed, so once every table
+    is in, the rating aggregates and listing calendars are rebuilt and
+    the confirmed stays are marked for the next stats rollup.
+    """
+    with transaction.atomic():
+        for table in TABLES:
+            model = MODELS[table]
+            started = time.perf_counter()
+            rows = 0
+            with generated_timestamps(model):
+                for chunk in generate_chunks(pool, dataset, table, chunk_size):
+                    model.objects.bulk_create([model(**row) for row in chunk], batch_size=chunk_size)
+                    rows += len(chunk)
+            yield table, rows, time.perf_counter() - started
+        Listing.objects.rebuild_rating_aggregates()
+        ListingCalendar.rebuild()
+        mark_all_dirty()
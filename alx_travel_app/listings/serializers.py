@@ -1,9 +1,26 @@
 from rest_framework import serializers
+from django.conf import settings
 from listings.models import Booking, Listing, CustomUser
 from datetime import date
 from typing import Any
 
 
+def validate_stay(attrs: dict[str, Any]) -> dict[str, Any]:
+    """
+    Validates that:
+    - end_date is after start_date
+    - start_date is not in the past
+    """
+    start_date = attrs.get('start_date')
+    end_date = attrs.get('end_date')
+
+    if end_date <= start_date: #type:ignore
+        raise serializers.ValidationError("End date must be after start date.")
+    if start_date < date.today(): #type:ignore
+        raise serializers.ValidationError("You cannot book for a past date.")
+    return attrs
+
+
 class BookingSerializer(serializers.HyperlinkedModelSerializer):
     """
     Handles serialization and validation for Booking objects.
@@ -30,19 +47,33 @@ class BookingSerializer(serializers.HyperlinkedModelSerializer):
         return f"{obj.total_price / 100:.2f}"
 
     def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
-        """
-        Validates that:
-        - end_date is after start_date
-        - start_date is not in the past
-        """
-        start_date = attrs.get('start_date')
-        end_date = attrs.get('end_date')
+        return validate_stay(attrs)
 
-        if end_date <= start_date: #type:ignore
-            raise serializers.ValidationError("End date must be after start date.")
-        if start_date < date.today(): #type:ignore
-            raise serializers.ValidationError("You cannot book for a past date.")
-        return attrs
+
+class BookingImportRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk booking import. Other columns, such as
+    those of an export, are ignored.
+    """
+    listing = serializers.UUIDField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        return validate_stay(attrs)
+
+
+class BookingImportResultSerializer(serializers.Serializer):
+    row = serializers.IntegerField(help_text="Line of the row in the upload, from 1 (CSV counts its header)")
+    status = serializers.ChoiceField(choices=['created', 'rejected'])
+    booking = serializers.UUIDField(required=False)
+    errors = serializers.DictField(required=False)
+
+
+class BookingImportResponseSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    rejected = serializers.IntegerField()
+    results = BookingImportResultSerializer(many=True)
 
 
 class ListingSerializer(serializers.HyperlinkedModelSerializer):
@@ -59,8 +90,85 @@ class ListingSerializer(serializers.HyperlinkedModelSerializer):
             'name',
             'description',
             'price_per_night',
+            'rating_avg',
+            'rating_count',
         ]
-        read_only_fields = ['host']
+        read_only_fields = ['host', 'rating_avg', 'rating_count']
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    """
+    Validates query parameters for the listing availability search.
+    """
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    min_price = serializers.DecimalField(max_digits=7, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=7, decimal_places=2, required=False)
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Validates that check_out is after check_in and the price range is ordered.
+        """
+        if attrs['check_out'] <= attrs['check_in']:
+            raise serializers.ValidationError("check_out must be after check_in.")
+        min_price = attrs.get('min_price')
+        max_price = attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError("min_price cannot exceed max_price.")
+        return attrs
+
+
+class StatsReportSerializer(serializers.Serializer):
+    """
+    Validates query parameters for the host occupancy and revenue reports.
+    """
+    start = serializers.DateField()
+    end = serializers.DateField(help_text="First day after the report window")
+    period = serializers.ChoiceField(choices=['day', 'month'], default='month')
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Validates that end is after start and the window is not too long.
+        """
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError("end must be after start.")
+        if (attrs['end'] - attrs['start']).days > settings.STATS_MAX_DAYS:
+            raise serializers.ValidationError(f"A report covers at most {settings.STATS_MAX_DAYS} days.")
+        return attrs
+
+
+class StatsPeriodSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    nights_booked = serializers.IntegerField()
+    nights_available = serializers.IntegerField()
+    occupancy = serializers.FloatField()
+    revenue = serializers.CharField()
+
+
+class ListingStatsSerializer(serializers.Serializer):
+    listing = serializers.UUIDField()
+    name = serializers.CharField()
+    totals = StatsPeriodSerializer()
+    series = StatsPeriodSerializer(many=True)
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    """
+    Validates query parameters for a listing's calendar.
+    """
+    year = serializers.IntegerField(min_value=1, max_value=9999, required=False,
+                                    help_text="Calendar year, the current one by default")
+
+
+class CalendarMonthSerializer(serializers.Serializer):
+    month = serializers.CharField(help_text="YYYY-MM")
+    nights = serializers.CharField(help_text='One character per night of the month: "1" booked, "0" free')
+
+
+class ListingCalendarSerializer(serializers.Serializer):
+    listing = serializers.UUIDField()
+    year = serializers.IntegerField()
+    months = CalendarMonthSerializer(many=True)
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -128,4 +236,11 @@ class PaymentResponseSerializer(serializers.Serializer):
     msg = serializers.CharField()
     checkout = serializers.URLField(required=False)
     redirect_url = serializers.URLField(required=False)
-    status = serializers.CharField(required=False)
\ No newline at end of file
+    status_url = serializers.URLField(required=False)
+    status = serializers.CharField(required=False)
+
+
+class VerifyPaymentResponseSerializer(serializers.Serializer):
+    msg = serializers.CharField()
+    booking_status = serializers.CharField()
+    payment_status = serializers.CharField()
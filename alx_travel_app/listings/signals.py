@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from listings.models import Booking, Listing, ListingCalendar, Review, StatsDirtyRange
+from listings.cache import invalidate_listing
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def invalidate_cached_listing(sender, instance, **kwargs):
+    """
+    Drops cached reads of a listing once its change is committed.
+    """
+    transaction.on_commit(lambda: invalidate_listing(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_reviewed_listing(sender, instance, **kwargs):
+    """
+    A review changes its listing's rating, so its cached reads go too.
+    """
+    transaction.on_commit(lambda: invalidate_listing(instance.listing_id))
+
+
+@receiver(post_delete, sender=Booking)
+def free_deleted_stay(sender, instance, **kwargs):
+    """
+    A deleted confirmed booking frees its nights in the stats rollup and
+    the listing's calendar.
+    """
+    if instance.status == Booking.BookingStatus.CONFIRMED:
+        stay = (instance.listing_id, instance.start_date, instance.end_date)
+        StatsDirtyRange.mark([stay])
+        ListingCalendar.apply(removed=[stay])
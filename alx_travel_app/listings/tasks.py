@@ -1,27 +1,210 @@
-from celery import shared_task
-from django.core.mail import send_mail
+from datetime import timedelta
+from celery import Task, shared_task
 from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+from listings.models import Booking, Payment
+from listings.payloads import delay_with_id, unpack_id
+from listings.gateway import get_client, circuit_open, GatewayUnavailable
+from listings.webhooks import claim_webhook_events, process_webhook_batch, release_stale_claims
+from listings.reconciliation import reconcile_payments
+from listings.rollups import rollup_stats
+from listings.emails import confirmation_message, flush_outbox
+from utils.logger import logger
+import requests
+
+WEBHOOK_DRAIN_KEY = 'webhooks:drain-scheduled'
+RECONCILE_LOCK_KEY = 'payments:reconcile-running'
+EMAIL_FLUSH_KEY = 'emails:flush-scheduled'
+ROLLUP_LOCK_KEY = 'stats:rollup-running'
+# the run locks must hold across every worker, so they live in the shared cache
+job_locks = ConnectionProxy(caches, 'shared')
+
+
+@shared_task
+def send_booking_confirmation_email(payload):
+    """
+    Sends the confirmation email for one booking, e.g. a re-send from the
+    admin. Takes pack_id(booking.pk) and loads the booking with its
+    customer and listing in one query. New bookings go through the
+    batched outbox.
+    """
+    booking_id = unpack_id(payload)
+    booking = Booking.objects.select_related('customer', 'listing').filter(pk=booking_id).first()
+    if booking is None:
+        logger.warning(f"Booking {booking_id} no longer exists; confirmation email not sent")
+        return
+    confirmation_message(booking).send(fail_silently=False)
+
+
+class PaymentInitiationTask(Task):
+    """
+    Marks a queued payment failed once its initiation gives up, after the
+    last retry or on an error that is not retried, so it stops being
+    reported as queued.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        payment_id = unpack_id(args[0])
+        failed = Payment.objects.filter(
+            pk=payment_id,
+            payment_status=Payment.PaymentStatus.PENDING,
+            checkout_url__isnull=True,
+        ).update(
+            payment_status=Payment.PaymentStatus.FAILED,
+            raw_response={'error': str(exc)},
+            updated_at=timezone.now(),
+        )
+        if failed:
+            logger.warning(f"Payment {payment_id} initiation gave up; marked failed", extra={"data": {"error": str(exc)}})
+
+
+@shared_task(
+    base=PaymentInitiationTask,
+    autoretry_for=(requests.RequestException, GatewayUnavailable),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=settings.PAYMENT_TASK_MAX_RETRIES,
+)
+def initiate_payment_request(payload):
+    """
+    Sends a queued payment's stored request to Chapa and records the checkout URL.
+    Takes pack_id(payment.pk).
+    Network errors, timeouts, 5xx answers and an open circuit are retried with
+    exponential backoff; a definite rejection marks the payment as failed.
+    """
+    payment = Payment.objects.get(pk=unpack_id(payload))
+    if payment.payment_status != Payment.PaymentStatus.PENDING or payment.checkout_url:
+        return
+
+    data = get_client().initialize(payment.raw_request)
+
+    payment.raw_response = data
+    if data.get('status') == 'success':
+        payment.checkout_url = data['data']['checkout_url']
+        payment.payment_status = Payment.PaymentStatus.PROCESSING
+    else:
+        payment.payment_status = Payment.PaymentStatus.FAILED
+    payment.save(update_fields=['raw_response', 'checkout_url', 'payment_status', 'updated_at'])
+
+
+def requeue_payment_initiation(payment: Payment) -> bool:
+    """
+    Queues the initiation of a PENDING payment again when nothing has
+    touched it for PAYMENT_REQUEUE_AFTER seconds, e.g. because its message
+    was lost before a worker took it. Of several concurrent callers only
+    one queues it. Returns whether it was queued.
+    """
+    now = timezone.now()
+    queued = Payment.objects.filter(
+        pk=payment.pk,
+        payment_status=Payment.PaymentStatus.PENDING,
+        checkout_url__isnull=True,
+        updated_at__lt=now - timedelta(seconds=settings.PAYMENT_REQUEUE_AFTER),
+    ).update(updated_at=now)
+    if queued:
+        logger.info(f"Payment {payment.pk} initiation queued again")
+        transaction.on_commit(lambda: delay_with_id(initiate_payment_request, payment.pk))
+    return bool(queued)
+
+
+@shared_task
+def process_webhook_events():
+    """
+    Drains the webhook events due when it starts, in batches. Events put
+    back for a retry wait for their backoff, and the drain stops while
+    the gateway's circuit breaker is open.
+    """
+    release_stale_claims()
+    started = timezone.now()
+    totals = {}
+    while not circuit_open():
+        events = claim_webhook_events(settings.WEBHOOK_BATCH_SIZE, due_by=started)
+        if not events:
+            break
+        for status, count in process_webhook_batch(events).items():
+            totals[status] = totals.get(status, 0) + count
+        if len(events) < settings.WEBHOOK_BATCH_SIZE:
+            break
+    if totals:
+        logger.info("Processed webhook events", extra={"data": totals})
+    return totals
+
+
+@shared_task
+def reconcile_stale_payments():
+    """
+    Verifies payments stuck in PROCESSING whose webhook never arrived.
+    Runs from beat; a run still in progress makes the next one a no-op.
+    """
+    if not job_locks.add(RECONCILE_LOCK_KEY, True, timeout=settings.PAYMENT_RECONCILE_LOCK_TIMEOUT):
+        return {}
+    try:
+        totals = reconcile_payments()
+    finally:
+        job_locks.delete(RECONCILE_LOCK_KEY)
+    if totals:
+        logger.info("Reconciled stale payments", extra={"data": totals})
+    return totals
 
 
 @shared_task
-def send_booking_confirmation_email(to_email, booking_id, listing_title, booking_date):
-    """
-    Shared task to send booking confirmation email using Django's email backend.
-    """
-    subject = "Booking Confirmation"
-    message = (
-        f"Dear Customer,\n\n"
-        f"Your booking has been confirmed!\n\n"
-        f"Booking ID: {booking_id}\n"
-        f"Listing: {listing_title}\n"
-        f"Date: {booking_date}\n\n"
-        f"Thank you for choosing us!"
-    )
-
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[to_email],
-        fail_silently=False,
-    )
\ No newline at end of file
+def rollup_listing_stats():
+    """
+    Recomputes the host report stats of every night changed since the
+    last run. Runs nightly from beat; a run still in progress makes the
+    next one a no-op.
+    """
+    if not job_locks.add(ROLLUP_LOCK_KEY, True, timeout=settings.STATS_ROLLUP_LOCK_TIMEOUT):
+        return {}
+    try:
+        totals = rollup_stats()
+    finally:
+        job_locks.delete(ROLLUP_LOCK_KEY)
+    if totals:
+        logger.info("Rolled up listing stats", extra={"data": totals})
+    return totals
+
+
+def schedule_webhook_drain():
+    """
+    Queues one drain a short delay from now unless one is already queued,
+    so a burst of webhooks is verified in a few batches rather than one
+    task per event. The beat schedule drains anything this misses.
+    """
+    if not cache.add(WEBHOOK_DRAIN_KEY, True, timeout=settings.WEBHOOK_DRAIN_DELAY):
+        return
+    try:
+        process_webhook_events.apply_async(countdown=settings.WEBHOOK_DRAIN_DELAY) # type: ignore
+    except Exception:
+        cache.delete(WEBHOOK_DRAIN_KEY)
+        logger.warning("Could not queue webhook drain; beat will pick the events up", exc_info=True)
+
+
+@shared_task
+def flush_email_outbox():
+    """
+    Sends every queued notification email in batches over one connection.
+    """
+    totals = flush_outbox()
+    if totals:
+        logger.info("Flushed email outbox", extra={"data": totals})
+    return totals
+
+
+def schedule_email_flush():
+    """
+    Queues one outbox flush EMAIL_BATCH_WINDOW seconds from now unless one
+    is already queued, so the emails of a burst of bookings share a batch
+    and a connection. The beat schedule flushes anything this misses.
+    """
+    if not cache.add(EMAIL_FLUSH_KEY, True, timeout=settings.EMAIL_BATCH_WINDOW):
+        return
+    try:
+        flush_email_outbox.apply_async(countdown=settings.EMAIL_BATCH_WINDOW) # type: ignore
+    except Exception:
+        cache.delete(EMAIL_FLUSH_KEY)
+        logger.warning("Could not queue email flush; beat will pick the emails up", exc_info=True)
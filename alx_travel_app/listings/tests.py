@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import smtplib
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from kombu.serialization import dumps, loads
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core import mail
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from listings import cache as listing_cache
+from listings import async_views, gateway, reconciliation, tasks
+from listings.management.commands.check_query_counts import LIST_URLS
+from listings.management.commands.check_query_plans import booking_cases, listing_cases
+from listings.availability import confirm_bookings
+from listings.bulk import CSV, NDJSON
+from listings.fake_data import Dataset
+from listings.emails import flush_outbox, queue_confirmation_emails
+from listings.idempotency import run_once
+from listings.models import (
+    Booking, BookingConflict, Listing, ListingCalendar, ListingDailyStats, OutboundEmail, Payment, Review,
+    StatsDirtyRange, WebhookEvent
+)
+from listings.payloads import pack_id, unpack_id
+from listings.rollups import rollup_stats
+from listings.search import rebuild_sqlite_index
+from listings.seeding import bulk_load
+from listings.views import BookingViewSet, ListingViewSet
+from listings.webhooks import claim_webhook_events, process_webhook_batch
+from utils.fake_chapa import FakeChapaServer
+from utils.querycount import assert_constant_queries
+from utils.queryplan import SCANS, filtered_columns, full_scans, list_page_queryset
+
+User = get_user_model()
+START = date(2031, 3, 1)
+
+
+def make_listing(username: str = 'host', price: int = 100) -> Listing:
+    host = User.objects.create_user(username=username)
+    return Listing.objects.create(host=host, name='Test listing', description='Test', price_per_night=price)
+
+
+def make_booking(listing: Listing, customer, start: date, nights: int = 2) -> Booking:
+    return Booking.objects.create(
+        customer=customer, listing=listing, start_date=start, end_date=start + timedelta(days=nights))
+
+
+def booked_nights(listing: Listing) -> set[date]:
+    """
+    The nights a listing's calendar rows mark as booked.
+    """
+    nights = set()
+    for calendar in ListingCalendar.objects.filter(listing=listing):
+        bitmap = bytes(calendar.nights)
+        for night in range(len(bitmap) * 8):
+            if bitmap[night >> 3] & (0x80 >> (night & 7)):
+                nights.add(date(calendar.year, 1, 1) + timedelta(days=night))
+    return nights
+
+
+def stay(start: date, nights: int) -> set[date]:
+    return {start + timedelta(days=i) for i in range(nights)}
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every list filter seeks into an index on a column it filters on, as
+    check_query_plans reports.
+    """
+    rows = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='query-plan-customer')
+        cls.hosts = [User.objects.create(username=f'query-plan-host-{i}') for i in range(5)]
+        cls.listings = [
+            Listing.objects.create(
+                host=cls.hosts[i % len(cls.hosts)], name=f'Listing {i}',
+                description='Query plan fixture', price_per_night=20 + i)
+            for i in range(cls.rows)
+        ]
+        for i in range(cls.rows):
+            make_booking(cls.listings[0], cls.customer, date.today() + timedelta(days=3 * i))
+
+    def setUp(self):
+        if connection.vendor not in SCANS:
+            self.skipTest(f"no query plan patterns for {connection.vendor}")
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assert_narrowed_by_index(self, viewset, model, user, cases):
+        for name, params in cases:
+            with self.subTest(name):
+                plan = list_page_queryset(viewset, params, user).explain()
+                scans = full_scans(plan, connection.vendor, model._meta.db_table, filtered_columns(model, params))
+                self.assertEqual(scans, [], plan)
+
+    def test_listing_filters(self):
+        self.assert_narrowed_by_index(ListingViewSet, Listing, None, listing_cases(self.hosts[0]))
+
+    def test_booking_filters(self):
+        self.assert_narrowed_by_index(BookingViewSet, Booking, self.customer, booking_cases(self.listings[0]))
+
+    def test_index_walks_and_unrelated_seeks_are_reported(self):
+        table = Listing._meta.db_table
+        walk = f"SCAN {table} USING INDEX listing_created_idx"
+        seek = f"SEARCH {table} USING INDEX listing_host_created_idx (host_id=?)"
+        self.assertEqual(full_scans(walk, 'sqlite', table), [walk])
+        self.assertEqual(full_scans(seek, 'sqlite', table, ['host_id']), [])
+        self.assertEqual(full_scans(seek, 'sqlite', table, ['rating_count']), [seek])
+
+        plan = (f"Limit\n  ->  Index Scan using listing_created_idx on {table}\n"
+                "        Filter: (rating_count >= 10)")
+        self.assertEqual(len(full_scans(plan, 'postgresql', table, ['rating_count'])), 1)
+        plan = (f"Limit\n  ->  Index Scan using listing_rating_count_idx on {table}\n"
+                "        Index Cond: (rating_count >= 10)")
+        self.assertEqual(full_scans(plan, 'postgresql', table, ['rating_count']), [])
+
+
+class BookingOverlapTests(TestCase):
+    """
+    Booking.save() refuses a confirmed stay over another one, under the
+    listing's lock row.
+    """
+
+    def setUp(self):
+        self.listing = make_listing()
+        self.customer = User.objects.create_user(username='guest', email='guest@example.com')
+        self.first = make_booking(self.listing, self.customer, START, nights=3)
+        self.first.status = Booking.BookingStatus.CONFIRMED
+        self.first.save()
+
+    def confirm(self, start: date, nights: int = 2) -> Booking:
+        booking = make_booking(self.listing, self.customer, start, nights)
+        booking.status = Booking.BookingStatus.CONFIRMED
+        booking.save()
+        return booking
+
+    def test_overlapping_confirmation_conflicts(self):
+        with self.assertRaises(BookingConflict):
+            self.confirm(START + timedelta(days=1))
+        self.assertEqual(Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED).count(), 1)
+
+    def test_back_to_back_stays_do_not_overlap(self):
+        self.confirm(START + timedelta(days=3))
+        self.confirm(START - timedelta(days=2))
+        self.assertEqual(Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED).count(), 3)
+
+    def test_moving_a_stay_is_checked_against_the_others(self):
+        second = self.confirm(START + timedelta(days=5))
+        second.start_date = START + timedelta(days=2)
+        with self.assertRaises(BookingConflict):
+            second.save()
+        self.first.end_date = START + timedelta(days=4)
+        self.first.save()
+
+
+class AvailabilitySearchTests(TestCase):
+    """
+    /listings/available/ leaves out listings with a confirmed stay over the
+    requested nights, in one anti-join.
+    """
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username='guest')
+        self.free = make_listing('free-host', price=50)
+        self.taken = make_listing('taken-host', price=80)
+        self.pending = make_listing('pending-host', price=200)
+        stay = make_booking(self.taken, self.customer, START, nights=4)
+        stay.status = Booking.BookingStatus.CONFIRMED
+        stay.save()
+        make_booking(self.pending, self.customer, START, nights=4)
+
+    def available(self, check_in: date, check_out: date, **params) -> set[str]:
+        response = APIClient().get(
+            '/api/v1/listings/available/', {'check_in': check_in, 'check_out': check_out, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return {listing['host_username'] for listing in response.json()['results']}
+
+    def test_confirmed_stays_block_their_nights_only(self):
+        self.assertEqual(self.available(START + timedelta(days=1), START + timedelta(days=2)),
+                         {'free-host', 'pending-host'})
+        self.assertEqual(self.available(START + timedelta(days=4), START + timedelta(days=6)),
+                         {'free-host', 'taken-host', 'pending-host'})
+        self.assertEqual(self.available(START - timedelta(days=2), START),
+                         {'free-host', 'taken-host', 'pending-host'})
+
+    def test_price_range(self):
+        self.assertEqual(self.available(START, START + timedelta(days=1), min_price=40, max_price=100),
+                         {'free-host'})
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            listings = list(Listing.objects.available_between(START, START + timedelta(days=1)))
+        self.assertEqual({listing.pk for listing in listings}, {self.free.pk, self.pending.pk})
+
+    def test_rejects_empty_stay(self):
+        response = APIClient().get('/api/v1/listings/available/', {'check_in': START, 'check_out': START})
+        self.assertEqual(response.status_code, 400)
+
+
+class ListQueryCountTests(TestCase):
+    """
+    List endpoints issue the same number of queries whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='query-count-customer')
+        for i in range(12):
+            listing = make_listing(f'query-count-host-{i}')
+            booking = make_booking(listing, cls.customer, START + timedelta(days=3 * i))
+            Payment.objects.create(booking_reference=booking, amount=1, merchant_reference=f'tx-count-{i}')
+            Review.objects.create(customer=cls.customer, listing=listing, rating=4, comment='Fine')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_list_endpoints(self):
+        for url in LIST_URLS:
+            with self.subTest(url):
+                assert_constant_queries(self.client, url, page_sizes=(1, 5, 12))
+
+    def test_reports_a_serializer_n_plus_one(self):
+        with mock.patch.object(ListingViewSet, 'select_related_fields', ()), \
+                self.assertRaisesRegex(AssertionError, 'varies with page size'):
+            assert_constant_queries(self.client, '/api/v1/listings/', page_sizes=(1, 5, 12))
+
+
+class ListingCacheTests(TestCase):
+    """
+    Cached listing reads are served until the listing or one of its
+    reviews changes, and answer conditional requests with 304.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.listing = make_listing()
+        self.url = f'/api/v1/listings/{self.listing.pk}/'
+        self.client = APIClient()
+
+    def test_detail_is_cached_until_the_listing_changes(self):
+        self.assertEqual(self.client.get(self.url).json()['name'], 'Test listing')
+        # an UPDATE that skips the signals leaves the cached payload in place
+        Listing.objects.filter(pk=self.listing.pk).update(name='Renamed quietly')
+        self.assertEqual(self.client.get(self.url).json()['name'], 'Test listing')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.name = 'Renamed'
+            self.listing.save()
+        self.assertEqual(self.client.get(self.url).json()['name'], 'Renamed')
+
+    def test_review_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        customer = User.objects.create_user(username='guest')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(customer=customer, listing=self.listing, rating=5, comment='Great')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['rating_count'], 1)
+
+    def test_list_pages_are_retired_by_any_listing_change(self):
+        self.assertEqual(len(self.client.get('/api/v1/listings/').json()['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_listing('second-host')
+        self.assertEqual(len(self.client.get('/api/v1/listings/').json()['results']), 2)
+
+    def test_invalidation_during_a_build_is_not_overwritten(self):
+        request = RequestFactory().get(self.url)
+
+        def stale_build():
+            # the listing changes, and is invalidated, while this build runs
+            listing_cache.invalidate_listing(self.listing.pk)
+            return {'data': {'name': 'stale'}, 'etag': 'stale', 'last_modified': None}
+
+        listing_cache.cached_detail(request, self.listing.pk, stale_build)
+        fresh = {'data': {'name': 'fresh'}, 'etag': 'fresh', 'last_modified': None}
+        response = listing_cache.cached_detail(request, self.listing.pk, lambda: fresh)
+        self.assertEqual(response.data, {'name': 'fresh'})
+
+    def test_entries_live_in_the_shared_cache(self):
+        self.client.get(self.url)
+        # another worker's invalidation, written straight to the shared cache
+        caches['shared'].set(listing_cache._generation_key(self.listing.pk), 'elsewhere', None)
+        Listing.objects.filter(pk=self.listing.pk).update(name='Renamed elsewhere')
+        self.assertEqual(self.client.get(self.url).json()['name'], 'Renamed elsewhere')
+
+
+class FakeGatewayTestCase(TestCase):
+    """
+    Points the payment gateway client at a FakeChapaServer, so calls go
+    over real HTTP through the pooled client.
+    """
+    gateway = {}
+
+    def setUp(self):
+        self.chapa = FakeChapaServer(**self.gateway).start()
+        self.addCleanup(self.chapa.stop)
+        settings = override_settings(
+            PAYMENT_API_BASE_URL=self.chapa.initialize_url, PAYMENT_VERIFY_URL=self.chapa.verify_url,
+            PAYMENT_API_KEY='test-key', PAYMENT_API_TIMEOUT=0.2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        gateway.reset_client()
+        self.addCleanup(gateway.reset_client)
+
+
+class PaymentInitiationTests(FakeGatewayTestCase):
+    """
+    Queued initiations record the gateway's checkout, and fail their
+    payment once they give up.
+    """
+
+    def setUp(self):
+        super().setUp()
+        listing = make_listing()
+        self.customer = User.objects.create_user(username='guest', email='guest@example.com')
+        self.payments = []
+        for i in range(3):
+            booking = make_booking(listing, self.customer, START + timedelta(days=3 * i))
+            self.payments.append(Payment.objects.create(
+                booking_reference=booking, amount=1, merchant_reference=f'tx-queued-{i}',
+                payment_status=Payment.PaymentStatus.PENDING, raw_request={'tx_ref': f'tx-queued-{i}'}))
+        Payment.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def initiate(self, payment: Payment, retries: int | None = None):
+        if retries is None:
+            return tasks.initiate_payment_request.apply(args=(pack_id(payment.pk),))
+        with mock.patch.object(tasks.initiate_payment_request, 'max_retries', retries):
+            return tasks.initiate_payment_request.apply(args=(pack_id(payment.pk),))
+
+    def test_checkout_is_recorded_over_one_connection(self):
+        for payment in self.payments:
+            self.assertEqual(self.initiate(payment).state, 'SUCCESS')
+        for payment in self.payments:
+            payment.refresh_from_db()
+            self.assertEqual(payment.payment_status, Payment.PaymentStatus.PROCESSING)
+            self.assertEqual(payment.checkout_url, f'{self.chapa.base_url}/checkout/{payment.merchant_reference}')
+            self.assertGreater(payment.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(len(self.chapa.requests), 3)
+        self.assertEqual(self.chapa.connections, 1)
+
+    def test_last_retry_fails_the_payment(self):
+        self.chapa.httpd.fail_rate = 1.0
+        self.assertEqual(self.initiate(self.payments[0], retries=0).state, 'FAILURE')
+        self.payments[0].refresh_from_db()
+        self.assertEqual(self.payments[0].payment_status, Payment.PaymentStatus.FAILED)
+        self.assertIn('503', self.payments[0].raw_response['error'])
+
+    def test_timeout_fails_the_payment(self):
+        self.chapa.httpd.delay = 0.5
+        self.assertEqual(self.initiate(self.payments[0], retries=0).state, 'FAILURE')
+        self.payments[0].refresh_from_db()
+        self.assertEqual(self.payments[0].payment_status, Payment.PaymentStatus.FAILED)
+
+    def test_stale_pending_payment_is_queued_again_once(self):
+        payment = self.payments[0]
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now())
+        self.assertFalse(tasks.requeue_payment_initiation(payment))
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        with mock.patch.object(tasks, 'delay_with_id') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(tasks.requeue_payment_initiation(payment))
+            self.assertFalse(tasks.requeue_payment_initiation(payment))
+        delay.assert_called_once_with(tasks.initiate_payment_request, payment.pk)
+
+
+@override_settings(WEBHOOK_SECRET='webhook-secret')
+class WebhookTests(FakeGatewayTestCase):
+    """
+    Webhooks are stored and acknowledged at once, then verified in
+    batches; failed verifications back off instead of being retried in
+    the same drain.
+    """
+
+    def setUp(self):
+        super().setUp()
+        listing = make_listing()
+        customer = User.objects.create_user(username='guest')
+        self.bookings = []
+        for i in range(3):
+            booking = make_booking(listing, customer, START + timedelta(days=3 * i))
+            Payment.objects.create(
+                booking_reference=booking, amount=1, merchant_reference=f'tx{i}',
+                payment_status=Payment.PaymentStatus.PROCESSING)
+            self.bookings.append(booking)
+
+    def post(self, payload: dict, signature: str | None = None):
+        body = json.dumps(payload).encode('utf-8')
+        if signature is None:
+            signature = hmac.new(b'webhook-secret', body, hashlib.sha256).hexdigest()
+        return APIClient().post(
+            '/api/v1/payments/webhook/', body, content_type='application/json', HTTP_X_CHAPA_SIGNATURE=signature)
+
+    def receive_all(self):
+        for i in range(3):
+            WebhookEvent.objects.create(webhook_event_id=f'ev{i}', merchant_reference=f'tx{i}', payload={})
+
+    def drain(self):
+        return process_webhook_batch(claim_webhook_events(10))
+
+    def test_webhook_is_stored_once_without_calling_the_gateway(self):
+        for _ in range(2):
+            self.assertEqual(self.post({'tx_ref': 'tx0', 'reference': 'ev0'}).status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(self.chapa.requests, [])
+        self.assertEqual(self.post({'tx_ref': 'tx0', 'reference': 'ev1'}, signature='forged').status_code, 403)
+
+    def test_verified_events_confirm_their_bookings(self):
+        self.receive_all()
+        self.assertEqual(self.drain(), {'processed': 3})
+        self.assertEqual(
+            set(Booking.objects.values_list('status', flat=True)), {Booking.BookingStatus.CONFIRMED})
+        self.assertEqual(
+            set(Payment.objects.values_list('payment_status', flat=True)), {Payment.PaymentStatus.SUCCESS})
+
+    def test_failed_verification_backs_off(self):
+        self.receive_all()
+        self.chapa.httpd.fail_rate = 1.0
+        self.assertEqual(self.drain(), {'received': 3})
+        for event in WebhookEvent.objects.all():
+            self.assertEqual((event.status, event.attempts), (WebhookEvent.EventStatus.RECEIVED, 1))
+            self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(claim_webhook_events(10), [])
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=1)
+    def test_last_attempt_fails_the_event(self):
+        self.receive_all()
+        self.chapa.httpd.fail_rate = 1.0
+        self.assertEqual(self.drain(), {'failed': 3})
+
+    def test_open_breaker_does_not_use_an_attempt(self):
+        self.receive_all()
+        with mock.patch.object(gateway.CircuitBreaker, 'before_call', side_effect=gateway.GatewayUnavailable('open')):
+            self.assertEqual(self.drain(), {'received': 3})
+        self.assertEqual(set(WebhookEvent.objects.values_list('attempts', flat=True)), {0})
+        self.assertEqual(self.chapa.requests, [])
+
+    def test_drain_stops_while_breaker_is_open(self):
+        self.receive_all()
+        with mock.patch.object(tasks, 'circuit_open', return_value=True):
+            self.assertEqual(tasks.process_webhook_events(), {})
+        self.assertEqual(set(WebhookEvent.objects.values_list('attempts', flat=True)), {0})
+
+
+class MetricsTests(TestCase):
+    """
+    /metrics is closed unless a scraper sends METRICS_TOKEN (or DEBUG is
+    on), and counts every request by view and action.
+    """
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_under_debug_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-token', DEBUG=True)
+    def test_token_is_required_once_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_requests_are_counted_by_view_and_action(self):
+        def listed() -> int:
+            body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+            prefix = 'http_requests_total{view="ListingViewSet",action="list",method="GET",status="200"} '
+            return next((int(line[len(prefix):]) for line in body.splitlines() if line.startswith(prefix)), 0)
+
+        before = listed()
+        response = self.client.get('/api/v1/listings/', HTTP_X_REQUEST_ID='trace-1')
+        self.assertEqual(response['X-Request-ID'], 'trace-1')
+        self.assertEqual(listed(), before + 1)
+        self.assertRegex(self.client.get('/api/v1/listings/', HTTP_X_REQUEST_ID='bad id!')['X-Request-ID'],
+                         r'^[0-9a-f]{32}$')
+
+
+@override_settings(PAYMENT_INITIATION_MODE='sync')
+class AsyncPaymentViewTests(TestCase):
+    """
+    The async payment views answer errors as the BookingViewSet actions do.
+    """
+
+    def setUp(self):
+        self.listing = make_listing()
+        self.customer = User.objects.create_user(username='guest', email='guest@example.com')
+        self.booking = make_booking(self.listing, self.customer, START, nights=3)
+
+    def post(self, view, **headers):
+        request = RequestFactory().post('/', **headers)
+        return async_to_sync(view)(request, pk=self.booking.pk)
+
+    def bearer(self) -> dict[str, str]:
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.customer)}'}
+
+    def test_conflict(self):
+        taken = make_booking(self.listing, self.customer, START + timedelta(days=1))
+        taken.status = Booking.BookingStatus.CONFIRMED
+        taken.save()
+        Payment.objects.create(
+            booking_reference=self.booking, amount=1, merchant_reference='tx-conflict',
+            payment_status=Payment.PaymentStatus.SUCCESS)
+
+        response = self.post(async_views.initiate_payment, **self.bearer())
+
+        self.assertEqual(response.status_code, 409)
+        self.assertJSONEqual(response.content, {
+            'error': 'Listing already booked for selected dates', 'status_code': 409})
+
+    def test_missing_credentials(self):
+        response = self.post(async_views.verify_payment)
+        self.assertEqual(response.status_code, 401)
+        self.assertJSONEqual(response.content, {'error': 'Log in to proceed', 'status_code': 401})
+
+    def test_session_without_csrf_token_is_forbidden(self):
+        request = RequestFactory().post('/')
+        request.user = self.customer
+        response = async_to_sync(async_views.verify_payment)(request, pk=self.booking.pk)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', json.loads(response.content)['error'])
+
+    def test_gateway_answer_without_json(self):
+        client = gateway.AsyncChapaClient(
+            api_key='test-key', initialize_url='http://chapa.test/initialize', verify_url='http://chapa.test/verify',
+            connect_timeout=1, read_timeout=1, max_connections=1,
+            breaker=gateway.CircuitBreaker(5, 30), metrics=gateway.GatewayMetrics())
+        client.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, text='<html>Maintenance</html>')))
+
+        with mock.patch.object(async_views, 'get_async_client', return_value=client):
+            response = self.post(async_views.initiate_payment, **self.bearer())
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(client.breaker.failures, 1)
+        self.assertFalse(Payment.objects.exists())
+
+
+class ConfirmBookingsTests(TestCase):
+    """
+    confirm_bookings() confirms a batch against the rows as they are once
+    the listings are locked, not as the caller loaded them.
+    """
+
+    def setUp(self):
+        self.listing = make_listing()
+        self.customer = User.objects.create_user(username='guest')
+        self.first = make_booking(self.listing, self.customer, START, nights=3)
+        self.second = make_booking(self.listing, self.customer, START + timedelta(days=1))
+
+    def test_confirms_one_of_overlapping_stays(self):
+        confirmed, conflicting = confirm_bookings([self.first, self.second])
+        self.assertEqual((confirmed, conflicting), ([self.first], [self.second]))
+        self.assertEqual(
+            list(Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED)), [self.first])
+        self.assertEqual(booked_nights(self.listing), stay(START, 3))
+
+    def test_booking_cancelled_since_loaded_stays_cancelled(self):
+        Booking.objects.filter(pk=self.first.pk).update(status=Booking.BookingStatus.CANCELLED)
+        self.assertEqual(confirm_bookings([self.first]), ([], []))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, Booking.BookingStatus.CANCELLED)
+        self.assertEqual(booked_nights(self.listing), set())
+        self.assertFalse(StatsDirtyRange.objects.filter(listing=self.listing, start_date=START).exists())
+
+    def test_booking_moved_since_loaded_is_confirmed_on_its_new_dates(self):
+        moved = START + timedelta(days=10)
+        Booking.objects.filter(pk=self.second.pk).update(start_date=moved, end_date=moved + timedelta(days=2))
+        confirmed, conflicting = confirm_bookings([self.first, self.second])
+        self.assertEqual((len(confirmed), conflicting), (2, []))
+        self.assertEqual(self.second.start_date, moved)
+        self.assertEqual(booked_nights(self.listing), stay(START, 3) | stay(moved, 2))
+
+
+class ReconciliationTests(FakeGatewayTestCase):
+    """
+    Stale PROCESSING payments are verified against the gateway and
+    settled, one run at a time.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.listing = make_listing()
+        customer = User.objects.create_user(username='guest')
+        self.bookings = [make_booking(self.listing, customer, START + timedelta(days=3 * i)) for i in range(3)]
+        for i, booking in enumerate(self.bookings):
+            Payment.objects.create(
+                booking_reference=booking, amount=1, merchant_reference=f'tx-stale-{i}',
+                payment_status=Payment.PaymentStatus.PROCESSING)
+        Payment.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_paid_payments_confirm_their_bookings(self):
+        self.assertEqual(reconciliation.reconcile_payments(), {'paid': 3, 'conflict': 0, 'expired': 0, 'unpaid': 0})
+        self.assertEqual(
+            set(Booking.objects.values_list('status', flat=True)), {Booking.BookingStatus.CONFIRMED})
+        self.assertEqual(len(self.chapa.requests), 3)
+
+    def test_booking_cancelled_during_the_run_is_not_confirmed(self):
+        cancelled = self.bookings[0]
+        settle = reconciliation.settle_payments
+
+        def cancel_then_settle(paid):
+            # the customer cancels after the run read the payments
+            Booking.objects.filter(pk=cancelled.pk).update(status=Booking.BookingStatus.CANCELLED)
+            return settle(paid)
+
+        with mock.patch.object(reconciliation, 'settle_payments', cancel_then_settle):
+            reconciliation.reconcile_payments()
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, Booking.BookingStatus.CANCELLED)
+        self.assertEqual(booked_nights(self.listing), stay(START + timedelta(days=3), 2) | stay(START + timedelta(days=6), 2))
+
+    def test_held_lock_skips_the_run(self):
+        # taken through the cache alias, as another worker would
+        caches['shared'].add(tasks.RECONCILE_LOCK_KEY, True, 60)
+        self.assertEqual(tasks.reconcile_stale_payments(), {})
+        self.assertEqual(self.chapa.requests, [])
+        caches['shared'].delete(tasks.RECONCILE_LOCK_KEY)
+        self.assertEqual(tasks.reconcile_stale_payments()['paid'], 3)
+
+
+class IdempotencyTests(TestCase):
+    """
+    A retried request is answered once, from a cache every worker shares.
+    """
+
+    def request(self):
+        return RequestFactory().post(
+            '/api/v1/bookings/', b'{}', content_type='application/json',
+            HTTP_AUTHORIZATION='Token abc', HTTP_IDEMPOTENCY_KEY='key-1')
+
+    def test_keys_live_in_a_shared_cache(self):
+        self.assertNotEqual(
+            caches['shared'].__class__.__module__, 'django.core.cache.backends.locmem')
+
+    def test_retry_while_running_gets_409(self):
+        inner = []
+
+        def view():
+            inner.append(run_once(self.request(), lambda: HttpResponse(status=201)))
+            return HttpResponse(status=201)
+
+        self.assertEqual(run_once(self.request(), view).status_code, 201)
+        self.assertEqual(inner[0].status_code, 409)
+
+    def test_retry_after_answer_is_replayed(self):
+        view = mock.Mock(return_value=HttpResponse(b'done', status=201))
+        run_once(self.request(), view)
+        replay = run_once(self.request(), view)
+        self.assertEqual(view.call_count, 1)
+        self.assertEqual((replay.status_code, replay.content, replay['Idempotent-Replayed']), (201, b'done', 'true'))
+
+    def test_failed_request_can_be_retried(self):
+        with self.assertRaises(RuntimeError):
+            run_once(self.request(), mock.Mock(side_effect=RuntimeError))
+        self.assertEqual(run_once(self.request(), lambda: HttpResponse(status=201)).status_code, 201)
+
+    def test_retried_booking_is_created_once(self):
+        listing = make_listing()
+        customer = User.objects.create_user(username='guest')
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(customer)}')
+        body = {
+            'listing': f'http://testserver/api/v1/listings/{listing.pk}/',
+            'start_date': START, 'end_date': START + timedelta(days=2)}
+        first = client.post('/api/v1/bookings/', body, format='json', HTTP_IDEMPOTENCY_KEY='stay-1')
+        retry = client.post('/api/v1/bookings/', body, format='json', HTTP_IDEMPOTENCY_KEY='stay-1')
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertEqual(Booking.objects.filter(customer=customer).count(), 1)
+
+
+class FailingEmailBackend(EmailBackend):
+    """
+    Refuses the message to refused@example.com, and drops the connection
+    for good on the message to down@example.com.
+    """
+    down = False
+
+    def open(self):
+        if FailingEmailBackend.down:
+            raise ConnectionRefusedError('mail server down')
+        return super().open()
+
+    def send_messages(self, messages):
+        recipients = {address for message in messages for address in message.to}
+        if 'refused@example.com' in recipients:
+            raise smtplib.SMTPRecipientsRefused({'refused@example.com': (550, b'no such user')})
+        if 'down@example.com' in recipients:
+            FailingEmailBackend.down = True
+            raise smtplib.SMTPServerDisconnected('connection lost')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='listings.tests.FailingEmailBackend', EMAIL_BATCH_SIZE=10,
+    EMAIL_RATE_LIMIT=1000.0, EMAIL_RATE_BURST=1000)
+class EmailRetryTests(TestCase):
+    """
+    Failed sends back off, and a lost mail server ends the flush.
+    """
+
+    def setUp(self):
+        FailingEmailBackend.down = False
+        self.listing = make_listing()
+
+    def queue(self, *addresses):
+        bookings = []
+        for i, address in enumerate(addresses):
+            customer = User.objects.create_user(username=f'guest{i}', email=address)
+            bookings.append(make_booking(self.listing, customer, START + timedelta(days=3 * i)))
+        OutboundEmail.objects.all().delete()
+        queue_confirmation_emails(bookings)
+
+    def statuses(self):
+        return dict(OutboundEmail.objects.values_list('booking__customer__email', 'status'))
+
+    def test_refused_message_backs_off_and_the_rest_are_sent(self):
+        self.queue('a@example.com', 'refused@example.com', 'b@example.com')
+        totals = flush_outbox()
+        self.assertEqual((totals['sent'], totals['retry']), (2, 1))
+        refused = OutboundEmail.objects.get(booking__customer__email='refused@example.com')
+        self.assertEqual((refused.status, refused.attempts), (OutboundEmail.EmailStatus.QUEUED, 1))
+        self.assertGreater(refused.next_attempt_at, timezone.now())
+        self.assertEqual(flush_outbox(), {})
+
+    def test_lost_server_stops_the_flush(self):
+        self.queue('down@example.com', 'a@example.com', 'b@example.com')
+        totals = flush_outbox()
+        self.assertEqual((totals['sent'], totals['retry'], totals['unsent'], totals['connection_failed']), (0, 1, 2, 1))
+        self.assertEqual(set(self.statuses().values()), {OutboundEmail.EmailStatus.QUEUED})
+        self.assertEqual(
+            dict(OutboundEmail.objects.values_list('booking__customer__email', 'attempts')),
+            {'down@example.com': 1, 'a@example.com': 0, 'b@example.com': 0})
+        self.assertEqual(flush_outbox(), {'connection_failed': 1})
+
+
+class TaskPayloadTests(TestCase):
+    """
+    Task payloads carry a versioned id through the broker and load the row
+    on the worker.
+    """
+
+    def test_payload_survives_the_broker(self):
+        pk = make_listing().pk
+        content_type, encoding, body = dumps(pack_id(pk), serializer='msgpack')
+        self.assertEqual(unpack_id(loads(body, content_type, encoding, accept=[content_type])), pk)
+        self.assertEqual(unpack_id(str(pk)), pk)
+        with self.assertRaises(ValueError):
+            unpack_id([2, pk.bytes])
+
+    def test_confirmation_email_is_sent_for_the_payload(self):
+        customer = User.objects.create_user(username='guest', email='guest@example.com')
+        booking = make_booking(make_listing(), customer, START)
+        mail.outbox.clear()
+        tasks.send_booking_confirmation_email.apply(args=(pack_id(booking.pk),)).get()
+        self.assertEqual([message.to for message in mail.outbox], [['guest@example.com']])
+
+    def test_keyword_fields_are_refused(self):
+        with self.assertRaises(TypeError):
+            tasks.send_booking_confirmation_email.apply(kwargs={'booking_id': str(START)}).get()
+
+
+class SearchTests(TestCase):
+    """
+    ?q= finds listings with every word in their name or description, most
+    relevant first, through the index the database keeps current.
+    """
+
+    def setUp(self):
+        host = User.objects.create_user(username='host')
+        self.beach = Listing.objects.create(
+            host=host, name='Beach house', description='Quiet rooms by the sea', price_per_night=100)
+        self.city = Listing.objects.create(
+            host=host, name='City flat', description='Walk to the beach market', price_per_night=80)
+        self.cabin = Listing.objects.create(
+            host=host, name='Forest cabin', description='Wood stove', price_per_night=60)
+
+    def search(self, text: str, **params) -> list[str]:
+        response = APIClient().get('/api/v1/listings/', {'q': text, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [listing['name'] for listing in response.json()['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('beach'), ['Beach house', 'City flat'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('beach market'), ['City flat'])
+        self.assertEqual(self.search('beach stove'), [])
+
+    def test_operators_are_plain_words(self):
+        self.assertEqual(self.search('"forest" -cabin*'), ['Forest cabin'])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_ordering_overrides_relevance(self):
+        self.assertEqual(self.search('beach', ordering='price_per_night'), ['City flat', 'Beach house'])
+
+    def test_index_follows_writes(self):
+        self.cabin.name = 'Beach cabin'
+        self.cabin.save()
+        self.beach.delete()
+        self.assertEqual(set(self.search('beach')), {'Beach cabin', 'City flat'})
+
+    def test_rebuild_repoints_renumbered_rows(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('the FTS5 index is SQLite only')
+        with connection.cursor() as cursor:
+            # as a VACUUM may, behind the triggers' back
+            cursor.execute('UPDATE listings_listing SET rowid = rowid + 1000')
+        self.assertEqual(list(Listing.objects.search('forest')), [])
+        rebuild_sqlite_index(connection)
+        self.assertEqual(list(Listing.objects.search('forest')), [self.cabin])
+
+
+class VacuumTests(TransactionTestCase):
+    """
+    Vacuuming leaves the search index pointing at the right listings.
+    """
+
+    def test_search_still_finds_listings(self):
+        listing = make_listing()
+        call_command('vacuum_database', stdout=io.StringIO())
+        self.assertEqual(list(Listing.objects.search('test listing')), [listing])
+
+
+class RollupTests(TestCase):
+    """
+    The nightly rollup follows confirmed stays, and the host report reads it.
+    """
+
+    def setUp(self):
+        self.listing = make_listing(price=100)
+        self.customer = User.objects.create_user(username='guest')
+        self.booking = make_booking(self.listing, self.customer, START, nights=3)
+
+    def confirm(self, booking):
+        booking.status = Booking.BookingStatus.CONFIRMED
+        booking.save()
+
+    def test_confirmed_stay_is_rolled_up(self):
+        self.confirm(self.booking)
+        rollup_stats()
+        nights = ListingDailyStats.objects.filter(listing=self.listing).order_by('day')
+        self.assertEqual([night.day for night in nights], [START + timedelta(days=i) for i in range(3)])
+        self.assertEqual(sum(night.revenue for night in nights), self.booking.total_price)
+
+    def test_cancelled_stay_is_cleared(self):
+        self.confirm(self.booking)
+        rollup_stats()
+        self.booking.status = Booking.BookingStatus.CANCELLED
+        self.booking.save()
+        rollup_stats()
+        self.assertFalse(ListingDailyStats.objects.filter(listing=self.listing).exists())
+
+    def test_rollup_only_rewrites_changed_nights(self):
+        self.confirm(self.booking)
+        rollup_stats()
+        self.assertEqual(rollup_stats(), {})
+
+    def test_host_report_ignores_list_filters(self):
+        self.confirm(self.booking)
+        rollup_stats()
+        client = APIClient()
+        client.force_authenticate(self.listing.host)
+        window = {'start': START, 'end': START + timedelta(days=31), 'period': 'month'}
+        for params in ({}, {'q': 'Test'}, {'ordering': 'rating_avg'}):
+            with self.subTest(params):
+                response = client.get('/api/v1/listings/stats/', {**window, **params})
+                self.assertEqual(response.status_code, 200, response.content)
+                totals = response.json()['results'][0]['totals']
+                self.assertEqual(totals['nights_booked'], 3)
+
+    def test_held_lock_skips_the_run(self):
+        self.confirm(self.booking)
+        # taken through the cache alias, as another worker would
+        caches['shared'].add(tasks.ROLLUP_LOCK_KEY, True, 60)
+        self.assertEqual(tasks.rollup_listing_stats(), {})
+        self.assertFalse(ListingDailyStats.objects.exists())
+        caches['shared'].delete(tasks.ROLLUP_LOCK_KEY)
+        tasks.rollup_listing_stats()
+        self.assertEqual(ListingDailyStats.objects.filter(listing=self.listing).count(), 3)
+
+
+class BookingImportExportTests(TestCase):
+    """
+    Imports answer every row on its own; exports stream rows an import
+    reads back.
+    """
+
+    def setUp(self):
+        self.listing = make_listing()
+        self.customer = User.objects.create_user(username='guest')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        taken = make_booking(self.listing, User.objects.create_user(username='other'), START)
+        taken.status = Booking.BookingStatus.CONFIRMED
+        taken.save()
+
+    def row(self, start: date, nights: int = 2, listing=None) -> dict[str, str]:
+        return {'listing': str(listing or self.listing.pk), 'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=nights)).isoformat()}
+
+    def upload(self, body: str, content_type: str) -> dict:
+        response = self.client.post('/api/v1/bookings/import/', body, content_type=content_type)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def export(self, fmt: str) -> str:
+        response = self.client.get('/api/v1/bookings/export/', {'type': fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_rows_get_their_own_results(self):
+        rows = [
+            self.row(START + timedelta(days=10)),
+            self.row(START + timedelta(days=1)),
+            self.row(START + timedelta(days=11)),
+            self.row(START + timedelta(days=20), nights=0),
+            self.row(START + timedelta(days=20), listing='00000000-0000-0000-0000-000000000000'),
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n\n{broken\n'
+        result = self.upload(body, NDJSON)
+        self.assertEqual((result['created'], result['rejected']), (1, 5))
+        self.assertEqual([(r['row'], r['status']) for r in result['results']], [
+            (1, 'created'), (2, 'rejected'), (3, 'rejected'), (4, 'rejected'), (5, 'rejected'), (7, 'rejected')])
+        self.assertEqual(result['results'][1]['errors'], {'non_field_errors': ['Listing already booked for selected dates']})
+        self.assertIn('listing', result['results'][4]['errors'])
+        booking = Booking.objects.get(customer=self.customer)
+        self.assertEqual((str(booking.pk), booking.status, booking.total_price),
+                         (result['results'][0]['booking'], Booking.BookingStatus.PENDING, 20000))
+
+    def test_csv_rows_count_the_header(self):
+        body = 'listing,start_date,end_date\n' + '\n'.join(
+            ','.join(self.row(START + timedelta(days=d)).values()) for d in (10, 20)) + '\n'
+        result = self.upload(body, CSV)
+        self.assertEqual([(r['row'], r['status']) for r in result['results']], [(2, 'created'), (3, 'created')])
+        self.assertEqual(Booking.objects.filter(customer=self.customer).count(), 2)
+
+    def test_oversized_upload_is_refused_whole(self):
+        body = '\n'.join(json.dumps(self.row(START + timedelta(days=3 * i))) for i in range(3))
+        with override_settings(BOOKING_IMPORT_MAX_ROWS=2):
+            response = self.client.post('/api/v1/bookings/import/', body, content_type=NDJSON)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.filter(customer=self.customer).exists())
+
+    def test_export_round_trips_through_import(self):
+        for d in (10, 20, 30):
+            make_booking(self.listing, self.customer, START + timedelta(days=d))
+        stays = set(Booking.objects.filter(customer=self.customer).values_list('listing', 'start_date', 'end_date'))
+        for fmt, content_type in (('ndjson', NDJSON), ('csv', CSV)):
+            with self.subTest(fmt):
+                exported = self.export(fmt)
+                Booking.objects.filter(customer=self.customer).delete()
+                self.assertEqual(self.upload(exported, content_type)['created'], 3)
+                self.assertEqual(set(Booking.objects.filter(customer=self.customer).values_list(
+                    'listing', 'start_date', 'end_date')), stays)
+
+    def test_export_holds_only_the_users_bookings(self):
+        make_booking(self.listing, self.customer, START + timedelta(days=10))
+        lines = self.export('ndjson').splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['start_date'], (START + timedelta(days=10)).isoformat())
+        self.assertEqual(self.client.get('/api/v1/bookings/export/', {'type': 'xml'}).status_code, 400)
+
+
+class CalendarTests(TestCase):
+    """
+    Saving a booking keeps its listing's calendar and the rollup's dirty
+    ranges in step with the row as stored, not as the instance last saw it.
+    """
+
+    def setUp(self):
+        self.listing = make_listing()
+        self.booking = make_booking(self.listing, User.objects.create_user(username='guest'), START, nights=3)
+
+    def save_status(self, booking: Booking, status: str) -> None:
+        booking.status = status
+        booking.save()
+
+    def test_confirm_books_the_nights_and_cancel_frees_them(self):
+        self.save_status(self.booking, Booking.BookingStatus.CONFIRMED)
+        self.assertEqual(booked_nights(self.listing), stay(START, 3))
+        self.save_status(self.booking, Booking.BookingStatus.CANCELLED)
+        self.assertEqual(booked_nights(self.listing), set())
+        self.assertEqual(StatsDirtyRange.objects.filter(listing=self.listing).count(), 2)
+
+    def test_stale_instance_frees_the_stored_stay(self):
+        stale = Booking.objects.get(pk=self.booking.pk)
+        self.save_status(self.booking, Booking.BookingStatus.CONFIRMED)
+        # loaded while pending; the row has been confirmed since
+        self.save_status(stale, Booking.BookingStatus.CANCELLED)
+        self.assertEqual(booked_nights(self.listing), set())
+        self.assertEqual(
+            list(StatsDirtyRange.objects.values_list('start_date', 'end_date')),
+            [(START, START + timedelta(days=3))] * 2)
+
+    def test_stale_instance_moving_dates_frees_the_old_nights(self):
+        stale = Booking.objects.get(pk=self.booking.pk)
+        self.save_status(self.booking, Booking.BookingStatus.CONFIRMED)
+        stale.status = Booking.BookingStatus.CONFIRMED
+        stale.start_date, stale.end_date = START + timedelta(days=10), START + timedelta(days=12)
+        stale.save()
+        self.assertEqual(booked_nights(self.listing), stay(START + timedelta(days=10), 2))
+
+    def test_bulk_load_builds_calendars_and_marks_stays(self):
+        for _ in bulk_load(Dataset(users=10, start_date=START)):
+            pass
+        expected = {}
+        for booking in Booking.objects.filter(status=Booking.BookingStatus.CONFIRMED):
+            nights = stay(booking.start_date, (booking.end_date - booking.start_date).days)
+            expected.setdefault(booking.listing_id, set()).update(nights)
+        self.assertEqual(len(expected), 3)
+        for listing in Listing.objects.exclude(pk=self.listing.pk):
+            self.assertEqual(booked_nights(listing), expected.get(listing.pk, set()))
+        self.assertEqual(set(StatsDirtyRange.objects.values_list('listing', flat=True)), set(expected))
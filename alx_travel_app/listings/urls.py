@@ -11,7 +11,9 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
-from listings import views
+from django.conf import settings
+
+from listings import views, async_views
 
 router = routers.DefaultRouter()
 router.register(r'users', views.UserViewSet)
@@ -34,4 +36,12 @@ urlpatterns = [
     path(
         "schema/redoc/",
         SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
-]
\ No newline at end of file
+]
+
+if settings.SERVER_MODE == 'asgi':
+    # ahead of the router so these paths reach the async views
+    urlpatterns = [
+        path('bookings/<uuid:pk>/initiate_payment/', async_views.initiate_payment),
+        path('bookings/<uuid:pk>/verify_payment/', async_views.verify_payment),
+        path('payments/webhook/', async_views.chapa_webhook),
+    ] + urlpatterns
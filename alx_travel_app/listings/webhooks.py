@@ -0,0 +1,186 @@
+"""
+Webhook ingestion.
+
+The webhook view only records the event (deduplicated on its reference)
+and returns. Workers then claim received events in batches, verify each
+distinct tx_ref once against the gateway, concurrently, and apply the
+resulting payment and booking transitions in bulk.
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from listings.availability import confirm_bookings
+from listings.gateway import GatewayUnavailable, get_client, retry_delay
+from listings.models import Booking, Payment, WebhookEvent
+from utils.logger import logger
+
+Status = WebhookEvent.EventStatus
+
+
+def record_webhook_event(event_reference: str, tx_ref: str, payload: dict[str, Any]) -> None:
+    """
+    Stores a webhook with a single INSERT that ignores redelivered references.
+    """
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(webhook_event_id=event_reference, merchant_reference=tx_ref, payload=payload)],
+        ignore_conflicts=True
+    )
+
+
+async def arecord_webhook_event(event_reference: str, tx_ref: str, payload: dict[str, Any]) -> None:
+    """
+    record_webhook_event for async views.
+    """
+    await WebhookEvent.objects.abulk_create(
+        [WebhookEvent(webhook_event_id=event_reference, merchant_reference=tx_ref, payload=payload)],
+        ignore_conflicts=True
+    )
+
+
+def settle_payments(paid: list[Payment]) -> list[Booking]:
+    """
+    Saves payments the gateway verified as paid (status and, for webhooks,
+    webhook_event_id already set on the instances) and confirms their
+    pending bookings, in one transaction. Returns the bookings that could
+    not be confirmed because their dates were taken in the meantime.
+    """
+    now = timezone.now()
+    for payment in paid:
+        payment.updated_at = now
+    with transaction.atomic():
+        Payment.objects.bulk_update(paid, ['payment_status', 'webhook_event_id', 'updated_at'])
+        _, conflicting = confirm_bookings([
+            payment.booking_reference for payment in paid
+            if payment.booking_reference.status == Booking.BookingStatus.PENDING
+        ])
+    for booking in conflicting:
+        logger.error(f"Paid booking {booking.pk} overlaps a confirmed stay and was not confirmed")
+    return conflicting
+
+
+def release_stale_claims() -> int:
+    """
+    Puts back events claimed by a worker that died mid-batch.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.WEBHOOK_CLAIM_TIMEOUT)
+    return WebhookEvent.objects.filter(
+        status=Status.PROCESSING, claimed_at__lt=cutoff
+    ).update(status=Status.RECEIVED)
+
+
+def claim_webhook_events(limit: int, due_by: datetime | None = None) -> list[WebhookEvent]:
+    """
+    Marks up to `limit` received events due by `due_by` (now by default)
+    as processing for this worker. A drain passes the time it started, so
+    events it put back for a retry are not claimed again in the same run.
+    Rows locked by another worker are skipped rather than waited on.
+    """
+    with transaction.atomic():
+        ids = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=Status.RECEIVED, next_attempt_at__lte=due_by or timezone.now())
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        WebhookEvent.objects.filter(pk__in=ids).update(
+            status=Status.PROCESSING, claimed_at=timezone.now(), attempts=F('attempts') + 1)
+    return list(WebhookEvent.objects.filter(pk__in=ids))
+
+
+def _verify(tx_ref: str) -> dict[str, Any] | Exception:
+    try:
+        return get_client().verify(tx_ref)
+    except Exception as err:
+        return err
+
+
+def process_webhook_batch(events: list[WebhookEvent]) -> dict[str, int]:
+    """
+    Verifies and applies a claimed batch of events. Returns a count of
+    events per resulting status. Events whose verification failed go back
+    to RECEIVED after an exponential backoff, and FAILED once they have
+    used WEBHOOK_MAX_ATTEMPTS; while the breaker is open no call is made,
+    so those events wait for it without using an attempt.
+    """
+    payments = {
+        payment.merchant_reference: payment
+        for payment in Payment.objects.select_related('booking_reference').filter(
+            merchant_reference__in={event.merchant_reference for event in events})
+    }
+
+    outcome: dict[Any, tuple[str, str | None]] = {}
+    # retried events: pk -> (when to try again, whether the try counted)
+    retries: dict[Any, tuple[datetime, bool]] = {}
+    pending: dict[str, list[WebhookEvent]] = defaultdict(list)
+    for event in events:
+        payment = payments.get(event.merchant_reference)
+        if payment is None:
+            outcome[event.pk] = (Status.IGNORED, "no matching payment")
+        elif payment.payment_status == Payment.PaymentStatus.SUCCESS:
+            outcome[event.pk] = (Status.IGNORED, "already confirmed")
+        else:
+            pending[event.merchant_reference].append(event)
+
+    with ThreadPoolExecutor(max_workers=settings.WEBHOOK_VERIFY_CONCURRENCY) as pool:
+        verified = dict(zip(pending, pool.map(_verify, pending)))
+    now = timezone.now()
+
+    paid = []
+    for tx_ref, tx_events in pending.items():
+        result = verified[tx_ref]
+        if isinstance(result, GatewayUnavailable):
+            for event in tx_events:
+                outcome[event.pk] = (Status.RECEIVED, str(result))
+                retries[event.pk] = (now + timedelta(seconds=settings.PAYMENT_BREAKER_RESET_SECONDS), False)
+            continue
+        if isinstance(result, Exception):
+            for event in tx_events:
+                retry = event.attempts < settings.WEBHOOK_MAX_ATTEMPTS
+                outcome[event.pk] = (Status.RECEIVED if retry else Status.FAILED, str(result))
+                if retry:
+                    retries[event.pk] = (now + retry_delay(
+                        event.attempts, settings.WEBHOOK_RETRY_DELAY, settings.WEBHOOK_RETRY_MAX_DELAY), True)
+            continue
+        if result.get('status') != 'success':
+            for event in tx_events:
+                outcome[event.pk] = (Status.PROCESSED, f"verification returned {result.get('status')}")
+            continue
+
+        payment = payments[tx_ref]
+        payment.payment_status = Payment.PaymentStatus.SUCCESS
+        payment.webhook_event_id = tx_events[-1].webhook_event_id
+        paid.append(payment)
+        for event in tx_events:
+            outcome[event.pk] = (Status.PROCESSED, None)
+
+    conflicting = settle_payments(paid)
+
+    tx_ref_of = {payment.booking_reference_id: payment.merchant_reference for payment in paid}
+    for booking in conflicting:
+        for event in pending[tx_ref_of[booking.pk]]:
+            outcome[event.pk] = (Status.PROCESSED, "paid but dates no longer available")
+
+    grouped: dict[tuple, list[Any]] = defaultdict(list)
+    for event_pk, (status, error) in outcome.items():
+        grouped[status, error, *retries.get(event_pk, (None, True))].append(event_pk)
+    now = timezone.now()
+    for (status, error, next_attempt_at, counted), ids in grouped.items():
+        changes: dict[str, Any] = {
+            'status': status, 'error': error, 'processed_at': None if status == Status.RECEIVED else now}
+        if next_attempt_at is not None:
+            changes['next_attempt_at'] = next_attempt_at
+        if not counted:
+            changes['attempts'] = F('attempts') - 1
+        WebhookEvent.objects.filter(pk__in=ids).update(**changes)
+
+    counts: Counter[str] = Counter()
+    for (status, *_), ids in grouped.items():
+        counts[Status(status).name.lower()] += len(ids)
+    return dict(counts)
@@ -0,0 +1,54 @@
+import contextlib
+import math
+import statistics
+import time
+from typing import Callable, Iterator
+
+from django.db import transaction
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples (pct between 0 and 100).
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    Reduce latency samples (seconds) to the usual report figures in milliseconds.
+    """
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def time_calls(func: Callable[[], object], repeat: int) -> list[float]:
+    """
+    Call func `repeat` times and return the wall-clock duration of each call.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+@contextlib.contextmanager
+def rolled_back() -> Iterator[None]:
+    """
+    Run a benchmark inside a transaction that is always rolled back,
+    so fixture rows never reach the configured database.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
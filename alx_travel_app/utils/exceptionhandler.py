@@ -1,3 +1,4 @@
+from django.http import JsonResponse
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
@@ -14,6 +15,9 @@ def customexceptionhandler(exc, context):
         'NotAuthenticated': _handle_authentication_error,
         'ValueError': _handle_generic_error,
         'IntegrityError': _handle_generic_error,
+        'BookingConflict': _handle_conflict_error,
+        'ParseError': _handle_generic_error,
+        'UnsupportedMediaType': _handle_generic_error,
     }
 
     # Get the standard DRF response
@@ -30,6 +34,18 @@ def customexceptionhandler(exc, context):
     return _handle_unhandled_error(exc, context, response)
 
 
+def error_response(exc):
+    """
+    The response customexceptionhandler gives for `exc`, as a JsonResponse
+    for views that do not run through DRF. Re-raises exceptions it does
+    not map to a response.
+    """
+    response = customexceptionhandler(exc, {})
+    if response is None:
+        raise exc
+    return JsonResponse(response.data, status=response.status_code)
+
+
 def _handle_generic_error(exc, context, response):
     """
     Generic handler for exceptions like ValidationError, Http404, etc.
@@ -42,6 +58,19 @@ def _handle_generic_error(exc, context, response):
     return response
 
 
+def _handle_conflict_error(exc, context, response):
+    """
+    Handler for bookings that clash with an existing confirmed booking.
+    """
+    return Response(
+        {
+            "error": str(exc),
+            "status_code": status.HTTP_409_CONFLICT
+        },
+        status=status.HTTP_409_CONFLICT
+    )
+
+
 def _handle_authentication_error(exc, context, response):
     """
     Handler for authentication-related exceptions.
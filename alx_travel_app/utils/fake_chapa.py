@@ -0,0 +1,167 @@
+"""
+A local stand-in for the Chapa API, for tests, benchmarks and load tests.
+
+It answers the two calls the app makes:
+    POST /v1/transaction/initialize         -> hosted checkout link
+    GET  /v1/transaction/verify/<tx_ref>    -> successful verification
+with optional added latency, a configurable share of 503 answers and a
+configurable share of transactions that are reported as not paid yet.
+Whether a transaction is paid depends only on its tx_ref, so repeated
+verifications agree.
+"""
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+INITIALIZE_PATH = '/v1/transaction/initialize'
+VERIFY_PATH = '/v1/transaction/verify'
+
+
+class FakeChapaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; without this a keep-alive
+    # client waits on delayed ACK for the body
+    disable_nagle_algorithm = True
+    server: "FakeChapaHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, body: dict[str, Any]) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _should_fail(self) -> bool:
+        self.server.record(self.command, self.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        return random.random() < self.server.fail_rate
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self._should_fail():
+            return self._reply(503, {"status": "failed", "message": "Service Unavailable"})
+        if self.path != INITIALIZE_PATH:
+            return self._reply(404, {"status": "failed", "message": "Not Found"})
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._reply(401, {"status": "failed", "message": "Invalid API Key"})
+        tx_ref = payload.get('tx_ref', '')
+        self._reply(200, {
+            "status": "success",
+            "message": "Hosted Link",
+            "data": {"checkout_url": f"{self.server.base_url}/checkout/{tx_ref}"},
+        })
+
+    def do_GET(self) -> None:
+        if self._should_fail():
+            return self._reply(503, {"status": "failed", "message": "Service Unavailable"})
+        if not self.path.startswith(VERIFY_PATH + '/'):
+            return self._reply(404, {"status": "failed", "message": "Not Found"})
+        tx_ref = self.path[len(VERIFY_PATH) + 1:]
+        if zlib.crc32(tx_ref.encode('utf-8')) % 10_000 < self.server.unpaid_rate * 10_000:
+            return self._reply(400, {"status": "failed", "message": "Payment not paid yet", "data": None})
+        self._reply(200, {
+            "status": "success",
+            "message": "Payment details",
+            "data": {"tx_ref": tx_ref, "status": "success"},
+        })
+
+
+class FakeChapaHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # room for load tests that open hundreds of connections at once
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], delay: float, fail_rate: float, unpaid_rate: float) -> None:
+        super().__init__(address, FakeChapaHandler)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.unpaid_rate = unpaid_rate
+        self.requests: list[tuple[str, str]] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        # called once per accepted connection, however many requests it carries
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # a client that hung up on a delayed answer, e.g. at its read timeout
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def record(self, method: str, path: str) -> None:
+        with self._lock:
+            self.requests.append((method, path))
+
+
+class FakeChapaServer:
+    """
+    Runs the fake gateway on a background thread.
+
+        with FakeChapaServer(delay=0.2) as chapa:
+            settings.PAYMENT_API_BASE_URL = chapa.initialize_url
+            settings.PAYMENT_VERIFY_URL = chapa.verify_url
+    """
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        delay: float = 0.0,
+        fail_rate: float = 0.0,
+        unpaid_rate: float = 0.0,
+    ) -> None:
+        self.httpd = FakeChapaHTTPServer((host, port), delay, fail_rate, unpaid_rate)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return self.httpd.base_url
+
+    @property
+    def initialize_url(self) -> str:
+        return self.base_url + INITIALIZE_PATH
+
+    @property
+    def verify_url(self) -> str:
+        return self.base_url + VERIFY_PATH
+
+    @property
+    def requests(self) -> list[tuple[str, str]]:
+        return self.httpd.requests
+
+    @property
+    def connections(self) -> int:
+        return self.httpd.connections
+
+    def start(self) -> "FakeChapaServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeChapaServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
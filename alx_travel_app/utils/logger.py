@@ -1,20 +1,176 @@
+"""
+Application logging.
+
+Calls on `logger` never touch the disk on the calling thread: records are
+put on a bounded in-memory queue and a QueueListener thread writes them
+as JSON lines to a size-rotated logs/app.log. When the queue is full the
+record is dropped and counted rather than making the caller wait; /metrics
+reports the count. Each record carries the id of the request being
+served, and DEBUG records are sampled so chatty loops cannot flood the
+queue.
+
+A RotatingFileHandler must be the file's only writer, or one process
+rotates it under the others. A process forked after this module is
+imported (celery prefork, gunicorn --preload) therefore writes its own
+file, LOG_FILE with the pid before the extension (logs/app.4242.log).
+Processes started separately should each be given their own LOG_FILE.
+
+Settings are read from the environment because this module is imported
+before Django is configured:
+LOG_LEVEL, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE and
+LOG_DEBUG_SAMPLE_RATE (share of DEBUG records kept, 0 to 1).
+"""
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10_000))
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+
+# set per request by utils.middleware.RequestIdMiddleware
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar('request_id', default=None)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps records with the current request id. Runs on the calling
+    thread, where the context variable is still set.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a `rate` share of DEBUG records and every record above DEBUG.
+    """
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Structured fields passed as
+    `extra={"data": {...}}` are merged into the object.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(getattr(record, 'data', None) or {})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueues without waiting; a full queue drops the record and counts it.
+    """
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # resolve the message and traceback here, on the caller's thread,
+        # but keep `data` and the other attributes for the JSON formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-os.makedirs("logs", exist_ok=True)
 
-# Set up logger
 logger = logging.getLogger("seed_logger")
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+_listener: QueueListener | None = None
+_handler: NonBlockingQueueHandler | None = None
+
+
+def _start(path: str) -> None:
+    """
+    Attaches a fresh queue handler and starts its writer thread on `path`.
+    """
+    global _listener, _handler
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    file_handler = RotatingFileHandler(
+        path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+    handler.addFilter(RequestIdFilter())
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    _handler = handler
+    _listener = QueueListener(handler.queue, file_handler)
+    _listener.start()
+
+
+def _restart_in_child() -> None:
+    # a forked worker (celery prefork, gunicorn) inherits the queue but not
+    # the writer thread, so it needs its own, and its own file to rotate
+    global _listener
+    _listener = None
+    root, ext = os.path.splitext(LOG_FILE)
+    _start(f'{root}.{os.getpid()}{ext}')
+
+
+def dropped_records() -> int:
+    """
+    Records this process dropped because the queue was full.
+    """
+    return _handler.dropped if _handler is not None else 0
+
 
-# Create file handler
-file_handler = logging.FileHandler(filename='logs/app.log', mode='a', encoding="utf-8")
-file_handler.setLevel(logging.INFO)
+def stop() -> None:
+    """
+    Flushes queued records and stops the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
-# Set formatter
-formatter = logging.Formatter("{asctime} - {levelname}: {message}", style="{")
-file_handler.setFormatter(formatter)
 
-# Add handler to logger
-if not logger.handlers:
-    logger.addHandler(file_handler)
+_start(LOG_FILE)
+atexit.register(stop)
+os.register_at_fork(after_in_child=_restart_in_child)
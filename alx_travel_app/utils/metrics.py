@@ -0,0 +1,186 @@
+"""
+Per-request instrumentation.
+
+RequestMetricsMiddleware opens a RequestStats for every request; database
+queries (through a connection execute wrapper) and payment gateway calls
+(through ChapaClient) add their timings to whichever request is current.
+Finished requests are folded into a process-local registry that /metrics
+renders in the Prometheus text format. Each worker process keeps its own
+registry, so scrape every worker or put them behind one target each.
+"""
+import contextvars
+import hmac
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from utils.logger import dropped_records
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestStats:
+    """
+    What one request spent its time on.
+    """
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_seconds: float = 0.0
+    slowest_sql: str | None = None
+    slowest_seconds: float = 0.0
+    gateway_calls: int = 0
+    gateway_seconds: float = 0.0
+
+    def add_query(self, sql: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_sql = sql
+            self.slowest_seconds = seconds
+
+    def add_gateway_call(self, seconds: float) -> None:
+        self.gateway_calls += 1
+        self.gateway_seconds += seconds
+
+
+current_request: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    'current_request', default=None)
+
+
+def record_gateway_call(seconds: float) -> None:
+    """
+    Charges an outbound payment gateway call to the current request, if any.
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.add_gateway_call(seconds)
+
+
+def query_timer(execute: Any, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+    """
+    Database execute wrapper that charges each query to the current request.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.add_query(sql, time.perf_counter() - started)
+
+
+class MetricsRegistry:
+    """
+    Request totals per (view, action, method, status) and latency
+    histograms per (view, action), accumulated for the process lifetime.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._requests: dict[tuple[str, str, str, str], int] = {}
+        self._endpoints: dict[tuple[str, str], dict[str, Any]] = {}
+
+    def observe(self, view: str, action: str, method: str, status: int, seconds: float, stats: RequestStats) -> None:
+        with self._lock:
+            key = (view, action, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            endpoint = self._endpoints.setdefault((view, action), {
+                'buckets': [0] * len(LATENCY_BUCKETS),
+                'count': 0,
+                'seconds': 0.0,
+                'queries': 0,
+                'db_seconds': 0.0,
+                'slowest_query_seconds': 0.0,
+                'gateway_seconds': 0.0,
+            })
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    endpoint['buckets'][index] += 1
+            endpoint['count'] += 1
+            endpoint['seconds'] += seconds
+            endpoint['queries'] += stats.queries
+            endpoint['db_seconds'] += stats.db_seconds
+            endpoint['slowest_query_seconds'] = max(endpoint['slowest_query_seconds'], stats.slowest_seconds)
+            endpoint['gateway_seconds'] += stats.gateway_seconds
+
+    def render(self, gateway: dict[str, dict[str, float]], log_dropped: int = 0) -> str:
+        """
+        The registry plus the payment gateway client's counters and the
+        logger's dropped records in the Prometheus text exposition format.
+        """
+        with self._lock:
+            requests = dict(self._requests)
+            endpoints = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._endpoints.items()}
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by view, action, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (view, action, method, status), count in sorted(requests.items()):
+            lines.append(
+                f'http_requests_total{{view="{view}",action="{action}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency, by view and action.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (view, action), endpoint in sorted(endpoints.items()):
+            labels = f'view="{view}",action="{action}"'
+            for bound, count in zip(LATENCY_BUCKETS, endpoint['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {endpoint["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {endpoint["seconds"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {endpoint["count"]}')
+
+        for name, key, kind, help_text in (
+            ('http_request_db_queries_total', 'queries', 'counter', 'SQL queries issued while handling requests.'),
+            ('http_request_db_seconds_total', 'db_seconds', 'counter', 'Time spent in SQL queries.'),
+            ('http_request_db_slowest_query_seconds', 'slowest_query_seconds', 'gauge', 'Slowest single SQL query seen.'),
+            ('http_request_gateway_seconds_total', 'gateway_seconds', 'counter', 'Time spent calling the payment gateway.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (view, action), endpoint in sorted(endpoints.items()):
+                lines.append(f'{name}{{view="{view}",action="{action}"}} {endpoint[key]}')
+
+        for name, key, kind, help_text in (
+            ('payment_gateway_calls_total', 'calls', 'counter', 'Calls made to the payment gateway.'),
+            ('payment_gateway_errors_total', 'errors', 'counter', 'Payment gateway calls that failed.'),
+            ('payment_gateway_seconds_total', 'seconds_total', 'counter', 'Time spent in payment gateway calls.'),
+            ('payment_gateway_seconds_max', 'seconds_max', 'gauge', 'Slowest payment gateway call.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for operation, values in sorted(gateway.items()):
+                lines.append(f'{name}{{operation="{operation}"}} {values[key]}')
+
+        lines += [
+            '# HELP log_records_dropped_total Log records dropped because the log queue was full.',
+            '# TYPE log_records_dropped_total counter',
+            f'log_records_dropped_total {log_dropped}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request: Any) -> Any:
+    """
+    Prometheus scrape endpoint. When METRICS_TOKEN is set the scraper
+    must send it as a bearer token; without one the endpoint is open only
+    under DEBUG.
+    """
+    # imported here: the gateway module reports into this one
+    from listings.gateway import client_metrics
+
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(client_metrics(), dropped_records()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,136 @@
+import re
+import time
+import uuid
+from typing import Any, Callable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from utils.logger import logger, request_id
+from utils.metrics import RequestStats, current_request, query_timer, registry
+
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, so
+    async views are not pushed through a thread by a sync-only layer.
+    Subclasses wrap the call to the next layer with before() and after().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[Any], Any]) -> None:
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def before(self, request: Any) -> Any:
+        raise NotImplementedError
+
+    def after(self, request: Any, response: Any, state: Any) -> None:
+        raise NotImplementedError
+
+    def __call__(self, request: Any) -> Any:
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.before(request)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            self.after(request, response, state)
+        return response
+
+    async def __acall__(self, request: Any) -> Any:
+        state = self.before(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.after(request, response, state)
+        return response
+
+
+class RequestIdMiddleware(HybridMiddleware):
+    """
+    Tags the request with an id, reusing a well-formed X-Request-ID from
+    the proxy, so every log line it produces can be correlated. The id is
+    echoed back in the response.
+    """
+    def before(self, request: Any) -> Any:
+        incoming = request.headers.get('X-Request-ID', '')
+        request.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        return request_id.set(request.request_id)
+
+    def after(self, request: Any, response: Any, state: Any) -> None:
+        request_id.reset(state)
+        if response is not None:
+            response['X-Request-ID'] = request.request_id
+
+
+def endpoint_of(request: Any) -> tuple[str, str]:
+    """
+    (view, action) labels for a request: the DRF view class or function
+    name and the viewset action, or the HTTP method for plain views.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+    view = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    name = view.__name__ if view is not None else match.view_name or match.func.__name__
+    actions = getattr(match.func, 'actions', None) or {}
+    return name, actions.get(request.method.lower(), request.method.lower())
+
+
+def install_query_timer(connection: Any, **kwargs: Any) -> None:
+    """
+    Puts the query timer on a database connection once. Wrapping the
+    connection itself, rather than only for the duration of a request,
+    also covers async ORM calls, which run on another thread's connection.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Times every request, counts and times its SQL queries and payment
+    gateway calls, feeds the /metrics registry and writes one structured
+    log line per request.
+    """
+    def __init__(self, get_response: Callable[[Any], Any]) -> None:
+        super().__init__(get_response)
+        connection_created.connect(install_query_timer, dispatch_uid='request-metrics-query-timer')
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def before(self, request: Any) -> Any:
+        stats = RequestStats()
+        return stats, current_request.set(stats)
+
+    def after(self, request: Any, response: Any, state: Any) -> None:
+        stats, token = state
+        current_request.reset(token)
+        seconds = time.perf_counter() - stats.started
+        status = response.status_code if response is not None else 500
+        view, action = endpoint_of(request)
+        registry.observe(view, action, request.method, status, seconds, stats)
+        logger.info('request', extra={'data': {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'action': action,
+            'status': status,
+            'duration_ms': round(seconds * 1000, 2),
+            'db_queries': stats.queries,
+            'db_ms': round(stats.db_seconds * 1000, 2),
+            'slowest_query_ms': round(stats.slowest_seconds * 1000, 2),
+            'slowest_query': stats.slowest_sql[:500] if stats.slowest_sql else None,
+            'gateway_calls': stats.gateway_calls,
+            'gateway_ms': round(stats.gateway_seconds * 1000, 2),
+        }})
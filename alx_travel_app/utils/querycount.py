@@ -0,0 +1,32 @@
+from typing import Any, Iterable
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+def list_query_counts(client: Any, url: str, page_sizes: Iterable[int], using: str = 'default') -> dict[int, int]:
+    """
+    Requests `url` once per page size and returns the number of SQL
+    queries each request issued, keyed by page size. An uncounted first
+    request takes one-off work, e.g. creating cache generation keys, out
+    of the counts.
+    """
+    client.get(url)
+    counts = {}
+    for page_size in page_sizes:
+        with CaptureQueriesContext(connections[using]) as captured:
+            response = client.get(url, {'page_size': page_size})
+        if response.status_code != 200:
+            raise AssertionError(f"GET {url} returned {response.status_code}")
+        counts[page_size] = len(captured)
+    return counts
+
+
+def assert_constant_queries(client: Any, url: str, page_sizes: Iterable[int] = (1, 5, 25), using: str = 'default') -> dict[int, int]:
+    """
+    Fails when a list endpoint's query count changes with the page size,
+    which is the signature of an N+1 in its serializer.
+    """
+    counts = list_query_counts(client, url, page_sizes, using)
+    if len(set(counts.values())) != 1:
+        raise AssertionError(f"GET {url} query count varies with page size: {counts}")
+    return counts
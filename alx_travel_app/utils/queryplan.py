@@ -0,0 +1,97 @@
+import re
+from typing import Any
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+# plan lines that read a table, with the kind of read and what follows it
+SCANS = {
+    'sqlite': r'\b(?P<kind>SCAN|SEARCH) {table}(?!\S)(?P<rest>.*)',
+    'postgresql': r'\b(?P<kind>Seq Scan|Index Scan|Index Only Scan|Bitmap Heap Scan)\b.* on {table}\b(?P<rest>.*)',
+}
+INDEXES = {
+    'sqlite': r'\bUSING (?:COVERING )?INDEX (\w+)',
+    'postgresql': r'\b(?:Index Scan using|Index Only Scan using|Bitmap Index Scan on) (\w+)',
+}
+
+
+def list_page_queryset(viewset_class: Any, params: dict[str, Any], user: Any = None) -> Any:
+    """
+    The queryset a viewset's list action pages through for `params`:
+    filtered by its filter backends, ordered and sliced as its paginator
+    does, but not run.
+    """
+    request = Request(APIRequestFactory().get('/', params))
+    if user is not None:
+        request.user = user
+    view = viewset_class(request=request, action='list', format_kwarg=None, args=(), kwargs={})
+    queryset = view.filter_queryset(view.get_queryset())
+    ordering = view.paginator.get_ordering(request, queryset, view)
+    return queryset.order_by(*ordering)[:view.paginator.page_size + 1]
+
+
+def filtered_columns(model: Any, params: dict[str, Any]) -> list[str]:
+    """
+    The columns of `model` a set of filter parameters narrows on, e.g.
+    ['price_per_night'] for {'price_per_night__gte': 50, 'ordering': ...}.
+    """
+    names = {param.split('__')[0] for param in params}
+    fields = [field for field in model._meta.concrete_fields if field.name in names]
+    return [field.column for field in fields]
+
+
+def _scan_nodes(plan: str, pattern: str) -> list[tuple[str, str, str]]:
+    # (plan line, kind of read, the line and everything indented under it)
+    lines = plan.splitlines()
+    nodes = []
+    for number, line in enumerate(lines):
+        match = re.search(pattern, line)
+        if not match:
+            continue
+        indent = len(line) - len(line.lstrip())
+        body = [line]
+        for detail in lines[number + 1:]:
+            if len(detail) - len(detail.lstrip()) <= indent:
+                break
+            body.append(detail)
+        nodes.append((line.strip(), match['kind'], '\n'.join(body)))
+    return nodes
+
+
+def _conditions(vendor: str, kind: str, body: str) -> str | None:
+    """
+    The index condition a read seeks with, or None when it reads every
+    row of the table or of an index.
+    """
+    if vendor == 'sqlite':
+        if kind == 'SCAN':
+            return None
+        constraint = re.search(r'\(([^()]*)\)', body)
+        return constraint[1] if constraint else ''
+    if kind == 'Seq Scan':
+        return None
+    conditions = re.findall(r'Index Cond: (.*)', body)
+    return ' '.join(conditions) or None
+
+
+def full_scans(plan: str, vendor: str, table: str, columns: list[str] | None = None) -> list[str]:
+    """
+    The lines of a query plan that read all of `table`, or all of one of
+    its indexes, instead of seeking into an index. Given the `columns` a
+    query filters on, a seek whose condition holds none of them counts
+    too: it narrows on something else and checks the filter row by row.
+    """
+    found = []
+    for line, kind, body in _scan_nodes(plan, SCANS[vendor].format(table=re.escape(table))):
+        conditions = _conditions(vendor, kind, body)
+        if conditions is None or (
+                columns and not any(re.search(rf'\b{re.escape(column)}\b', conditions) for column in columns)):
+            found.append(line)
+    return found
+
+
+def indexes_used(plan: str, vendor: str) -> list[str]:
+    """
+    The indexes a query plan reads, in plan order.
+    """
+    return re.findall(INDEXES[vendor], plan)